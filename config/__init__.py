@@ -1,16 +1,16 @@
 """
-Pacote de configurao do projeto Django.
+Pacote de configuração do projeto Django.
 
-Este arquivo __init__.py marca o diretrio 'config' como um pacote Python,
-permitindo que mdulos dentro dele sejam importados.
+Este arquivo __init__.py marca o diretório 'config' como um pacote Python,
+permitindo que módulos dentro dele sejam importados.
 
-O diretrio 'config' contm:
-    - settings.py: Configuraes do projeto Django
+O diretório 'config' contém:
+    - settings.py: Configurações do projeto Django
     - urls.py: Roteamento principal de URLs
-    - wsgi.py: Configurao para servidores WSGI
-    - asgi.py: Configurao para servidores ASGI
+    - wsgi.py: Configuração para servidores WSGI
+    - asgi.py: Configuração para servidores ASGI
 
 Nota:
     Este arquivo normalmente fica vazio. Ele existe apenas para indicar
-    ao Python que este diretrio deve ser tratado como um pacote.
+    ao Python que este diretório deve ser tratado como um pacote.
 """
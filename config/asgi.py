@@ -11,6 +11,16 @@ Usado por servidores assíncronos em produção como:
     - Uvicorn
     - Hypercorn
 
+Em produção o projeto é servido pelo Uvicorn (ver entrypoint.sh):
+    uvicorn config.asgi:application --host 0.0.0.0 --port 8000 --workers 2
+
+As views de upload, renderização e download são assíncronas; sob ASGI elas
+rodam direto no event loop, sem ocupar uma thread por requisição.
+
+A aplicação é envolvida por RequestBodyLimit (processor/upload_handler.py):
+o Django lê o corpo inteiro antes de chamar as views, então o limite de
+tamanho (MAX_REQUEST_BODY_SIZE) é aplicado antes, ainda no recebimento.
+
 ASGI é o sucessor moderno do WSGI, suportando:
     - Requisições HTTP síncronas (como WSGI)
     - WebSockets para comunicação bidirecional em tempo real
@@ -31,3 +41,9 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 # Obtém a aplicação ASGI do Django
 # Esta é a interface entre o servidor web assíncrono e a aplicação Django
 application = get_asgi_application()
+
+# Recusa corpos grandes demais antes do Django gravá-los em disco (importado
+# depois de get_asgi_application, que configura o Django)
+from processor.upload_handler import RequestBodyLimit  # noqa: E402
+
+application = RequestBodyLimit(application)
@@ -14,6 +14,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import os
 
 # Constrói caminhos dentro do projeto usando: BASE_DIR / 'subdir'
 # BASE_DIR representa o diretório raiz do projeto (onde está o manage.py)
@@ -213,3 +214,137 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Tamanho máximo permitido para upload de imagens (10MB em bytes)
 MAX_UPLOAD_SIZE = 10485760  # 10MB
+
+# Tamanho máximo do corpo de qualquer requisição, verificado antes do Django
+# ler o corpo (RequestBodyLimit em config/asgi.py; acima disso, 413). A folga
+# sobre MAX_UPLOAD_SIZE cobre os cabeçalhos multipart e os demais campos
+MAX_REQUEST_BODY_SIZE = MAX_UPLOAD_SIZE + 1048576
+
+# Número máximo de pixels (largura x altura) de uma imagem enviada; acima
+# disso o upload é abortado ao ler o cabeçalho (bombas de descompressão)
+MAX_UPLOAD_PIXELS = 100000000  # 100 megapixels
+
+# Upload handlers: imagens enviadas nos campos de IMAGE_UPLOAD_FIELDS são
+# validadas, hasheadas e gravadas no destino final em uma única passada sobre
+# o corpo já recebido (ver processor/upload_handler.py); os demais arquivos
+# usam os handlers padrão
+FILE_UPLOAD_HANDLERS = [
+    'processor.upload_handler.ImageUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+IMAGE_UPLOAD_FIELDS = ('image',)
+
+# Backend usado na etapa de cor (saturação, brilho e contraste) da renderização
+# server-side: 'pil' (matriz de cor do Pillow), 'numpy' (motor vetorizado) ou
+# 'auto' (o mais barato pelo modelo de custo, ver processor/render_plan.py)
+IMAGE_PROCESSOR_BACKEND = 'auto'
+
+# Custos por pixel (ns) do modelo de custo do plano de renderização; sobrescreve
+# entradas de DEFAULT_STAGE_COSTS (ver processor/render_plan.py), ex.:
+# {'color.numpy': 8.0}. O plano de uma sessão pode ser conferido em
+# GET /api/render/<session_id>/plan/
+RENDER_STAGE_COSTS = {}
+
+# Custos fixos por chamada (µs) do mesmo modelo; sobrescreve entradas de
+# DEFAULT_STAGE_OVERHEADS, ex.: {'color.lut': 40.0}
+RENDER_STAGE_OVERHEADS = {}
+
+# Backend do desfoque gaussiano (ver processor/blur.py): 'pil' (GaussianBlur na
+# resolução original) ou 'fast' (reduz, desfoca e amplia nos raios grandes)
+BLUR_BACKEND = 'fast'
+
+# Raio residual mínimo do backend 'fast' após a redução: controla o erro
+# (maior = mais preciso e mais lento). Meça com: python manage.py benchmark_blur
+BLUR_FAST_MIN_RADIUS = 2.5
+
+# Cache de renderizações server-side (ver processor/render_cache.py)
+# Orçamento do nível em memória (64MB em bytes)
+RENDER_CACHE_MAX_BYTES = 67108864  # 64MB
+
+# Diretório do nível em disco (criado pelo entrypoint.sh)
+RENDER_CACHE_DIR = MEDIA_ROOT / 'processed'
+
+# Orçamento do nível em disco (1GB em bytes)
+RENDER_CACHE_DISK_MAX_BYTES = 1073741824  # 1GB
+
+# Tamanho dos blocos enviados no download em streaming (64KB em bytes)
+DOWNLOAD_CHUNK_SIZE = 65536  # 64KB
+
+# Armazenamento temporário das imagens renderizadas pelo cliente
+# (ver processor/rendered_store.py)
+RENDERED_STORE_DIR = MEDIA_ROOT / 'rendered'
+
+# Tempo de vida das renderizações enviadas pelo cliente (1 hora em segundos)
+RENDERED_STORE_TTL = 3600  # 1 hora
+
+# Intervalo entre as limpezas de entradas expiradas (5 minutos em segundos)
+RENDERED_STORE_SWEEP_INTERVAL = 300  # 5 minutos
+
+# Lado maior (em pixels) das versões reduzidas geradas no upload
+# (ver processor/previews.py)
+PREVIEW_TIERS = {
+    'thumbnail': 256,   # Miniatura da linha do tempo
+    'screen': 1600,     # Preview para ajustes interativos
+}
+
+# Número de threads que renderizam os previews de snapshots em segundo plano
+# (ver processor/preview_queue.py)
+SNAPSHOT_PREVIEW_WORKERS = 2
+
+# Renderização em tiles para imagens grandes (ver processor/tiling.py)
+# Planos cujo pico de memória estimado sem tiles passa deste limite são
+# renderizados em tiles (192MB em bytes: três imagens de 16MP)
+RENDER_MAX_PEAK_BYTES = 192000000  # 192MB
+
+# Lado dos tiles em pixels
+TILE_SIZE = 512
+
+# Pool de processos de renderização (ver processor/render_service.py)
+# Número de processos por worker do servidor (0 = renderiza na própria thread
+# da requisição). Cada worker do uvicorn (WEB_CONCURRENCY, ver entrypoint.sh)
+# cria o seu pool, então os núcleos são divididos entre eles: o total de
+# processos de renderização é RENDER_POOL_SIZE * WEB_CONCURRENCY
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 2))
+RENDER_POOL_SIZE = max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+
+# Máximo de renderizações pendentes por worker do servidor; acima disso a
+# API responde 429 (o total também é multiplicado por WEB_CONCURRENCY)
+RENDER_QUEUE_MAX = RENDER_POOL_SIZE * 4
+
+# Memo de etapas da renderização incremental (ver processor/render_graph.py)
+# Limite de memória por processo de renderização (256MB)
+STAGE_MEMO_MAX_BYTES = 268435456  # 256MB
+
+# Limite por sessão; acima dele a sessão descarta suas entradas mais antigas
+STAGE_MEMO_SESSION_MAX_BYTES = 134217728  # 128MB
+
+# Store de imagens decodificadas, abertas com numpy.memmap nas renderizações
+# seguintes sem decodificar o original (ver processor/decoded_store.py)
+# None desativa o store
+DECODED_STORE_DIR = MEDIA_ROOT / 'decoded'
+
+# Orçamento total em disco (2GB); os arquivos usados há mais tempo saem primeiro
+DECODED_STORE_MAX_BYTES = 2147483648  # 2GB
+
+# Arquivos sem uso por mais que este tempo são removidos (30 minutos em segundos)
+DECODED_STORE_IDLE_SECONDS = 1800  # 30 minutos
+
+# Imagens menores que isto (em pixels) não são armazenadas
+DECODED_STORE_MIN_PIXELS = 1000000  # 1 megapixel
+
+# Número máximo de itens por lote em /api/batch/render/ (ver processor/batch.py)
+BATCH_RENDER_MAX_ITEMS = 500
+
+# Lado (em pixels) de cada miniatura da folha de contatos dos snapshots
+# (ver processor/contact_sheet.py)
+SNAPSHOT_SHEET_CELL_SIZE = 320
+
+# Padrões dos codificadores de saída (ver processor/encoders.py)
+# quality: 1-100 (formatos com perdas); effort: 0 (mais rápido) a 9 (menor arquivo)
+IMAGE_ENCODER_OPTIONS = {
+    'jpeg': {'quality': 90, 'effort': 1},   # Progressivo e otimizado
+    'webp': {'quality': 80, 'effort': 6},
+    'avif': {'quality': 60, 'effort': 3},
+    'png': {'effort': 6},                   # Esforço 9 ativa optimize
+}
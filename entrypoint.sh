@@ -12,7 +12,7 @@ echo ""
 sleep 2
 
 echo "📦 Installing Python dependencies with uv..."
-uv pip install --system django pillow numpy django-cors-headers
+uv pip install --system django pillow numpy django-cors-headers "uvicorn[standard]"
 echo "✅ Dependencies installed"
 echo ""
 
@@ -32,9 +32,22 @@ echo ""
 
 echo "✅ Setup completed successfully!"
 echo ""
-echo "🌐 Starting Django development server..."
+echo "🌐 Starting ASGI server (uvicorn)..."
 echo "📍 Access the application at: http://localhost:8000"
 echo ""
 
-# Start the Django development server
-exec python manage.py runserver 0.0.0.0:8000
+# Start the ASGI server: the async views keep the event loop free while
+# renders run in the render process pool.
+# DEBUG=1 reloads on code changes (single worker); otherwise WEB_CONCURRENCY
+# worker processes are started. Each one has its own render pool; by default
+# RENDER_POOL_SIZE splits the CPUs between them (cpu_count // WEB_CONCURRENCY).
+if [ "${DEBUG:-0}" = "1" ]; then
+    exec uvicorn config.asgi:application --host 0.0.0.0 --port 8000 --reload
+fi
+
+exec uvicorn config.asgi:application \
+    --host 0.0.0.0 \
+    --port 8000 \
+    --workers "${WEB_CONCURRENCY:-2}" \
+    --proxy-headers \
+    --timeout-keep-alive 5
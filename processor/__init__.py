@@ -1,24 +1,44 @@
 """
-Aplicao Django 'processor' - Processamento de Imagens.
+Aplicação Django 'processor' - Processamento de Imagens.
 
-Este arquivo __init__.py marca o diretrio 'processor' como um pacote Python,
-permitindo que mdulos dentro dele sejam importados.
+Este arquivo __init__.py marca o diretório 'processor' como um pacote Python,
+permitindo que módulos dentro dele sejam importados.
 
-A aplicao 'processor' contm:
-    - models.py: Modelos de dados (ImageSession, ProcessingSnapshot)
-    - views.py: Views/controladores da aplicao
-    - urls.py: Configurao de rotas da aplicao
-    - admin.py: Configurao do painel administrativo
-    - image_processor.py: Lgica de processamento de imagens
-    - apps.py: Configurao da aplicao
+A aplicação 'processor' contém:
+    - models.py: Modelos de dados (StoredOriginal, ImageSession, ProcessingSnapshot)
+    - views.py: Views/controladores da aplicação
+    - urls.py: Configuração de rotas da aplicação
+    - admin.py: Configuração do painel administrativo
+    - image_processor.py: Lógica de processamento de imagens
+    - numpy_engine.py: Motor vetorizado (NumPy) para os ajustes de cor
+    - blur.py: Backends do desfoque gaussiano (referência do Pillow ou reduzido/ampliado)
+    - lut.py: Tabelas de consulta compostas para operações pontuais
+    - metadata.py: Metadados do cabeçalho (dimensões, formato, orientação) gravados no upload
+    - encoders.py: Codificadores de saída (JPEG/PNG/WebP/AVIF) e negociação de formato
+    - render_cache.py: Cache de renderizações (memória e MEDIA_ROOT/processed)
+    - render_service.py: Renderização server-side com consulta ao cache
+    - streaming.py: Respostas em streaming com suporte a Range/ETag
+    - rendered_store.py: Armazenamento temporário das renderizações do cliente
+    - previews.py: Versões reduzidas (thumbnail/screen) geradas no upload
+    - preview_queue.py: Renderização em segundo plano dos previews de snapshots
+    - tiling.py: Renderização em tiles com memória limitada (imagens grandes)
+    - decoded_store.py: Pixels decodificados em disco, mapeados com numpy.memmap
+    - render_graph.py: Memo de etapas para renderização incremental
+    - render_plan.py: Compilador do plano de renderização (etapas, backends e modelo de custo)
+    - batch.py: Renderização em lote (ZIP/multipart em streaming)
+    - contact_sheet.py: Folha de contatos com todos os snapshots de uma sessão
+    - upload_handler.py: Validação, hash e gravação do upload em uma única passada
+    - originals.py: Originais armazenados por conteúdo, com contagem de referências
+    - signals.py: Sinais (liberação do original ao apagar uma sessão)
+    - apps.py: Configuração da aplicação
 
 Funcionalidades principais:
     - Upload e gerenciamento de imagens
-    - Edio no-destrutiva com ajustes em tempo real
+    - Edição não-destrutiva com ajustes em tempo real
     - Sistema de snapshots (linha do tempo)
-    - Renderizao e download de imagens processadas
+    - Renderização e download de imagens processadas
 
 Nota:
     Este arquivo normalmente fica vazio. Ele existe apenas para indicar
-    ao Python que este diretrio deve ser tratado como um pacote.
+    ao Python que este diretório deve ser tratado como um pacote.
 """
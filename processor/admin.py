@@ -7,7 +7,7 @@ são exibidos e gerenciados no painel administrativo do Django.
 Acesse o admin em: http://localhost:8000/admin/
 """
 from django.contrib import admin
-from .models import ImageSession, ProcessingSnapshot
+from .models import ImageSession, ProcessingSnapshot, StoredOriginal
 
 
 class ProcessingSnapshotInline(admin.TabularInline):
@@ -44,20 +44,40 @@ class ImageSessionAdmin(admin.ModelAdmin):
         inlines: Modelos relacionados exibidos na mesma página
     """
     # Colunas exibidas na lista de sessões
-    list_display = ('id', 'created_at', 'updated_at', 'snapshot_count')
+    # (dimensões e formato vêm dos campos de metadados, sem abrir o arquivo)
+    list_display = ('id', 'dimensions', 'image_format', 'created_at', 'updated_at',
+                    'snapshot_count')
 
     # Filtros disponíveis na barra lateral
-    list_filter = ('created_at', 'updated_at')
+    list_filter = ('image_format', 'has_alpha', 'created_at', 'updated_at')
 
     # Campos pesquisáveis via caixa de busca
-    search_fields = ('id',)
+    search_fields = ('id', 'content_hash')
 
-    # Campos que não podem ser editados (auto-gerados)
-    readonly_fields = ('id', 'created_at', 'updated_at')
+    # Campos que não podem ser editados (auto-gerados ou lidos do cabeçalho no upload)
+    readonly_fields = ('id', 'stored_original', 'content_hash', 'width', 'height',
+                       'image_format', 'mode', 'orientation', 'has_alpha',
+                       'created_at', 'updated_at')
 
     # Exibe snapshots relacionados inline (na mesma página)
     inlines = [ProcessingSnapshotInline]
 
+    def dimensions(self, obj):
+        """
+        Exibe as dimensões do original (ex.: '1920 x 1080').
+
+        Args:
+            obj (ImageSession): Objeto da sessão de imagem
+
+        Returns:
+            str: Largura x altura, ou '-' em sessões sem metadados
+        """
+        if obj.width is None:
+            return '-'
+        return f'{obj.width} x {obj.height}'
+
+    dimensions.short_description = 'Dimensões'
+
     def snapshot_count(self, obj):
         """
         Método customizado para exibir a contagem de snapshots.
@@ -102,3 +122,31 @@ class ProcessingSnapshotAdmin(admin.ModelAdmin):
 
     # Ordena por sessão, depois por ordem, depois por data de criação
     ordering = ('session', 'order', 'created_at')
+
+
+@admin.register(StoredOriginal)
+class StoredOriginalAdmin(admin.ModelAdmin):
+    """
+    Configuração da interface administrativa para StoredOriginal.
+
+    Os originais são criados e removidos pela contagem de referências das
+    sessões (ver originals.py), então todos os campos são somente leitura.
+
+    Atributos:
+        list_display: Colunas exibidas na lista de originais
+        search_fields: Campos pesquisáveis
+        readonly_fields: Campos que não podem ser editados
+    """
+    # Colunas exibidas na lista de originais
+    list_display = ('content_hash', 'ref_count', 'size', 'created_at')
+
+    # Busca pelo hash do conteúdo
+    search_fields = ('content_hash',)
+
+    # Gerenciados pela contagem de referências
+    readonly_fields = ('content_hash', 'file', 'thumbnail', 'screen_preview',
+                       'size', 'ref_count', 'created_at')
+
+    def has_add_permission(self, request):
+        """Originais só são criados pelo upload."""
+        return False
@@ -25,3 +25,7 @@ class ProcessorConfig(AppConfig):
 
     # Nome da aplicação (deve corresponder ao nome do diretório e ao INSTALLED_APPS)
     name = 'processor'
+
+    def ready(self):
+        """Registra os sinais da aplicação (ver signals.py)."""
+        from . import signals  # noqa: F401
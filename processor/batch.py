@@ -0,0 +1,305 @@
+"""
+Renderização em lote para exportação de catálogos.
+
+Em vez de uma requisição por sessão (render_image/download_image), um lote
+recebe uma lista de itens e devolve todas as imagens em uma única resposta,
+enviada em streaming à medida que cada item termina:
+
+    - ZIP (padrão): um arquivo por item, sem compressão (as imagens já são
+      comprimidas), mais um manifest.json no final
+    - multipart/mixed: uma parte por item, mais uma parte final com o manifesto
+
+Formato dos itens:
+    {"session_id": "uuid"}                              Ajustes atuais da sessão
+    {"session_id": "uuid", "snapshot_id": "uuid"}       Ajustes de um snapshot
+    {"session_id": "uuid", "adjustments": {...}}        Ajustes informados
+
+A renderização usa render_service.render_many: itens com o mesmo original
+compartilham a decodificação, e originais diferentes rodam em paralelo.
+
+Itens que referenciam uma sessão ou um snapshot inexistente não derrubam o
+lote: ficam no manifesto com status 'error' e os demais são renderizados.
+"""
+from collections import namedtuple
+import io
+import json
+import time
+import uuid
+import zipfile
+
+from django.conf import settings
+
+from .models import DEFAULT_ADJUSTMENTS, ImageSession, ProcessingSnapshot
+from .render_graph import spatial_key
+from .render_service import render_many
+
+
+# Formatos de resposta aceitos, com o tipo MIME de cada um
+BATCH_FORMATS = {
+    'zip': 'application/zip',
+    'multipart': 'multipart/mixed',
+}
+
+# Número máximo padrão de itens por lote
+DEFAULT_BATCH_RENDER_MAX_ITEMS = 500
+
+# Item já resolvido: nome do arquivo de saída, origem e ajustes completos;
+# error guarda o motivo quando o item não pode ser renderizado (image_path
+# e adjustments ficam None)
+BatchItem = namedtuple(
+    'BatchItem', 'name session_id snapshot_id image_path adjustments error',
+    defaults=(None,),
+)
+
+
+def resolve_items(entries):
+    """
+    Valida os itens de um lote e resolve sessões, snapshots e ajustes.
+
+    Sessões e snapshots são buscados com uma consulta cada, independentemente
+    do tamanho do lote.
+
+    Args:
+        entries (list): Itens no formato descrito no módulo
+
+    Returns:
+        list: BatchItem na ordem recebida; itens com sessão ou snapshot
+        inexistente vêm com o motivo em error
+
+    Raises:
+        ValueError: Se a lista for inválida, grande demais, ou se algum item
+            estiver malformado (sem session_id, ids inválidos ou ajuste inválido)
+    """
+    if not isinstance(entries, list) or not entries:
+        raise ValueError('"items" deve ser uma lista não vazia')
+
+    max_items = getattr(settings, 'BATCH_RENDER_MAX_ITEMS', DEFAULT_BATCH_RENDER_MAX_ITEMS)
+    if len(entries) > max_items:
+        raise ValueError(f'Lote muito grande (máximo {max_items} itens)')
+
+    parsed = []
+    for position, entry in enumerate(entries):
+        if not isinstance(entry, dict) or 'session_id' not in entry:
+            raise ValueError(f'Item {position}: "session_id" é obrigatório')
+        if 'snapshot_id' in entry and 'adjustments' in entry:
+            raise ValueError(f'Item {position}: use "snapshot_id" ou "adjustments", não ambos')
+
+        adjustments = entry.get('adjustments')
+        if adjustments is not None:
+            if not isinstance(adjustments, dict):
+                raise ValueError(f'Item {position}: "adjustments" deve ser um objeto')
+            for key in adjustments:
+                if key not in DEFAULT_ADJUSTMENTS:
+                    raise ValueError(f'Item {position}: ajuste inválido: {key}')
+
+        snapshot_id = entry.get('snapshot_id')
+        parsed.append((
+            uuid.UUID(str(entry['session_id'])),
+            uuid.UUID(str(snapshot_id)) if snapshot_id else None,
+            adjustments,
+        ))
+
+    sessions = ImageSession.objects.in_bulk({session_id for session_id, _, _ in parsed})
+    snapshots = ProcessingSnapshot.objects.in_bulk(
+        {snapshot_id for _, snapshot_id, _ in parsed if snapshot_id}
+    )
+
+    items = []
+    for position, (session_id, snapshot_id, adjustments) in enumerate(parsed):
+        name = f'{position:04d}_processed_{session_id}'
+        if snapshot_id:
+            name += f'_{snapshot_id}'
+        failed = BatchItem(
+            name=f'{name}.jpg',
+            session_id=str(session_id),
+            snapshot_id=str(snapshot_id) if snapshot_id else None,
+            image_path=None,
+            adjustments=None,
+        )
+
+        session = sessions.get(session_id)
+        if session is None:
+            items.append(failed._replace(error=f'Sessão não encontrada: {session_id}'))
+            continue
+
+        if snapshot_id:
+            snapshot = snapshots.get(snapshot_id)
+            if snapshot is None or snapshot.session_id != session.id:
+                items.append(failed._replace(error=f'Snapshot não encontrado: {snapshot_id}'))
+                continue
+            adjustments = snapshot.get_adjustments()
+            suffix = f'_{snapshot_id}'
+        elif adjustments is not None:
+            adjustments = {**session.get_adjustments(), **adjustments}
+            suffix = ''
+        else:
+            adjustments = session.get_adjustments()
+            suffix = ''
+
+        items.append(BatchItem(
+            name=f'{position:04d}_processed_{session_id}{suffix}.jpg',
+            session_id=str(session_id),
+            snapshot_id=str(snapshot_id) if snapshot_id else None,
+            image_path=session.original_image.path,
+            adjustments=adjustments,
+        ))
+    return items
+
+
+def snapshot_items(snapshots, image_path):
+    """
+    Monta os itens de lote para os snapshots de uma sessão.
+
+    Os itens são ordenados pelo prefixo espacial (desfoque e nitidez): como
+    render_many envia tudo de um mesmo original ao mesmo worker, na ordem,
+    cada grupo reaproveita as etapas espaciais do memo daquele processo.
+
+    Args:
+        snapshots (list): ProcessingSnapshot da sessão
+        image_path (str): Arquivo de origem (tier escolhido da sessão)
+
+    Returns:
+        list: BatchItem, um por snapshot
+    """
+    items = [
+        BatchItem(
+            name=f'{snapshot.order:04d}_snapshot_{snapshot.id}.jpg',
+            session_id=str(snapshot.session_id),
+            snapshot_id=str(snapshot.id),
+            image_path=image_path,
+            adjustments=snapshot.get_adjustments(),
+        )
+        for snapshot in snapshots
+    ]
+    return sorted(items, key=lambda item: spatial_key(item.adjustments))
+
+
+def iter_results(items):
+    """
+    Renderiza os itens de um lote, entregando cada um assim que termina.
+
+    Yields:
+        tuple: (BatchItem, bytes ou None, entrada do manifesto)
+    """
+    def manifest_entry(item, data, error):
+        entry = {
+            'name': item.name,
+            'session_id': item.session_id,
+            'snapshot_id': item.snapshot_id,
+        }
+        if error is not None:
+            entry.update(status='error', error=str(error))
+        else:
+            entry.update(status='ok', size=len(data))
+        return entry
+
+    # Itens que não puderam ser resolvidos vão direto para o manifesto
+    pending = []
+    for item in items:
+        if item.error is not None:
+            yield item, None, manifest_entry(item, None, item.error)
+        else:
+            pending.append(item)
+
+    jobs = [(item.image_path, item.adjustments) for item in pending]
+    for index, data, error in render_many(jobs):
+        item = pending[index]
+        yield item, data, manifest_entry(item, data, error)
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Destino não-seekable do ZipFile: acumula os bytes até o próximo bloco."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        """Retorna e descarta os bytes escritos desde a última chamada."""
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(items):
+    """
+    Gera um arquivo ZIP em streaming com os itens do lote.
+
+    Cada arquivo é escrito assim que sua renderização termina; o manifesto
+    (manifest.json) e o diretório central vêm no final.
+
+    Yields:
+        bytes: Blocos do arquivo ZIP
+    """
+    buffer = _ChunkBuffer()
+    manifest = []
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for item, data, entry in iter_results(items):
+            manifest.append(entry)
+            if data is not None:
+                info = zipfile.ZipInfo(item.name, time.localtime()[:6])
+                archive.writestr(info, data)
+                yield buffer.pop()
+        archive.writestr('manifest.json', json.dumps({'items': manifest}, indent=2))
+    yield buffer.pop()
+
+
+def iter_multipart(items, boundary):
+    """
+    Gera uma resposta multipart/mixed em streaming com os itens do lote.
+
+    Itens com erro viram partes application/json com a entrada do manifesto;
+    a última parte é o manifesto completo.
+
+    Yields:
+        bytes: Blocos do corpo multipart
+    """
+    delimiter = f'--{boundary}\r\n'.encode()
+    manifest = []
+
+    def part(content_type, body, filename=None):
+        headers = f'Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n'
+        if filename:
+            headers += f'Content-Disposition: attachment; filename="{filename}"\r\n'
+        return delimiter + headers.encode() + b'\r\n' + body + b'\r\n'
+
+    for item, data, entry in iter_results(items):
+        manifest.append(entry)
+        if data is not None:
+            yield part('image/jpeg', data, item.name)
+        else:
+            yield part('application/json', json.dumps(entry).encode())
+
+    yield part('application/json', json.dumps({'items': manifest}).encode(), 'manifest.json')
+    yield f'--{boundary}--\r\n'.encode()
+
+
+def stream_batch(items, response_format='zip'):
+    """
+    Monta o corpo de um lote no formato pedido.
+
+    Args:
+        items (list): BatchItem resolvidos por resolve_items()
+        response_format (str): 'zip' ou 'multipart'
+
+    Returns:
+        tuple: (Content-Type, gerador de bytes)
+
+    Raises:
+        ValueError: Se o formato não existir
+    """
+    if response_format not in BATCH_FORMATS:
+        raise ValueError(f'Formato inválido: {response_format}')
+
+    if response_format == 'zip':
+        return BATCH_FORMATS['zip'], iter_zip(items)
+
+    boundary = uuid.uuid4().hex
+    return f'multipart/mixed; boundary={boundary}', iter_multipart(items, boundary)
@@ -0,0 +1,84 @@
+"""
+Folha de contatos com todos os snapshots de uma sessão.
+
+Para comparar versões, em vez de carregar e renderizar cada snapshot
+separadamente, todos são renderizados de uma vez sobre a mesma imagem
+(render_graph.render_variants: uma decodificação, e desfoque/nitidez uma vez
+por grupo de snapshots com os mesmos valores) e montados em uma grade, com
+a legenda de cada snapshot abaixo da miniatura.
+"""
+import io
+import math
+
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+from .render_graph import get_stage_memo, render_variants
+
+
+# Lado padrão de cada célula da grade, em pixels
+DEFAULT_CELL_SIZE = 320
+
+# Altura da faixa de legenda abaixo de cada célula e margem entre células
+LABEL_HEIGHT = 20
+MARGIN = 8
+
+# Limite de caracteres da legenda (o restante é cortado com reticências)
+LABEL_MAX_CHARS = 40
+
+
+def render_contact_sheet(image_path, adjustments_list, labels, cell_size=None,
+                         backend=None):
+    """
+    Renderiza os conjuntos de ajustes e os monta em uma folha de contatos.
+
+    Args:
+        image_path (str): Caminho da imagem de origem (normalmente o tier
+            'screen' da sessão)
+        adjustments_list (list): Ajustes completos de cada snapshot
+        labels (list): Legenda de cada célula, na mesma ordem
+        cell_size (int): Lado das células; se omitido, usa
+            settings.SNAPSHOT_SHEET_CELL_SIZE
+        backend (str): Backend da etapa de cor
+
+    Returns:
+        bytes: Folha de contatos em JPEG
+    """
+    cell_size = cell_size or getattr(settings, 'SNAPSHOT_SHEET_CELL_SIZE', DEFAULT_CELL_SIZE)
+
+    cells = [None] * len(adjustments_list)
+    with Image.open(image_path) as img:
+        for index, result in render_variants(img, image_path, adjustments_list,
+                                             get_stage_memo(), backend):
+            # contain() devolve uma cópia reduzida; o resultado pode estar no memo
+            cells[index] = ImageOps.contain(result, (cell_size, cell_size))
+
+    columns = math.ceil(math.sqrt(len(cells)))
+    rows = math.ceil(len(cells) / columns)
+    sheet = Image.new(
+        'RGB',
+        (columns * (cell_size + MARGIN) + MARGIN,
+         rows * (cell_size + LABEL_HEIGHT + MARGIN) + MARGIN),
+        (255, 255, 255),
+    )
+    draw = ImageDraw.Draw(sheet)
+    font = ImageFont.load_default()
+
+    for index, cell in enumerate(cells):
+        row, column = divmod(index, columns)
+        x = MARGIN + column * (cell_size + MARGIN)
+        y = MARGIN + row * (cell_size + LABEL_HEIGHT + MARGIN)
+
+        # Centraliza a miniatura na célula (imagens não quadradas)
+        offset = (x + (cell_size - cell.width) // 2, y + (cell_size - cell.height) // 2)
+        sheet.paste(cell, offset, cell if cell.mode == 'RGBA' else None)
+
+        label = labels[index]
+        if len(label) > LABEL_MAX_CHARS:
+            label = label[:LABEL_MAX_CHARS - 3] + '...'
+        # Legenda logo abaixo da miniatura
+        draw.text((offset[0], offset[1] + cell.height + 4), label, fill=(40, 40, 40), font=font)
+
+    output = io.BytesIO()
+    sheet.save(output, format='JPEG', quality=90)
+    return output.getvalue()
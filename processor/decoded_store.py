@@ -0,0 +1,306 @@
+"""
+Armazenamento em disco das imagens já decodificadas, mapeadas em memória.
+
+Cada renderização server-side decodificava o JPEG original de novo, em
+cada processo do pool. Aqui, na primeira renderização de um original, os
+pixels decodificados são gravados como um array NumPy (.npy) e as
+renderizações seguintes abrem o arquivo com numpy.memmap:
+
+    - Nenhuma decodificação: os pixels vêm direto do mapeamento
+    - O mapeamento vira uma PIL.Image que usa a própria memória mapeada
+      (Image.frombuffer, ver map_pixels)
+    - As páginas ficam no page cache do sistema operacional, compartilhadas
+      por todos os processos do pool (e pelos workers do servidor)
+
+Os pixels são gravados no layout interno do Pillow, com 4 bytes por pixel:
+RGBA para imagens com transparência e RGB com um byte de preenchimento
+(layout 'rgbx') para as demais. Só assim o Pillow consegue mapear o buffer
+sem copiá-lo. Imagens RGBA mapeadas são consumidas direto pelo pipeline; as
+RGBX são convertidas para RGB antes das etapas (cópia de memória, sem
+decodificar), uma vez por processo graças ao memo de etapas, ou tile a tile
+na renderização em tiles, que lê cada tile do mapeamento.
+
+Na primeira renderização, a imagem decodificada é colada uma única vez no
+arquivo novo, mapeado com escrita, e a imagem devolvida é esse mapeamento:
+a decodificação no heap é liberada em seguida.
+
+Organização em disco (DECODED_STORE_DIR):
+    <2 primeiros>/<sha256 do original>.rgba.npy
+    <2 primeiros>/<sha256 do original>.rgbx.npy
+
+O mtime de cada arquivo é renovado a cada uso. Uma thread em segundo plano
+remove os arquivos sem uso há mais de DECODED_STORE_IDLE_SECONDS, e a
+gravação de um novo arquivo descarta os menos usados recentemente até o
+total caber em DECODED_STORE_MAX_BYTES. Remover um arquivo mapeado por
+outro processo é seguro: o mapeamento continua válido até ser fechado.
+"""
+import os
+import threading
+import time
+
+from django.conf import settings
+import numpy as np
+from PIL import Image
+
+from .image_processor import ImageProcessor
+from .render_cache import file_digest
+
+
+# Padrões: 2GB no total, arquivos sem uso por 30 minutos são removidos
+DEFAULT_DECODED_STORE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+DEFAULT_DECODED_STORE_IDLE_SECONDS = 30 * 60
+
+# Imagens menores que isto decodificam rápido demais para valer o arquivo (1MP)
+DEFAULT_DECODED_STORE_MIN_PIXELS = 1_000_000
+
+# Layouts gravados: 'rgba' (modo RGBA) e 'rgbx' (RGB com 4 bytes por pixel)
+LAYOUTS = ('rgba', 'rgbx')
+
+# Linhas por faixa ao converter RGB para RGBX na gravação
+PASTE_ROWS = 256
+
+
+def map_pixels(pixels, layout, readonly=True):
+    """
+    Cria uma PIL.Image sobre um array (altura, largura, 4), sem copiá-lo.
+
+    Usa Image.frombuffer, que mapeia o buffer para os modos de 4 bytes por
+    pixel (RGBA e RGBX). O layout 'rgbx' vira uma imagem RGBX: as etapas do
+    pipeline a recebem convertida para RGB (ImageProcessor._normalize_mode),
+    uma cópia de memória sem decodificação, feita uma vez por processo (o
+    memo de etapas guarda o resultado) ou tile a tile na renderização em
+    tiles.
+
+    Args:
+        pixels (numpy.ndarray): Array uint8 (altura, largura, 4) contíguo
+        layout (str): 'rgba' ou 'rgbx' (ver LAYOUTS)
+        readonly (bool): Se a imagem deve ser marcada como somente leitura
+
+    Returns:
+        PIL.Image: Imagem RGBA ou RGBX que aponta para a memória do array
+    """
+    height, width = pixels.shape[:2]
+    mode = 'RGBA' if layout == 'rgba' else 'RGBX'
+    img = Image.frombuffer(mode, (width, height), pixels, 'raw', mode, 0, 1)
+    if not readonly:
+        img.readonly = 0
+    return img
+
+
+class DecodedStore:
+    """
+    Arrays de pixels decodificados em disco, abertos com numpy.memmap.
+
+    Atributos:
+        directory (str): Diretório raiz dos arquivos .npy
+        max_bytes (int): Orçamento total em disco
+        idle_seconds (int): Tempo sem uso após o qual um arquivo é removido
+        min_pixels (int): Imagens menores não são armazenadas
+    """
+
+    def __init__(self, directory, max_bytes, idle_seconds, min_pixels=0):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.min_pixels = min_pixels
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def open(self, image_path):
+        """
+        Abre um original como PIL.Image, sem decodificá-lo se já estiver no store.
+
+        Na primeira chamada para um original grande o bastante, a imagem é
+        decodificada e gravada no store. Em todos os casos a imagem devolvida
+        é somente leitura (img.readonly) e aponta para o mapeamento: não deve
+        ser modificada in-place.
+
+        Args:
+            image_path (str): Caminho do arquivo original
+
+        Returns:
+            PIL.Image: Imagem mapeada (RGBX ou RGBA), ou a imagem apenas
+            aberta (ainda não decodificada) se for pequena demais para o store
+        """
+        digest = file_digest(image_path)
+        mapped = self.get(digest)
+        if mapped is not None:
+            return mapped
+
+        img = Image.open(image_path)
+        if img.width * img.height < self.min_pixels:
+            return img
+
+        img = ImageProcessor._normalize_mode(img)
+        img.load()
+        mapped = self.put(digest, img, 'rgba' if img.mode == 'RGBA' else 'rgbx')
+        return mapped if mapped is not None else img
+
+    def get(self, digest):
+        """
+        Mapeia os pixels de um original já armazenado.
+
+        Args:
+            digest (str): SHA-256 do original
+
+        Returns:
+            PIL.Image | None: Imagem somente leitura sobre o mapeamento, ou
+            None se o original não estiver no store
+        """
+        for layout in LAYOUTS:
+            path = self.path_for(digest, layout)
+            try:
+                pixels = np.load(path, mmap_mode='r')
+                # Renova o mtime: a limpeza usa-o como "último uso"
+                os.utime(path)
+            except (FileNotFoundError, ValueError):
+                # Ausente, ou removido/truncado entre a abertura e a leitura
+                continue
+
+            return map_pixels(pixels, layout)
+        return None
+
+    def put(self, digest, img, layout):
+        """
+        Grava os pixels de uma imagem decodificada.
+
+        O arquivo é criado com numpy.lib.format.open_memmap em um temporário
+        e renomeado, para que outros processos nunca mapeiem um arquivo
+        parcial. Os pixels são colados direto no mapeamento; no layout
+        'rgbx' a conversão de RGB para RGBX é feita em faixas de
+        PASTE_ROWS linhas, sem uma cópia convertida da imagem inteira.
+
+        Args:
+            digest (str): SHA-256 do original
+            img (PIL.Image): Imagem em modo RGB ou RGBA
+            layout (str): 'rgba' ou 'rgbx' (ver LAYOUTS)
+
+        Returns:
+            PIL.Image | None: Imagem somente leitura sobre o arquivo gravado,
+            ou None se o original já estava no store
+        """
+        path = self.path_for(digest, layout)
+        if os.path.exists(path):
+            return None
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        pixels = np.lib.format.open_memmap(
+            tmp_path, mode='w+', dtype=np.uint8, shape=(img.height, img.width, 4),
+        )
+        mapped = map_pixels(pixels, layout, readonly=False)
+        if img.mode == mapped.mode:
+            mapped.paste(img, (0, 0))
+        else:
+            for top in range(0, img.height, PASTE_ROWS):
+                bottom = min(top + PASTE_ROWS, img.height)
+                mapped.paste(img.crop((0, top, img.width, bottom)), (0, top))
+        mapped.readonly = 1
+        pixels.flush()
+        # O mapeamento continua válido após a renomeação
+        os.replace(tmp_path, path)
+
+        self.sweep()
+        return mapped
+
+    def path_for(self, digest, layout):
+        """Caminho do arquivo .npy de um original em um layout."""
+        return os.path.join(self.directory, digest[:2], f'{digest}.{layout}.npy')
+
+    def sweep(self):
+        """
+        Remove os arquivos sem uso há mais de idle_seconds e, se o total
+        ainda passar de max_bytes, os usados há mais tempo.
+
+        Returns:
+            int: Número de arquivos removidos
+        """
+        with self._lock:
+            files = []
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+            files.sort()
+            total = sum(size for _, size, _ in files)
+            idle_before = time.time() - self.idle_seconds
+            removed = 0
+            for mtime, size, path in files:
+                idle = mtime < idle_before
+                if not idle and total <= self.max_bytes:
+                    break
+                if not idle and path.endswith('.tmp'):
+                    # Gravação em andamento em outro processo
+                    continue
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+            return removed
+
+    def start_sweeper(self, interval):
+        """
+        Inicia a thread de limpeza periódica (uma única vez por processo).
+
+        Args:
+            interval (int): Intervalo entre limpezas em segundos
+        """
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sweep()
+                except OSError:
+                    # Falhas de I/O não devem derrubar a thread; tenta de novo no próximo ciclo
+                    pass
+
+        self._sweeper = threading.Thread(target=run, name='decoded-store-sweeper', daemon=True)
+        self._sweeper.start()
+
+
+_decoded_store = None
+_decoded_store_lock = threading.Lock()
+
+
+def get_decoded_store():
+    """
+    Retorna o store de imagens decodificadas do processo.
+
+    Na primeira chamada cria a instância a partir de DECODED_STORE_DIR,
+    DECODED_STORE_MAX_BYTES, DECODED_STORE_IDLE_SECONDS e
+    DECODED_STORE_MIN_PIXELS, e inicia a thread de limpeza (metade do tempo
+    de inatividade).
+
+    Returns:
+        DecodedStore | None: Store compartilhado, ou None se
+        DECODED_STORE_DIR não estiver configurado
+    """
+    global _decoded_store
+    directory = getattr(settings, 'DECODED_STORE_DIR', None)
+    if not directory:
+        return None
+
+    with _decoded_store_lock:
+        if _decoded_store is None:
+            idle_seconds = getattr(settings, 'DECODED_STORE_IDLE_SECONDS',
+                                   DEFAULT_DECODED_STORE_IDLE_SECONDS)
+            _decoded_store = DecodedStore(
+                directory=directory,
+                max_bytes=getattr(settings, 'DECODED_STORE_MAX_BYTES',
+                                  DEFAULT_DECODED_STORE_MAX_BYTES),
+                idle_seconds=idle_seconds,
+                min_pixels=getattr(settings, 'DECODED_STORE_MIN_PIXELS',
+                                   DEFAULT_DECODED_STORE_MIN_PIXELS),
+            )
+            _decoded_store.start_sweeper(max(1, idle_seconds // 2))
+        return _decoded_store
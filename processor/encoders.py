@@ -0,0 +1,385 @@
+"""
+Codificadores de saída e negociação de formato.
+
+A renderização era sempre gravada como JPEG baseline com qualidade 95 e
+com a transparência achatada sobre fundo branco. Aqui cada formato de
+saída é um codificador registrado, e o formato de uma resposta é escolhido:
+
+    1. Pelo parâmetro explícito ('format', com 'quality' e 'effort' opcionais)
+    2. Pelo header Accept (ex.: navegadores que anunciam image/webp)
+    3. Pelo padrão: PNG para imagens com transparência, JPEG para as demais
+
+Codificadores disponíveis:
+    - jpeg: progressivo e com tabelas Huffman otimizadas (o navegador mostra
+      a imagem inteira em baixa resolução logo nos primeiros bytes)
+    - webp: com perdas, preserva transparência
+    - avif: com perdas, preserva transparência (se o Pillow tiver suporte)
+    - png: sem perdas, preserva transparência, com optimize nos esforços altos
+
+'effort' vai de 0 (mais rápido) a 9 (menor arquivo) e é convertido para o
+parâmetro de cada formato. Os padrões de qualidade e esforço podem ser
+alterados em settings.IMAGE_ENCODER_OPTIONS.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from PIL import Image, features
+
+
+# Faixa do esforço de compressão (0 = mais rápido, 9 = menor arquivo)
+MAX_EFFORT = 9
+
+# Codificador registrado:
+#   name: identificador usado no parâmetro 'format'
+#   content_type / extension: tipo MIME e extensão dos arquivos gerados
+#   alpha: se o formato preserva transparência
+#   save: função save(img, fp, quality, effort) que grava a imagem em fp
+#   quality / effort: padrões (quality None = formato sem perdas)
+Encoder = namedtuple('Encoder', 'name content_type extension alpha save quality effort')
+
+# Formato de saída resolvido, enviado aos workers e usado na chave do cache
+OutputFormat = namedtuple('OutputFormat', 'name quality effort')
+
+ENCODERS = {}
+
+# Ordem de preferência na negociação pelo header Accept: formatos menores
+# primeiro (o AVIF vem depois do WebP por ser bem mais lento para codificar)
+NEGOTIATION_ORDER = ('webp', 'avif')
+
+
+def register_encoder(name, content_type, extension, save, alpha=False,
+                     quality=None, effort=MAX_EFFORT // 2):
+    """
+    Registra (ou substitui) um codificador de saída.
+
+    Args:
+        name (str): Identificador do formato (ex.: 'webp')
+        content_type (str): Tipo MIME
+        extension (str): Extensão dos arquivos
+        save: Função save(img, fp, quality, effort)
+        alpha (bool): Se o formato preserva transparência
+        quality (int): Qualidade padrão (None para formatos sem perdas)
+        effort (int): Esforço padrão, de 0 a MAX_EFFORT
+    """
+    ENCODERS[name] = Encoder(name, content_type, extension, alpha, save, quality, effort)
+
+
+def _save_jpeg(img, fp, quality, effort):
+    # Esforço 0: baseline sem otimização (o mais rápido de codificar)
+    img.save(fp, format='JPEG', quality=quality,
+             progressive=effort > 0, optimize=effort > 0)
+
+
+def _save_webp(img, fp, quality, effort):
+    img.save(fp, format='WEBP', quality=quality,
+             method=round(effort * 6 / MAX_EFFORT))
+
+
+def _save_avif(img, fp, quality, effort):
+    img.save(fp, format='AVIF', quality=quality,
+             speed=round((MAX_EFFORT - effort) * 10 / MAX_EFFORT))
+
+
+def _save_png(img, fp, quality, effort):
+    img.save(fp, format='PNG', compress_level=effort, optimize=effort == MAX_EFFORT)
+
+
+register_encoder('jpeg', 'image/jpeg', 'jpg', _save_jpeg, quality=90, effort=1)
+register_encoder('png', 'image/png', 'png', _save_png, alpha=True, effort=6)
+if features.check('webp'):
+    register_encoder('webp', 'image/webp', 'webp', _save_webp, alpha=True,
+                     quality=80, effort=6)
+if features.check('avif'):
+    register_encoder('avif', 'image/avif', 'avif', _save_avif, alpha=True,
+                     quality=60, effort=3)
+
+
+def get_encoder(output_format):
+    """Retorna o Encoder de um OutputFormat (ou nome de formato)."""
+    name = output_format if isinstance(output_format, str) else output_format.name
+    return ENCODERS[name]
+
+
+def source_encoder(image_format):
+    """
+    Retorna o Encoder do formato de um arquivo original, se houver.
+
+    Args:
+        image_format (str): Formato informado pelo Pillow (ex.: 'JPEG', 'PNG')
+
+    Returns:
+        Encoder | None: Codificador registrado do mesmo formato, ou None
+    """
+    return ENCODERS.get((image_format or '').lower())
+
+
+def has_alpha(img):
+    """
+    Indica se a imagem tem transparência (mesmo critério do pipeline).
+
+    Só consulta o modo e os metadados: pode ser chamada em uma imagem
+    recém-aberta, sem decodificar os pixels.
+    """
+    return img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+
+
+def source_has_alpha(image_path):
+    """Indica se o arquivo de origem tem transparência (lê apenas o cabeçalho)."""
+    with Image.open(image_path) as img:
+        return has_alpha(img)
+
+
+def output_format(name='jpeg', quality=None, effort=None):
+    """
+    Monta um OutputFormat validado, completando os padrões do codificador.
+
+    Args:
+        name (str): Nome de um codificador registrado
+        quality (int | str): Qualidade de 1 a 100 (ignorada em formatos sem perdas)
+        effort (int | str): Esforço de 0 a MAX_EFFORT
+
+    Returns:
+        OutputFormat: Formato pronto para renderizar
+
+    Raises:
+        ValueError: Se o formato não existir ou os valores forem inválidos
+    """
+    encoder = ENCODERS.get(name)
+    if encoder is None:
+        raise ValueError(f'Formato de saída inválido: {name}')
+
+    options = getattr(settings, 'IMAGE_ENCODER_OPTIONS', {}).get(name, {})
+    if encoder.quality is None:
+        quality = None
+    else:
+        quality = _int_option('quality', quality, options.get('quality', encoder.quality))
+        if not 1 <= quality <= 100:
+            raise ValueError('"quality" deve estar entre 1 e 100')
+
+    effort = _int_option('effort', effort, options.get('effort', encoder.effort))
+    if not 0 <= effort <= MAX_EFFORT:
+        raise ValueError(f'"effort" deve estar entre 0 e {MAX_EFFORT}')
+
+    return OutputFormat(name, quality, effort)
+
+
+def _int_option(name, value, default):
+    """Converte um parâmetro numérico da requisição (vazio = padrão)."""
+    if value in (None, ''):
+        return int(default)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'"{name}" deve ser um número inteiro') from None
+
+
+def _accepted_types(accept):
+    """Lê o header Accept em {tipo MIME: q}, ignorando curingas."""
+    accepted = {}
+    for entry in (accept or '').split(','):
+        media_type, _, params = entry.strip().partition(';')
+        media_type = media_type.strip().lower()
+        if not media_type or '*' in media_type:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[media_type] = q
+    return accepted
+
+
+def accepts(accept, content_type):
+    """
+    Indica se o header Accept aceita um tipo MIME.
+
+    Sem header, tudo é aceito; curingas (*/*, image/*) aceitam o tipo,
+    a menos que ele seja recusado explicitamente com q=0.
+    """
+    if not accept:
+        return True
+    accepted = _accepted_types(accept)
+    if content_type in accepted:
+        return accepted[content_type] > 0
+    media_types = {entry.partition(';')[0].strip().lower() for entry in accept.split(',')}
+    return '*/*' in media_types or f'{content_type.partition("/")[0]}/*' in media_types
+
+
+def negotiate(accept=None, requested=None, quality=None, effort=None, alpha=False):
+    """
+    Escolhe o formato de saída de uma resposta.
+
+    Args:
+        accept (str): Header Accept da requisição
+        requested (str): Formato pedido explicitamente (tem prioridade)
+        quality, effort: Ajustes finos opcionais (ver output_format)
+        alpha (bool): Se a imagem tem transparência; o padrão passa a ser PNG
+
+    Returns:
+        OutputFormat: Formato escolhido
+
+    Raises:
+        ValueError: Se o formato pedido ou os valores forem inválidos
+
+    Exemplo:
+        >>> negotiate('image/avif,image/webp,*/*')
+        OutputFormat(name='webp', quality=80, effort=6)
+    """
+    if requested:
+        return output_format(requested, quality, effort)
+
+    # Formatos anunciados explicitamente; curingas (*/*, image/*) ficam com
+    # o padrão, que todo navegador entende
+    accepted = _accepted_types(accept)
+    fallback = ('png', 'jpeg') if alpha else ('jpeg', 'png')
+    candidates = [
+        name for name in NEGOTIATION_ORDER + fallback
+        if name in ENCODERS and accepted.get(ENCODERS[name].content_type, 0) > 0
+    ]
+    if candidates:
+        best = max(accepted[ENCODERS[name].content_type] for name in candidates)
+        name = next(name for name in candidates
+                    if accepted[ENCODERS[name].content_type] == best)
+    else:
+        name = fallback[0]
+    return output_format(name, quality, effort)
+
+
+
+def source_format(image_format, requested=None, quality=None, effort=None, alpha=False):
+    """
+    Escolhe o formato de um download: o do original, salvo pedido explícito.
+
+    O header Accept não entra: navegadores anunciam WebP/AVIF em toda
+    requisição, e o arquivo salvo pelo usuário deve manter o formato que
+    ele enviou. A negociação (negotiate) fica com as respostas exibidas na
+    página (render e previews).
+
+    Args:
+        image_format (str): Formato do original informado pelo Pillow (ex.: 'PNG')
+        requested (str): Formato pedido explicitamente (tem prioridade)
+        quality, effort: Ajustes finos opcionais (ver output_format)
+        alpha (bool): Se o original tem transparência
+
+    Returns:
+        OutputFormat: Formato escolhido; sem codificador para o formato do
+        original (ou se ele perderia a transparência), JPEG, ou PNG se
+        houver transparência
+
+    Raises:
+        ValueError: Se o formato pedido ou os valores forem inválidos
+    """
+    if requested:
+        return output_format(requested, quality, effort)
+
+    encoder = source_encoder(image_format)
+    if encoder is not None and (encoder.alpha or not alpha):
+        return output_format(encoder.name, quality, effort)
+    return output_format('png' if alpha else 'jpeg', quality, effort)
+
+class _CountingWriter:
+    """
+    Repassa as escritas a um destino contando os bytes gravados.
+
+    Usado com destinos que não informam a posição (ex.: HttpResponse). Cada
+    bloco do codificador é entregue ao destino como veio, sem ser copiado
+    para um buffer intermediário.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.size = 0
+
+    def write(self, data):
+        self.sink.write(data)
+        written = memoryview(data).nbytes
+        self.size += written
+        return written
+
+    def flush(self):
+        flush = getattr(self.sink, 'flush', None)
+        if flush is not None:
+            flush()
+
+
+def _tell(sink):
+    """
+    Posição atual do destino, ou None se ele não for posicionável.
+
+    seekable() é consultado antes: HttpResponse.tell() junta todo o conteúdo
+    só para medir o tamanho.
+    """
+    seekable = getattr(sink, 'seekable', None)
+    if seekable is None or not seekable():
+        return None
+    try:
+        return sink.tell()
+    except (OSError, ValueError):
+        return None
+
+
+def encode_to(img, sink, fmt=None):
+    """
+    Codifica uma imagem processada direto em um destino.
+
+    O destino pode ser qualquer objeto com write(): um arquivo do storage
+    aberto para escrita, um io.BytesIO (cujo getbuffer() expõe o resultado
+    como memoryview, sem cópia) ou um HttpResponse. Em arquivos reais o
+    Pillow escreve direto no descritor; nos demais destinos cada bloco
+    codificado é repassado como veio.
+
+    Formatos sem transparência recebem a imagem achatada sobre fundo branco.
+
+    Args:
+        img (PIL.Image): Imagem RGB ou RGBA
+        sink: Destino binário com write()
+        fmt (OutputFormat): Formato de saída (padrão: JPEG)
+
+    Returns:
+        tuple: (Encoder usado, número de bytes gravados no destino)
+
+    Exemplo:
+        >>> output = io.BytesIO()
+        >>> encoder, size = encode_to(img, output, negotiate('image/webp'))
+        >>> view = output.getbuffer()  # size bytes, sem cópia
+    """
+    fmt = fmt or output_format()
+    encoder = get_encoder(fmt)
+
+    if img.mode == 'RGBA' and not encoder.alpha:
+        # Cola a imagem sobre um fundo branco usando o canal alpha como máscara
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        img = background
+
+    # Destinos posicionáveis recebem o Pillow diretamente (o tamanho é a
+    # diferença de posição); os demais passam por um contador de bytes
+    start = _tell(sink)
+    if start is None:
+        writer = _CountingWriter(sink)
+        encoder.save(img, writer, fmt.quality, fmt.effort)
+        return encoder, writer.size
+
+    encoder.save(img, sink, fmt.quality, fmt.effort)
+    return encoder, sink.tell() - start
+
+
+def encode(img, fp, fmt=None):
+    """
+    Codifica uma imagem processada no formato pedido.
+
+    Equivale a encode_to(), descartando o tamanho gravado.
+
+    Args:
+        img (PIL.Image): Imagem RGB ou RGBA
+        fp: Destino (objeto de arquivo binário)
+        fmt (OutputFormat): Formato de saída (padrão: JPEG)
+
+    Returns:
+        Encoder: Codificador usado (tipo MIME e extensão do resultado)
+    """
+    return encode_to(img, fp, fmt)[0]
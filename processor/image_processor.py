@@ -4,16 +4,27 @@ Processador de imagens usando a biblioteca Pillow (PIL).
 Este módulo contém a classe ImageProcessor que fornece métodos estáticos
 para aplicar diversos ajustes e filtros a imagens, incluindo:
     - Conversão para escala de cinza
-    - Ajuste de brilho, contraste e nitidez
-    - Aplicação de desfoque (blur)
+    - Ajuste de saturação, brilho, contraste e nitidez e aplicação de
+      desfoque (blur) isolados, executados como planos de uma etapa
+    - Pipeline combinado com todos os ajustes da sessão (apply_all_adjustments)
+    - Codificação direta em um destino (render_to), sem cópias intermediárias
     - Extração de metadados da imagem
 
 Todas as operações são não-destrutivas, ou seja, a imagem original nunca é modificada.
 """
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image, ImageFilter, ImageStat
 import io
+import os
 from django.core.files.uploadedfile import InMemoryUploadedFile
-import sys
+
+from . import encoders, lut, numpy_engine
+from .blur import gaussian_blur
+from .render_plan import COLOR_BACKENDS, color_backend, compile_plan
+
+
+# Pesos de luminância ITU-R 601-2 (os mesmos usados por Image.convert('L')
+# e pelo algoritmo de saturação do cliente)
+LUMA_WEIGHTS = (0.299, 0.587, 0.114)
 
 
 class ImageProcessor:
@@ -50,11 +61,36 @@ class ImageProcessor:
 
         return ImageProcessor._save_image(gray_img, image_path)
 
+    @staticmethod
+    def adjust_saturation(image_path, factor):
+        """
+        Ajusta a saturação da imagem.
+
+        Executa um plano de uma etapa (a etapa de cor, ver apply_single).
+
+        Args:
+            image_path: Caminho para o arquivo de imagem ou objeto de arquivo
+            factor (float): Fator de saturação
+                - 0.0 = escala de cinza (mantém o modo RGB)
+                - 1.0 = saturação original (sem alteração)
+                - 2.0 = cores muito saturadas
+
+        Returns:
+            InMemoryUploadedFile: Imagem com saturação ajustada
+
+        Exemplo:
+            >>> # Reduzir saturação pela metade
+            >>> muted = ImageProcessor.adjust_saturation('foto.jpg', 0.5)
+        """
+        return ImageProcessor.apply_single(image_path, {'saturation': factor * 100})
+
     @staticmethod
     def adjust_brightness(image_path, factor):
         """
         Ajusta o brilho da imagem.
 
+        Executa um plano de uma etapa (a etapa de cor, ver apply_single).
+
         Args:
             image_path: Caminho para o arquivo de imagem ou objeto de arquivo
             factor (float): Fator de ajuste de brilho
@@ -71,24 +107,15 @@ class ImageProcessor:
             >>> # Reduzir brilho em 50%
             >>> dark_image = ImageProcessor.adjust_brightness('foto.jpg', 0.5)
         """
-        img = Image.open(image_path)
-
-        # Se a imagem estiver em escala de cinza, converte para RGB
-        # (necessário para aplicar enhancements)
-        if img.mode == 'L':
-            img = img.convert('RGB')
-
-        # Cria um enhancer de brilho e aplica o fator
-        enhancer = ImageEnhance.Brightness(img)
-        bright_img = enhancer.enhance(factor)
-
-        return ImageProcessor._save_image(bright_img, image_path)
+        return ImageProcessor.apply_single(image_path, {'brightness': (factor - 1) * 100})
 
     @staticmethod
     def adjust_contrast(image_path, factor):
         """
         Ajusta o contraste da imagem.
 
+        Executa um plano de uma etapa (a etapa de cor, ver apply_single).
+
         Args:
             image_path: Caminho para o arquivo de imagem ou objeto de arquivo
             factor (float): Fator de ajuste de contraste
@@ -105,23 +132,15 @@ class ImageProcessor:
             >>> # Reduzir contraste
             >>> low_contrast = ImageProcessor.adjust_contrast('foto.jpg', 0.7)
         """
-        img = Image.open(image_path)
-
-        # Se a imagem estiver em escala de cinza, converte para RGB
-        if img.mode == 'L':
-            img = img.convert('RGB')
-
-        # Cria um enhancer de contraste e aplica o fator
-        enhancer = ImageEnhance.Contrast(img)
-        contrast_img = enhancer.enhance(factor)
-
-        return ImageProcessor._save_image(contrast_img, image_path)
+        return ImageProcessor.apply_single(image_path, {'contrast': (factor - 1) * 100})
 
     @staticmethod
     def adjust_sharpness(image_path, factor):
         """
         Ajusta a nitidez (sharpness) da imagem.
 
+        Executa um plano de uma etapa (a etapa de nitidez, ver apply_single).
+
         Args:
             image_path: Caminho para o arquivo de imagem ou objeto de arquivo
             factor (float): Fator de ajuste de nitidez
@@ -138,17 +157,7 @@ class ImageProcessor:
             >>> # Reduzir nitidez (efeito de suavização)
             >>> soft_image = ImageProcessor.adjust_sharpness('foto.jpg', 0.5)
         """
-        img = Image.open(image_path)
-
-        # Se a imagem estiver em escala de cinza, converte para RGB
-        if img.mode == 'L':
-            img = img.convert('RGB')
-
-        # Cria um enhancer de nitidez e aplica o fator
-        enhancer = ImageEnhance.Sharpness(img)
-        sharp_img = enhancer.enhance(factor)
-
-        return ImageProcessor._save_image(sharp_img, image_path)
+        return ImageProcessor.apply_single(image_path, {'sharpness': (factor - 1) * 100})
 
     @staticmethod
     def apply_blur(image_path, radius):
@@ -156,7 +165,8 @@ class ImageProcessor:
         Aplica desfoque gaussiano (Gaussian blur) à imagem.
 
         O desfoque gaussiano é um efeito de suavização que reduz detalhes
-        e ruídos na imagem, criando um efeito de "fora de foco".
+        e ruídos na imagem, criando um efeito de "fora de foco". Executa um
+        plano de uma etapa (a etapa de desfoque, ver apply_single).
 
         Args:
             image_path: Caminho para o arquivo de imagem ou objeto de arquivo
@@ -174,15 +184,414 @@ class ImageProcessor:
             >>> # Desfoque intenso
             >>> very_blurred = ImageProcessor.apply_blur('foto.jpg', 8)
         """
-        img = Image.open(image_path)
+        return ImageProcessor.apply_single(image_path, {'blur': radius})
+
+    @staticmethod
+    def apply_single(image_path, adjustments):
+        """
+        Aplica um ajuste isolado pelo plano compilado.
+
+        Os métodos de ajuste individual (adjust_*, apply_blur) só traduzem
+        seu fator para o valor do slider: a imagem passa pelas mesmas etapas
+        (execute_step) da renderização completa, sem implementação própria.
 
-        # Aplica o filtro de desfoque gaussiano com o raio especificado
-        blurred_img = img.filter(ImageFilter.GaussianBlur(radius=radius))
+        Args:
+            image_path: Caminho para o arquivo de imagem ou objeto de arquivo
+            adjustments (dict): Ajustes parciais (os ausentes são neutros)
 
-        return ImageProcessor._save_image(blurred_img, image_path)
+        Returns:
+            InMemoryUploadedFile: Imagem processada
+        """
+        img = ImageProcessor._normalize_mode(Image.open(image_path))
+        plan = compile_plan(adjustments, img.size, tiled=False)
+        processed = ImageProcessor.execute_plan(plan, img, adjustments)
+        return ImageProcessor._save_image(processed, image_path)
 
     @staticmethod
-    def _save_image(img, original_path):
+    def apply_all_adjustments(image_path, adjustments, backend=None, tiled=None,
+                              memo=None, fmt=None):
+        """
+        Aplica todos os ajustes de uma sessão em um único pipeline.
+
+        A imagem original é decodificada uma única vez, todos os ajustes são
+        aplicados sobre o mesmo buffer em memória e o resultado é codificado
+        uma única vez. Encadear os métodos individuais (adjust_brightness,
+        adjust_contrast, ...) custaria um Image.open e uma recodificação JPEG
+        a cada etapa.
+
+        Args:
+            image_path: Caminho para o arquivo de imagem ou objeto de arquivo
+            adjustments (dict): Ajustes no formato de ImageSession.get_adjustments()
+            backend (str): Backend da etapa de cor ('pil' ou 'numpy').
+                Se omitido, usa settings.IMAGE_PROCESSOR_BACKEND
+            tiled (bool): Força (True) ou desativa (False) a renderização em
+                tiles. Se omitido, usa tiles quando o pico de memória estimado
+                pelo plano passar de settings.RENDER_MAX_PEAK_BYTES
+            memo (StageMemo): Memo de etapas (ver render_graph.py). Se
+                informado, as etapas já calculadas para esta imagem são
+                reaproveitadas; não se aplica à renderização em tiles
+            fmt (OutputFormat): Formato de saída (ver encoders.py). Se
+                omitido, JPEG
+
+        Returns:
+            InMemoryUploadedFile: Imagem com todos os ajustes aplicados
+
+        Exemplo:
+            >>> adj = session.get_adjustments()
+            >>> processed = ImageProcessor.apply_all_adjustments('foto.jpg', adj)
+        """
+        processed = ImageProcessor.render(image_path, adjustments, backend, tiled, memo)
+        return ImageProcessor._save_image(processed, image_path, fmt)
+
+    @staticmethod
+    def render_to(image_path, adjustments, sink, backend=None, tiled=None,
+                  memo=None, fmt=None):
+        """
+        Aplica todos os ajustes e codifica o resultado direto em um destino.
+
+        Mesma renderização de apply_all_adjustments, mas sem montar um
+        InMemoryUploadedFile: os bytes codificados vão direto para o destino
+        (arquivo do storage, io.BytesIO, HttpResponse...), ver
+        encoders.encode_to.
+
+        Args:
+            image_path: Caminho para o arquivo de imagem ou objeto de arquivo
+            adjustments (dict): Ajustes no formato de ImageSession.get_adjustments()
+            sink: Destino binário com write()
+            backend, tiled, memo, fmt: Ver apply_all_adjustments
+
+        Returns:
+            tuple: (Encoder usado, número de bytes gravados no destino)
+
+        Exemplo:
+            >>> output = io.BytesIO()
+            >>> encoder, size = ImageProcessor.render_to('foto.jpg', adj, output)
+        """
+        processed = ImageProcessor.render(image_path, adjustments, backend, tiled, memo)
+        return encoders.encode_to(processed, sink, fmt)
+
+    @staticmethod
+    def render(image_path, adjustments, backend=None, tiled=None, memo=None):
+        """
+        Decodifica a imagem e aplica todos os ajustes, sem codificar o resultado.
+
+        Compila o plano (render_plan.compile_plan) e o executa em tiles, pelo
+        memo de etapas ou direto (execute_plan), como descrito em
+        apply_all_adjustments. Os três caminhos executam as mesmas etapas,
+        com os backends escolhidos no plano.
+
+        Originais informados por caminho são lidos do store de imagens
+        decodificadas (decoded_store.py) quando DECODED_STORE_DIR estiver
+        configurado: a partir da segunda renderização os pixels vêm de um
+        mapeamento em memória, sem decodificar o arquivo.
+
+        Returns:
+            PIL.Image: Imagem processada em modo RGB ou RGBA
+        """
+        img = None
+        if isinstance(image_path, (str, os.PathLike)):
+            from .decoded_store import get_decoded_store
+            store = get_decoded_store()
+            if store is not None:
+                img = store.open(image_path)
+        if img is None:
+            img = Image.open(image_path)
+
+        plan = compile_plan(adjustments, img.size, backend, tiled=tiled)
+        if not plan.steps:
+            # Nenhuma etapa ativa: nem tiles nem memo
+            return ImageProcessor._normalize_mode(img)
+
+        if plan.tiled:
+            # Imagens muito grandes: memória limitada pelo tamanho do tile
+            from .tiling import render_tiled
+            return render_tiled(img, adjustments, plan=plan)
+        if memo is not None:
+            # Reaproveita decodificação, desfoque e nitidez já calculados
+            from .render_graph import render_stages
+            return render_stages(img, image_path, adjustments, memo, plan=plan)
+        return ImageProcessor.execute_plan(plan, ImageProcessor._normalize_mode(img), adjustments)
+
+    @staticmethod
+    def process_image(img, adjustments, backend=None, pivot=None, blur_backend=None):
+        """
+        Aplica os ajustes a uma imagem PIL já decodificada.
+
+        As etapas espaciais vêm primeiro (desfoque, depois nitidez) e a etapa
+        de cor por último, de modo que a saída de cada etapa dependa só dos
+        ajustes das anteriores: assim o memo de etapas (render_graph.py)
+        reaproveita a imagem desfocada e nitidificada quando só a cor muda.
+        O resultado é o mesmo da ordem do cliente (ver DOCUMENTACAO.md):
+        saturação, brilho e contraste são afins por pixel e comutam com os
+        filtros lineares normalizados, e o cinza médio do contraste é medido
+        na imagem de entrada. A diferença fica nos valores saturados em 0 ou
+        255 antes do filtro.
+
+        Saturação, brilho e contraste são combinados em uma única passada:
+        uma LUT quando a saturação é 0% ou 100%, ou a matriz de cor do
+        backend escolhido nos demais casos.
+
+        As etapas e seus backends vêm do plano compilado para o tamanho da
+        imagem (render_plan.compile_plan), executado por execute_plan.
+
+        Args:
+            img (PIL.Image): Imagem de entrada (não é modificada)
+            adjustments (dict): Ajustes no formato de ImageSession.get_adjustments()
+            backend (str): Backend da etapa de cor ('pil', 'numpy' ou 'auto').
+                Se omitido, usa settings.IMAGE_PROCESSOR_BACKEND
+            pivot (int): Cinza médio de referência do contraste. Se omitido,
+                é calculado sobre img; a renderização em tiles informa o valor
+                da imagem inteira (ver contrast_pivot)
+            blur_backend (str): Backend do desfoque ('pil' ou 'fast', ver
+                blur.py). Se omitido, usa settings.BLUR_BACKEND
+
+        Returns:
+            PIL.Image: Nova imagem em modo RGB ou RGBA
+
+        Raises:
+            ValueError: Se o backend informado não existir
+        """
+        img = ImageProcessor._normalize_mode(img)
+        plan = compile_plan(adjustments, img.size, backend, blur_backend, tiled=False)
+        return ImageProcessor.execute_plan(plan, img, adjustments, pivot)
+
+    @staticmethod
+    def execute_plan(plan, img, adjustments, pivot=None):
+        """
+        Executa um plano compilado (ver render_plan.compile_plan) sobre a imagem.
+
+        Cada etapa do plano é executada pelo método de etapa correspondente
+        (blur_stage, sharpness_stage, color_stage), com o backend escolhido
+        no plano. Etapas neutras não fazem parte do plano.
+
+        Args:
+            plan (RenderPlan): Plano compilado para os ajustes e o tamanho de img
+            img (PIL.Image): Imagem em modo RGB ou RGBA (não é modificada)
+            adjustments (dict): Ajustes usados para compilar o plano
+            pivot (int): Cinza médio do contraste; se omitido, é calculado
+                sobre img
+
+        Returns:
+            PIL.Image: Imagem processada (a própria img se o plano for vazio)
+        """
+        source = img
+        for step in plan.steps:
+            if step.stage == 'color' and pivot is None:
+                pivot = ImageProcessor.contrast_pivot(source, adjustments)
+            img = ImageProcessor.execute_step(step, img, adjustments, pivot)
+        return img
+
+    @staticmethod
+    def execute_step(step, img, adjustments, pivot=None):
+        """
+        Executa uma etapa do plano com o backend escolhido para ela.
+
+        Usado por execute_plan, pela renderização em tiles (tiling.py) e pelo
+        memo de etapas (render_graph.py), que executam o mesmo plano sobre
+        tiles ou reaproveitando etapas já calculadas.
+
+        Args:
+            step (PlanStep): Etapa do plano
+            img (PIL.Image): Imagem em modo RGB ou RGBA (não é modificada)
+            adjustments (dict): Ajustes usados para compilar o plano
+            pivot (int): Cinza médio do contraste (só na etapa de cor)
+
+        Returns:
+            PIL.Image: Saída da etapa
+        """
+        if step.stage == 'blur':
+            return ImageProcessor.blur_stage(img, adjustments, step.backend)
+        if step.stage == 'sharpness':
+            return ImageProcessor.sharpness_stage(img, adjustments)
+        return ImageProcessor.color_stage(img, adjustments, step.backend, pivot)
+
+    @staticmethod
+    def blur_stage(img, adjustments, blur_backend=None):
+        """
+        Etapa de desfoque gaussiano do pipeline.
+
+        Args:
+            img (PIL.Image): Imagem em modo RGB ou RGBA
+            adjustments (dict): Ajustes da sessão
+            blur_backend (str): 'pil' ou 'fast' (ver blur.py); se omitido,
+                usa settings.BLUR_BACKEND
+
+        Returns:
+            PIL.Image: Imagem desfocada (a própria img se blur for 0)
+        """
+        blur = float(adjustments.get('blur', 0))
+        if blur > 0:
+            img = gaussian_blur(img, blur, blur_backend)
+        return img
+
+    @staticmethod
+    def sharpness_stage(img, adjustments):
+        """
+        Etapa de nitidez do pipeline, como unsharp mask.
+
+        O resultado é img + a * (img - SMOOTH(img)), com a = sharpness / 100
+        (-1.0..+1.0), calculado com Image.blend(máscara, img, 1 + a): o mesmo
+        resultado do ImageEnhance.Sharpness com fator 1 + a, sem o objeto
+        enhancer. Após o desfoque, a máscara é tirada da imagem desfocada.
+
+        Com os dois sliders ativos são duas convoluções (o desfoque e a
+        SMOOTH): reaproveitar a saída do desfoque como máscara daria
+        img + a * (img - desfocada), que nitidifica o original e desfaz o
+        desfoque em vez de nitidificar a imagem desfocada.
+
+        Args:
+            img (PIL.Image): Imagem em modo RGB ou RGBA (saída do desfoque)
+            adjustments (dict): Ajustes da sessão
+
+        Returns:
+            PIL.Image: Imagem com nitidez ajustada (a própria img se for 0)
+        """
+        amount = float(adjustments.get('sharpness', 0)) / 100
+        if amount == 0:
+            return img
+        mask = img.filter(ImageFilter.SMOOTH)
+        if img.mode == 'RGBA':
+            # Como o ImageEnhance.Sharpness: o canal alfa não é alterado
+            mask.putalpha(img.getchannel('A'))
+        return Image.blend(mask, img, 1 + amount)
+
+    @staticmethod
+    def color_stage(img, adjustments, backend=None, pivot=None):
+        """
+        Etapa de cor do pipeline: saturação, brilho e contraste em uma passada.
+
+        Args:
+            img (PIL.Image): Imagem em modo RGB ou RGBA (não é modificada)
+            adjustments (dict): Ajustes da sessão
+            backend (str): 'pil', 'numpy' ou 'lut' (este só com saturação 0%
+                ou 100%), executado como informado (ex.: o backend do plano);
+                'auto' ou omitido escolhe pelo modelo de custo para o tamanho
+                de img, com settings.IMAGE_PROCESSOR_BACKEND
+            pivot (int): Cinza médio do contraste (ver contrast_pivot)
+
+        Returns:
+            PIL.Image: Imagem com os ajustes de cor (a própria img se neutros)
+
+        Raises:
+            ValueError: Se o backend informado não existir
+        """
+        # Com saturação 0% ou 100% tudo é pontual por canal e pode ser
+        # resolvido por uma LUT composta ('lut')
+        if backend not in COLOR_BACKENDS and not (backend == 'lut' and lut.supports(adjustments)):
+            backend = color_backend(adjustments, backend, img.width * img.height)
+        if backend == 'lut':
+            return lut.apply_lut(img, adjustments, pivot)
+
+        if backend == 'numpy':
+            if numpy_engine.color_factors(adjustments) != (1, 1, 1):
+                img = numpy_engine.adjust_image(img, adjustments, pivot)
+            return img
+
+        matrix = ImageProcessor._color_matrix(img, adjustments, pivot)
+        if matrix is not None:
+            if img.mode == 'RGBA':
+                alpha = img.getchannel('A')
+                img = img.convert('RGB').convert('RGB', matrix)
+                img.putalpha(alpha)
+            else:
+                img = img.convert('RGB', matrix)
+        return img
+
+    @staticmethod
+    def _normalize_mode(img):
+        """
+        Converte a imagem para RGB ou RGBA, os modos aceitos pelo pipeline.
+
+        Imagens com transparência (RGBA, LA, P com 'transparency') viram RGBA;
+        as demais (L, P, CMYK, RGBX, ...) viram RGB. Imagens RGBA mapeadas
+        do decoded_store são usadas sem cópia; as RGBX são copiadas para RGB.
+        """
+        if img.mode in ('RGB', 'RGBA'):
+            return img
+        if img.mode in ('LA', 'PA') or 'transparency' in img.info:
+            return img.convert('RGBA')
+        return img.convert('RGB')
+
+    @staticmethod
+    def contrast_pivot(img, adjustments, means=None):
+        """
+        Calcula o cinza médio de referência do contraste para uma imagem.
+
+        Usa as médias por canal do histograma (ImageStat), sem converter a
+        imagem para 'L', e as combina com os pesos de luminância.
+
+        Args:
+            img (PIL.Image): Imagem em modo RGB ou RGBA
+            adjustments (dict): Ajustes da sessão
+            means (list): Médias por canal já calculadas (ImageStat.Stat(img).mean);
+                se omitidas, são calculadas sobre img
+
+        Returns:
+            int: Cinza médio após o brilho, ou 0 se o contraste for neutro
+        """
+        if float(adjustments.get('contrast', 0)) == 0:
+            return 0
+
+        brightness = 1 + float(adjustments.get('brightness', 0)) / 100
+        if means is None:
+            means = ImageStat.Stat(img).mean
+        mean = sum(weight * means[band] for band, weight in enumerate(LUMA_WEIGHTS))
+        return int(mean * brightness + 0.5)
+
+    @staticmethod
+    def _color_matrix(img, adjustments, pivot=None):
+        """
+        Monta a matriz de cor 3x4 que combina saturação, brilho e contraste.
+
+        Reproduz a semântica dos enhancers do Pillow, em sequência:
+            - Saturação (ImageEnhance.Color): mistura cada pixel com sua
+              luminância, fator = saturation / 100
+            - Brilho (ImageEnhance.Brightness): escala os canais,
+              fator = 1 + brightness / 100
+            - Contraste (ImageEnhance.Contrast): mistura com o cinza médio
+              da imagem, fator = 1 + contrast / 100
+
+        Args:
+            img (PIL.Image): Imagem em modo RGB ou RGBA
+            adjustments (dict): Ajustes da sessão
+            pivot (int): Cinza médio do contraste já calculado (opcional)
+
+        Returns:
+            tuple | None: Matriz de 12 valores para Image.convert, ou None se
+            os três ajustes estiverem nos valores neutros
+        """
+        saturation = float(adjustments.get('saturation', 100)) / 100
+        brightness = 1 + float(adjustments.get('brightness', 0)) / 100
+        contrast = 1 + float(adjustments.get('contrast', 0)) / 100
+
+        if saturation == 1 and brightness == 1 and contrast == 1:
+            return None
+
+        # O cinza médio de referência do contraste é calculado sobre a imagem
+        # já saturada e clareada; a saturação preserva a luminância e o brilho
+        # a escala, então basta a média da luminância original
+        if pivot is None:
+            pivot = 0
+            if contrast != 1:
+                mean = ImageStat.Stat(img.convert('L')).mean[0]
+                pivot = int(mean * brightness + 0.5)
+
+        scale = brightness * contrast
+        offset = (1 - contrast) * pivot
+        matrix = []
+        for row in range(3):
+            for col in range(3):
+                # Saturação: s * I + (1 - s) * pesos de luminância
+                value = (1 - saturation) * LUMA_WEIGHTS[col]
+                if row == col:
+                    value += saturation
+                matrix.append(value * scale)
+            matrix.append(offset)
+
+        return tuple(matrix)
+
+    @staticmethod
+    def _save_image(img, original_path, fmt=None):
         """
         Salva uma imagem processada em memória (InMemoryUploadedFile).
 
@@ -192,43 +601,34 @@ class ImageProcessor:
         Args:
             img (PIL.Image): Objeto de imagem PIL processada
             original_path: Caminho ou objeto de arquivo original (para extrair nome)
+            fmt (OutputFormat): Formato de saída (ver encoders.py). Se omitido,
+                JPEG progressivo
 
         Returns:
             InMemoryUploadedFile: Arquivo de imagem em memória pronto para salvar
 
         Nota:
-            - Converte imagens RGBA para RGB (remove transparência)
-            - Salva em formato JPEG com qualidade 95%
-            - Adiciona fundo branco se a imagem tiver canal alpha
+            - Formatos sem transparência (JPEG) recebem fundo branco sob o
+              canal alpha; PNG, WebP e AVIF preservam a transparência
         """
-        # Converte RGBA para RGB se necessário (JPEG não suporta transparência)
-        if img.mode == 'RGBA':
-            # Cria um fundo branco do mesmo tamanho da imagem
-            background = Image.new('RGB', img.size, (255, 255, 255))
-
-            # Cola a imagem sobre o fundo branco usando o canal alpha como máscara
-            # split()[3] extrai o canal alpha (índice 3 = transparência)
-            background.paste(img, mask=img.split()[3])
-            img = background
-
-        # Salva a imagem em um buffer de bytes em memória
+        # Codifica a imagem em um buffer de bytes em memória
         output = io.BytesIO()
-        img.save(output, format='JPEG', quality=95)  # Qualidade 95% (boa qualidade)
+        encoder, size = encoders.encode_to(img, output, fmt)
         output.seek(0)  # Volta ao início do buffer para leitura
 
         # Extrai o nome do arquivo original
         if hasattr(original_path, 'name'):
             filename = original_path.name
         else:
-            filename = 'processed.jpg'
+            filename = f'processed.{encoder.extension}'
 
         # Cria um InMemoryUploadedFile compatível com Django
         return InMemoryUploadedFile(
             output,                      # Buffer de bytes da imagem
             'ImageField',                # Nome do campo do formulário
             filename,                    # Nome do arquivo
-            'image/jpeg',                # Tipo MIME
-            sys.getsizeof(output),       # Tamanho em bytes
+            encoder.content_type,        # Tipo MIME
+            size,                        # Tamanho em bytes do conteúdo codificado
             None                         # Charset (None para imagens)
         )
 
@@ -239,6 +639,9 @@ class ImageProcessor:
 
         Extrai informações básicas sobre a imagem sem modificá-la.
 
+        Abre o arquivo a cada chamada; para sessões, prefira
+        ImageSession.get_image_info(), que lê os metadados gravados no upload.
+
         Args:
             image_path: Caminho para o arquivo de imagem ou objeto de arquivo
 
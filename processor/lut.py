@@ -0,0 +1,120 @@
+"""
+Compositor de tabelas de consulta (LUT) para operações pontuais.
+
+Brilho, contraste e a conversão para escala de cinza (saturação 0%) atuam
+sobre cada canal de forma independente, pixel a pixel. Em vez de percorrer a
+imagem uma vez por ajuste, este módulo compõe todos eles em uma única tabela
+de 256 entradas por canal e a aplica com um só Image.point.
+
+As tabelas são guardadas em cache pela tupla de parâmetros, então arrastar um
+slider de volta a um valor já visitado não recalcula nada.
+
+Uso típico:
+    >>> if supports(adjustments):
+    ...     result = apply_lut(img, adjustments)
+"""
+from functools import lru_cache
+
+from PIL import ImageStat
+
+
+def supports(adjustments):
+    """
+    Indica se a etapa de cor pode ser resolvida só com uma LUT.
+
+    Saturações intermediárias misturam os canais entre si e não são
+    operações pontuais por canal; 0% (escala de cinza) e 100% (original) são.
+
+    Args:
+        adjustments (dict): Ajustes no formato de ImageSession.get_adjustments()
+
+    Returns:
+        bool: True se saturação for 0 ou 100
+    """
+    return float(adjustments.get('saturation', 100)) in (0, 100)
+
+
+@lru_cache(maxsize=512)
+def build_lut(brightness, contrast, pivot, channels=1):
+    """
+    Compõe brilho e contraste em uma tabela de consulta.
+
+    Cada entrada v vira round(v * b * c + (1 - c) * pivot), limitada a 0-255,
+    o que reproduz ImageEnhance.Brightness seguido de ImageEnhance.Contrast
+    com um único arredondamento.
+
+    Args:
+        brightness (float): Fator de brilho (1.0 = sem alteração)
+        contrast (float): Fator de contraste (1.0 = sem alteração)
+        pivot (int): Cinza médio de referência do contraste
+        channels (int): Número de canais de cor (a tabela é repetida)
+
+    Returns:
+        tuple: Tabela com 256 * channels entradas, no formato de Image.point
+    """
+    scale = brightness * contrast
+    offset = (1 - contrast) * pivot
+    table = tuple(
+        min(255, max(0, int(value * scale + offset + 0.5)))
+        for value in range(256)
+    )
+    return table * channels
+
+
+def apply_lut(img, adjustments, pivot=None):
+    """
+    Aplica brilho, contraste e escala de cinza em uma única passada.
+
+    Args:
+        img (PIL.Image): Imagem em modo RGB ou RGBA
+        adjustments (dict): Ajustes com saturação 0 ou 100 (ver supports())
+        pivot (int): Cinza médio do contraste já calculado (ex.: sobre a
+            imagem inteira, na renderização em tiles). Se omitido, é
+            calculado sobre img
+
+    Returns:
+        PIL.Image: Nova imagem no mesmo modo da entrada
+    """
+    brightness = 1 + float(adjustments.get('brightness', 0)) / 100
+    contrast = 1 + float(adjustments.get('contrast', 0)) / 100
+    grayscale = float(adjustments.get('saturation', 100)) == 0
+    alpha = img.getchannel('A') if img.mode == 'RGBA' else None
+
+    if grayscale:
+        # Escala de cinza: a LUT passa a ter um único canal (luminância)
+        gray = img.convert('L')
+        if pivot is None:
+            pivot = _pivot(gray, brightness, contrast)
+        # Uma só conversão de volta: L -> RGB replica a luminância nos canais
+        result = gray.point(build_lut(brightness, contrast, pivot)).convert('RGB')
+        if alpha is not None:
+            result.putalpha(alpha)
+        return result
+
+    if brightness == 1 and contrast == 1:
+        return img
+
+    if pivot is None:
+        pivot = _pivot(img.convert('L'), brightness, contrast)
+    table = build_lut(brightness, contrast, pivot, 3)
+    if alpha is not None:
+        # Canal alpha passa pela tabela identidade
+        table = table + tuple(range(256))
+    return img.point(table)
+
+
+def _pivot(gray, brightness, contrast):
+    """
+    Calcula o cinza médio usado pelo contraste (0 se o contraste for neutro).
+
+    Args:
+        gray (PIL.Image): Luminância da imagem (modo 'L')
+        brightness (float): Fator de brilho aplicado antes do contraste
+        contrast (float): Fator de contraste
+
+    Returns:
+        int: Cinza médio após o brilho, como em ImageEnhance.Contrast
+    """
+    if contrast == 1:
+        return 0
+    return int(ImageStat.Stat(gray).mean[0] * brightness + 0.5)
@@ -0,0 +1,82 @@
+"""
+Comando de gerenciamento para renderização em lote.
+
+Equivalente a POST /api/batch/render/, para exportações feitas no servidor
+(cron, scripts) sem passar pelo HTTP.
+
+Uso:
+    python manage.py batch_render lote.json --output catalogo.zip
+    python manage.py batch_render --session <uuid> --session <uuid>:<snapshot_uuid> -o out.zip
+    cat lote.json | python manage.py batch_render - --format multipart -o out.bin
+
+O arquivo JSON tem o mesmo formato do corpo da API:
+    {"items": [{"session_id": "uuid", "snapshot_id": "uuid"}, ...]}
+"""
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from processor.batch import BATCH_FORMATS, resolve_items, stream_batch
+
+
+class Command(BaseCommand):
+    help = 'Renderiza vários itens (sessões, snapshots ou ajustes) em um ZIP ou multipart'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input', nargs='?',
+            help='Arquivo JSON com os itens ("-" para ler da entrada padrão)',
+        )
+        parser.add_argument(
+            '--session', action='append', default=[], metavar='SESSION[:SNAPSHOT]',
+            help='Item do lote: sessão, opcionalmente com um snapshot (pode repetir)',
+        )
+        parser.add_argument(
+            '-o', '--output', required=True,
+            help='Arquivo de saída ("-" para a saída padrão)',
+        )
+        parser.add_argument(
+            '--format', choices=sorted(BATCH_FORMATS), default='zip',
+            help='Formato da saída (padrão: zip)',
+        )
+
+    def handle(self, *args, **options):
+        entries = []
+        if options['input']:
+            try:
+                if options['input'] == '-':
+                    data = json.load(sys.stdin)
+                else:
+                    with open(options['input'], encoding='utf-8') as f:
+                        data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                raise CommandError(f'Não foi possível ler os itens: {e}')
+            entries.extend(data.get('items', []) if isinstance(data, dict) else data)
+
+        for value in options['session']:
+            session_id, _, snapshot_id = value.partition(':')
+            entry = {'session_id': session_id}
+            if snapshot_id:
+                entry['snapshot_id'] = snapshot_id
+            entries.append(entry)
+
+        try:
+            items = resolve_items(entries)
+            _, content = stream_batch(items, options['format'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        # Escreve cada bloco assim que o item correspondente termina
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for chunk in content:
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+
+        if options['output'] != '-':
+            self.stdout.write(self.style.SUCCESS(
+                f'Lote com {len(items)} itens gravado em {options["output"]} (ver manifest.json)'
+            ))
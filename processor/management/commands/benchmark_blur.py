@@ -0,0 +1,101 @@
+"""
+Comando de gerenciamento que compara os backends de desfoque (ver blur.py).
+
+Para cada raio, mede o tempo do GaussianBlur do Pillow (referência) e do
+backend fast, e o erro do fast em relação à referência, em níveis de 0 a
+255 por canal: média, percentil 99 e máximo.
+
+Uso:
+    python manage.py benchmark_blur --image foto.jpg
+    python manage.py benchmark_blur --radius 8 --radius 10 --min-radius 2 --min-radius 3
+
+Sem --image, usa uma imagem sintética de 12 megapixels (ruído sobre
+gradientes suaves, próxima de uma foto).
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+import numpy as np
+from PIL import Image
+
+from processor.blur import DEFAULT_FAST_MIN_RADIUS, downsample_factor, gaussian_blur
+from processor.image_processor import ImageProcessor
+
+
+# Tamanho da imagem sintética (12 megapixels)
+SYNTHETIC_SIZE = (4000, 3000)
+
+
+def synthetic_image(size=SYNTHETIC_SIZE, seed=0):
+    """Gera uma imagem RGB com gradientes suaves e ruído fino."""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    coarse = rng.integers(0, 256, (height // 8, width // 8, 3), dtype=np.uint8)
+    img = Image.fromarray(coarse).resize(size, Image.Resampling.BICUBIC)
+    noise = rng.integers(-20, 21, (height, width, 3))
+    pixels = np.clip(np.asarray(img, dtype=np.int16) + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels)
+
+
+def best_time(function, repeat):
+    """Executa a função repeat vezes; retorna (último resultado, menor tempo em ms)."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+class Command(BaseCommand):
+    help = 'Compara tempo e erro do desfoque rápido (fast) com o GaussianBlur do Pillow'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--image', help='Imagem de teste (padrão: sintética de 12MP)')
+        parser.add_argument(
+            '--radius', type=float, action='append',
+            help='Raio a medir (pode repetir; padrão: 2, 5, 8 e 10)',
+        )
+        parser.add_argument(
+            '--min-radius', type=float, action='append',
+            help=f'Raio residual mínimo do backend fast (pode repetir; '
+                 f'padrão: {DEFAULT_FAST_MIN_RADIUS})',
+        )
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Execuções por medida; vale a menor (padrão: 3)')
+
+    def handle(self, *args, **options):
+        if options['image']:
+            try:
+                img = ImageProcessor._normalize_mode(Image.open(options['image']))
+                img.load()
+            except OSError as e:
+                raise CommandError(f'Não foi possível abrir a imagem: {e}')
+        else:
+            img = synthetic_image()
+
+        radii = options['radius'] or [2, 5, 8, 10]
+        min_radii = options['min_radius'] or [DEFAULT_FAST_MIN_RADIUS]
+        repeat = max(1, options['repeat'])
+
+        self.stdout.write(f'Imagem {img.width}x{img.height} {img.mode}, {repeat} execuções')
+        self.stdout.write(
+            f'{"raio":>6} {"min":>5} {"fator":>5} {"pil ms":>8} {"fast ms":>8} '
+            f'{"ganho":>6} {"erro médio":>10} {"p99":>4} {"máx":>4}'
+        )
+        for radius in radii:
+            reference, pil_ms = best_time(
+                lambda: gaussian_blur(img, radius, 'pil'), repeat,
+            )
+            expected = np.asarray(reference, dtype=np.int16)
+            for min_radius in min_radii:
+                result, fast_ms = best_time(
+                    lambda: gaussian_blur(img, radius, 'fast', min_radius), repeat,
+                )
+                error = np.abs(np.asarray(result, dtype=np.int16) - expected)
+                self.stdout.write(
+                    f'{radius:>6g} {min_radius:>5g} {downsample_factor(radius, min_radius):>5} '
+                    f'{pil_ms:>8.0f} {fast_ms:>8.0f} {pil_ms / fast_ms:>5.1f}x '
+                    f'{error.mean():>10.2f} {np.percentile(error, 99):>4.0f} {error.max():>4}'
+                )
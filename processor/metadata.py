@@ -0,0 +1,112 @@
+"""
+Metadados das imagens originais, lidos só do cabeçalho.
+
+Largura, altura, modo, formato, orientação EXIF e transparência são
+extraídos no upload (o ImageUploadHandler já abre o cabeçalho para validar
+as dimensões) e gravados em campos de ImageSession. As views, o admin e a
+negociação de formato leem esses campos do banco em vez de abrir o arquivo.
+
+Sessões anteriores a esses campos recebem os metadados na primeira vez em
+que são pedidos (ensure_image_info).
+"""
+import hashlib
+
+from PIL import Image
+
+from .encoders import has_alpha
+
+
+# Tag EXIF de orientação (1 = normal; 2-8 = espelhada e/ou rotacionada)
+ORIENTATION_TAG = 0x0112
+
+# Campos de ImageSession preenchidos com os metadados do cabeçalho
+INFO_FIELDS = ('width', 'height', 'image_format', 'mode', 'orientation', 'has_alpha')
+
+# Tamanho dos blocos lidos ao calcular o hash de um upload (1MB)
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def header_info(img):
+    """
+    Extrai os metadados de uma imagem recém-aberta, sem decodificar os pixels.
+
+    Args:
+        img (PIL.Image): Imagem aberta com Image.open
+
+    Returns:
+        dict: {campo de INFO_FIELDS: valor}
+    """
+    try:
+        orientation = int(img.getexif().get(ORIENTATION_TAG, 1))
+    except Exception:
+        # EXIF corrompido não impede o upload; a imagem é tratada como normal
+        orientation = 1
+    if not 1 <= orientation <= 8:
+        orientation = 1
+
+    return {
+        'width': img.width,
+        'height': img.height,
+        'image_format': img.format or '',
+        'mode': img.mode,
+        'orientation': orientation,
+        'has_alpha': has_alpha(img),
+    }
+
+
+def read_image_info(image_file):
+    """
+    Lê os metadados do cabeçalho de um arquivo de imagem.
+
+    Args:
+        image_file: Caminho ou objeto de arquivo da imagem
+
+    Returns:
+        dict: Ver header_info
+    """
+    with Image.open(image_file) as img:
+        return header_info(img)
+
+
+def content_digest(uploaded_file):
+    """
+    Calcula o SHA-256 de um arquivo enviado, percorrendo-o em blocos.
+
+    Usado nos uploads que não passaram pelo ImageUploadHandler (que já
+    calcula o hash durante o recebimento).
+
+    Args:
+        uploaded_file: UploadedFile do Django
+
+    Returns:
+        str: Hash hexadecimal do conteúdo
+    """
+    hasher = hashlib.sha256()
+    for chunk in uploaded_file.chunks(HASH_CHUNK_SIZE):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def ensure_image_info(session):
+    """
+    Retorna os metadados de uma sessão, lendo o cabeçalho só se faltarem.
+
+    Sessões criadas antes dos campos de metadados têm o arquivo original
+    aberto (apenas o cabeçalho) uma única vez, e os campos são gravados.
+
+    Args:
+        session (ImageSession): Sessão de imagem
+
+    Returns:
+        dict: Resultado de ImageSession.get_image_info()
+    """
+    if session.width is None or not session.content_hash:
+        from .render_cache import file_digest
+
+        path = session.original_image.path
+        info = read_image_info(path)
+        for field, value in info.items():
+            setattr(session, field, value)
+        session.content_hash = session.content_hash or file_digest(path)
+        session.save(update_fields=[*INFO_FIELDS, 'content_hash'])
+    return session.get_image_info()
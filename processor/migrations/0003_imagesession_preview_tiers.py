@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:58
+
+import processor.previews
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processor', '0002_imagesession_adjustments_processingsnapshot_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagesession',
+            name='screen_preview',
+            field=models.ImageField(blank=True, null=True, upload_to=processor.previews.preview_path),
+        ),
+        migrations.AddField(
+            model_name='imagesession',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, upload_to=processor.previews.preview_path),
+        ),
+        migrations.AlterField(
+            model_name='imagesession',
+            name='adjustments',
+            field=models.JSONField(default=dict, help_text='Valores de ajuste atuais'),
+        ),
+        migrations.AlterField(
+            model_name='processingsnapshot',
+            name='adjustments',
+            field=models.JSONField(help_text='Valores de ajuste no momento do snapshot'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:15
+
+import django.db.models.deletion
+import processor.previews
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processor', '0003_imagesession_preview_tiers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredOriginal',
+            fields=[
+                ('content_hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('file', models.ImageField(upload_to='originals/')),
+                ('thumbnail', models.ImageField(blank=True, null=True, upload_to=processor.previews.preview_path)),
+                ('screen_preview', models.ImageField(blank=True, null=True, upload_to=processor.previews.preview_path)),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='imagesession',
+            name='stored_original',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sessions', to='processor.storedoriginal'),
+        ),
+    ]
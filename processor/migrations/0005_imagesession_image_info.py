@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processor', '0004_stored_original'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagesession',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='imagesession',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imagesession',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imagesession',
+            name='image_format',
+            field=models.CharField(blank=True, db_index=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='imagesession',
+            name='mode',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='imagesession',
+            name='orientation',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='imagesession',
+            name='has_alpha',
+            field=models.BooleanField(default=False),
+        ),
+    ]
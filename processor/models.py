@@ -9,6 +9,18 @@ import uuid
 import os
 import json
 
+from .previews import preview_path
+
+
+# Valores padrão de todos os ajustes (estado "sem edição")
+DEFAULT_ADJUSTMENTS = {
+    'saturation': 100,  # 0-100% (0 = escala de cinza)
+    'brightness': 0,    # -100 a +100
+    'contrast': 0,      # -100 a +100
+    'sharpness': 0,     # -100 a +100
+    'blur': 0,          # 0 a 10
+}
+
 
 def upload_path(instance, filename):
     """
@@ -34,6 +46,41 @@ def upload_path(instance, filename):
     return os.path.join('uploads', filename)
 
 
+class StoredOriginal(models.Model):
+    """
+    Arquivo original armazenado por conteúdo, compartilhado entre sessões.
+
+    Reenvios da mesma foto não geram um novo arquivo: todas as sessões com o
+    mesmo conteúdo apontam para o mesmo original e para as mesmas versões
+    reduzidas. Como o caminho do arquivo é o mesmo, o cache de renderizações
+    e o memo de etapas também são compartilhados. O arquivo só é removido
+    quando a última sessão que o referencia é apagada (ver originals.py).
+
+    Atributos:
+        content_hash (str): SHA-256 do conteúdo (chave primária)
+        file (ImageField): Arquivo em 'originals/<2 primeiros>/<hash>.<ext>'
+        thumbnail (ImageField): Miniatura compartilhada (tier 'thumbnail')
+        screen_preview (ImageField): Preview compartilhado (tier 'screen')
+        size (int): Tamanho do arquivo em bytes
+        ref_count (int): Número de sessões que referenciam o original
+        created_at (DateTime): Data/hora do primeiro envio
+    """
+    content_hash = models.CharField(max_length=64, primary_key=True)
+    file = models.ImageField(upload_to='originals/')
+    thumbnail = models.ImageField(upload_to=preview_path, null=True, blank=True)
+    screen_preview = models.ImageField(upload_to=preview_path, null=True, blank=True)
+    size = models.BigIntegerField(default=0)
+
+    # Atualizado só por originals.acquire_original/release_original
+    ref_count = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """Representação em string do original para o admin do Django"""
+        return f"{self.content_hash[:12]} ({self.ref_count} sessões)"
+
+
 class ImageSession(models.Model):
     """
     Representa uma sessão de usuário para processamento de uma imagem.
@@ -44,6 +91,16 @@ class ImageSession(models.Model):
     Atributos:
         id (UUID): Identificador único da sessão
         original_image (ImageField): Imagem original enviada pelo usuário
+        stored_original (ForeignKey): Original compartilhado por conteúdo (None
+            em sessões anteriores à deduplicação)
+        thumbnail (ImageField): Miniatura gerada no upload (tier 'thumbnail')
+        screen_preview (ImageField): Preview do tamanho da tela (tier 'screen')
+        content_hash (str): SHA-256 do arquivo original
+        width, height (int): Dimensões do original em pixels
+        image_format (str): Formato do original (JPEG, PNG, GIF)
+        mode (str): Modo de cor do original (RGB, RGBA, L, P, ...)
+        orientation (int): Orientação EXIF (1 = normal, 2-8 = girada/espelhada)
+        has_alpha (bool): Se o original tem transparência
         adjustments (JSONField): Dicionário com valores de ajustes (saturação, brilho, etc.)
         created_at (DateTime): Data/hora de criação da sessão
         updated_at (DateTime): Data/hora da última atualização
@@ -54,6 +111,32 @@ class ImageSession(models.Model):
     # Imagem original enviada pelo usuário (nunca é modificada)
     original_image = models.ImageField(upload_to=upload_path)
 
+    # Original deduplicado por conteúdo; original_image, thumbnail e
+    # screen_preview apontam para os arquivos dele
+    stored_original = models.ForeignKey(
+        StoredOriginal,
+        on_delete=models.PROTECT,  # Liberado por referência (ver originals.py)
+        related_name='sessions',
+        null=True,
+        blank=True,
+    )
+
+    # Versões reduzidas geradas no upload (ver previews.py)
+    # Permitem renderizar sliders e a linha do tempo sem decodificar o original
+    thumbnail = models.ImageField(upload_to=preview_path, null=True, blank=True)
+    screen_preview = models.ImageField(upload_to=preview_path, null=True, blank=True)
+
+    # Metadados do original, lidos do cabeçalho no upload (ver metadata.py)
+    # APIs e admin usam estes campos em vez de abrir o arquivo.
+    # Nulos em sessões antigas até o primeiro ensure_image_info()
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    image_format = models.CharField(max_length=10, blank=True, db_index=True)
+    mode = models.CharField(max_length=10, blank=True)
+    orientation = models.PositiveSmallIntegerField(default=1)
+    has_alpha = models.BooleanField(default=False)
+
     # Armazena todos os ajustes como JSON para edição não-destrutiva
     # Exemplo: {"saturation": 80, "brightness": 10, "contrast": -5}
     adjustments = models.JSONField(default=dict, help_text="Valores de ajuste atuais")
@@ -70,6 +153,26 @@ class ImageSession(models.Model):
         """Representação em string da sessão para o admin do Django"""
         return f"Session {self.id} - {self.created_at}"
 
+    def get_image_info(self):
+        """
+        Retorna os metadados do original gravados no banco.
+
+        Não abre o arquivo; em sessões antigas os valores podem estar vazios
+        (use metadata.ensure_image_info para preenchê-los).
+
+        Returns:
+            dict: width, height, format, mode, orientation, has_alpha e content_hash
+        """
+        return {
+            'width': self.width,
+            'height': self.height,
+            'format': self.image_format or None,
+            'mode': self.mode or None,
+            'orientation': self.orientation,
+            'has_alpha': self.has_alpha,
+            'content_hash': self.content_hash or None,
+        }
+
     def get_adjustments(self):
         """
         Retorna os valores de ajuste atuais com valores padrão.
@@ -86,17 +189,8 @@ class ImageSession(models.Model):
             - sharpness: -100 a +100 (0 = normal)
             - blur: 0 a 10 (0 = sem desfoque)
         """
-        # Define valores padrão para todos os ajustes
-        defaults = {
-            'saturation': 100,  # 0-100% (0 = escala de cinza)
-            'brightness': 0,    # -100 a +100
-            'contrast': 0,      # -100 a +100
-            'sharpness': 0,     # -100 a +100
-            'blur': 0,          # 0 a 10
-        }
-
         # Mescla defaults com ajustes salvos (ajustes salvos sobrescrevem defaults)
-        return {**defaults, **self.adjustments}
+        return {**DEFAULT_ADJUSTMENTS, **self.adjustments}
 
     def update_adjustment(self, key, value):
         """
@@ -195,3 +289,12 @@ class ProcessingSnapshot(models.Model):
     def __str__(self):
         """Representação em string do snapshot para o admin do Django"""
         return f"{self.description} - {self.created_at}"
+
+    def get_adjustments(self):
+        """
+        Retorna os ajustes do snapshot completados com os valores padrão.
+
+        Returns:
+            dict: Dicionário com todos os ajustes (definidos + padrões)
+        """
+        return {**DEFAULT_ADJUSTMENTS, **(self.adjustments or {})}
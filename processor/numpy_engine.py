@@ -0,0 +1,188 @@
+"""
+Motor vetorizado de ajustes de cor usando NumPy.
+
+Este módulo aplica saturação, brilho e contraste diretamente sobre um único
+array de pixels, sem criar imagens PIL intermediárias. Cada ImageEnhance do
+Pillow aloca uma cópia completa da imagem; aqui todas as operações são feitas
+no próprio array (in-place) sempre que possível.
+
+A semântica é a mesma do backend Pillow (ImageProcessor.process_image):
+    - Saturação: mistura cada pixel com sua luminância, fator = saturation / 100
+    - Brilho: escala os canais, fator = 1 + brightness / 100
+    - Contraste: mistura com o cinza médio da imagem, fator = 1 + contrast / 100
+
+Uso típico:
+    >>> pixels, alpha = image_to_array(img)
+    >>> apply_color_adjustments(pixels, session.get_adjustments())
+    >>> result = array_to_image(pixels, alpha)
+"""
+import numpy as np
+from PIL import Image
+
+
+# Pesos de luminância ITU-R 601-2, em float32 para evitar promoção a float64
+LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def color_factors(adjustments):
+    """
+    Converte os valores dos sliders em fatores multiplicativos.
+
+    Args:
+        adjustments (dict): Ajustes no formato de ImageSession.get_adjustments()
+
+    Returns:
+        tuple: (saturação, brilho, contraste), onde 1.0 = sem alteração
+    """
+    saturation = float(adjustments.get('saturation', 100)) / 100
+    brightness = 1 + float(adjustments.get('brightness', 0)) / 100
+    contrast = 1 + float(adjustments.get('contrast', 0)) / 100
+    return saturation, brightness, contrast
+
+
+def image_to_array(img):
+    """
+    Converte uma imagem PIL em um array float32 (altura, largura, 3).
+
+    Args:
+        img (PIL.Image): Imagem em modo RGB ou RGBA
+
+    Returns:
+        tuple: (pixels, alpha) onde alpha é o canal de transparência como
+        imagem PIL em modo 'L', ou None se a imagem não tiver alpha
+    """
+    alpha = img.getchannel('A') if img.mode == 'RGBA' else None
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    # np.asarray devolve uma view somente-leitura; astype cria o único buffer
+    # de trabalho usado por todo o pipeline de cor
+    pixels = np.asarray(img).astype(np.float32)
+    return pixels, alpha
+
+
+def array_to_image(pixels, alpha=None):
+    """
+    Converte o array de trabalho de volta para uma imagem PIL.
+
+    Arredonda e limita os valores ao intervalo 0-255 no próprio array antes
+    da conversão para uint8.
+
+    Args:
+        pixels (numpy.ndarray): Array float32 (altura, largura, 3)
+        alpha (PIL.Image): Canal alpha opcional (modo 'L')
+
+    Returns:
+        PIL.Image: Imagem em modo RGB, ou RGBA se alpha for informado
+    """
+    pixels += 0.5
+    np.clip(pixels, 0, 255, out=pixels)
+    img = Image.fromarray(pixels.astype(np.uint8), 'RGB')
+
+    if alpha is not None:
+        img.putalpha(alpha)
+    return img
+
+
+def saturate(pixels, saturation):
+    """
+    Ajusta só a saturação, in-place sobre o array.
+
+    Cada pixel é misturado com sua luminância em uma multiplicação e uma
+    soma sobre o array: saída = s * pixel + (1 - s) * luminância.
+
+    Casos rápidos:
+        - 1.0 (100%): nada é feito
+        - 0.0 (0%): cada canal recebe a luminância, sem a multiplicação
+
+    Args:
+        pixels (numpy.ndarray): Array float32 (altura, largura, 3), modificado in-place
+        saturation (float): Fator de saturação (0.0 = cinza, 1.0 = original)
+
+    Returns:
+        numpy.ndarray: O próprio array recebido (para encadeamento)
+    """
+    if saturation == 1:
+        return pixels
+
+    luma = pixels @ LUMA
+    if saturation == 0:
+        pixels[...] = luma[..., np.newaxis]
+        return pixels
+
+    luma *= 1 - saturation
+    pixels *= saturation
+    pixels += luma[..., np.newaxis]
+    return pixels
+
+
+def apply_color_adjustments(pixels, adjustments, pivot=None):
+    """
+    Aplica saturação, brilho e contraste in-place sobre o array.
+
+    As três operações são afins por pixel, então são combinadas em uma única
+    multiplicação e uma única soma sobre o array:
+
+        saída = s * b * c * pixel + ((1 - s) * b * c * luminância + offset)
+
+    A única alocação extra é o plano de luminância (altura x largura), usado
+    pela saturação e pelo cálculo do cinza médio do contraste.
+
+    Args:
+        pixels (numpy.ndarray): Array float32 (altura, largura, 3), modificado in-place
+        adjustments (dict): Ajustes no formato de ImageSession.get_adjustments()
+        pivot (int): Cinza médio do contraste já calculado; se omitido, é
+            calculado sobre o próprio array
+
+    Returns:
+        numpy.ndarray: O próprio array recebido (para encadeamento)
+    """
+    saturation, brightness, contrast = color_factors(adjustments)
+
+    if saturation == 1 and brightness == 1 and contrast == 1:
+        return pixels
+
+    # Só a saturação: a mistura com a luminância, sem escala nem deslocamento
+    if brightness == 1 and contrast == 1:
+        return saturate(pixels, saturation)
+
+    luma = None
+    if saturation != 1 or (contrast != 1 and pivot is None):
+        luma = pixels @ LUMA
+
+    # Cinza médio de referência do contraste: a saturação preserva a
+    # luminância e o brilho a escala (mesma regra do backend Pillow)
+    offset = 0.0
+    if contrast != 1:
+        if pivot is None:
+            pivot = int(float(luma.mean()) * brightness + 0.5)
+        offset = (1 - contrast) * pivot
+
+    scale = brightness * contrast
+    pixels *= saturation * scale
+
+    if saturation != 1:
+        luma *= (1 - saturation) * scale
+        luma += offset
+        pixels += luma[..., np.newaxis]
+    elif offset:
+        pixels += offset
+
+    return pixels
+
+
+def adjust_image(img, adjustments, pivot=None):
+    """
+    Aplica os ajustes de cor a uma imagem PIL usando o motor NumPy.
+
+    Args:
+        img (PIL.Image): Imagem em modo RGB ou RGBA
+        adjustments (dict): Ajustes no formato de ImageSession.get_adjustments()
+        pivot (int): Cinza médio do contraste já calculado (opcional)
+
+    Returns:
+        PIL.Image: Nova imagem com os ajustes de cor aplicados
+    """
+    pixels, alpha = image_to_array(img)
+    apply_color_adjustments(pixels, adjustments, pivot)
+    return array_to_image(pixels, alpha)
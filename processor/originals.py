@@ -0,0 +1,134 @@
+"""
+Originais armazenados por conteúdo, com contagem de referências.
+
+Usuários reenviam a mesma foto com frequência, e cada envio criava um novo
+arquivo em uploads/. Aqui o original é guardado uma única vez, em um caminho
+derivado do SHA-256 calculado pelo ImageUploadHandler:
+
+    originals/<2 primeiros caracteres>/<sha256>.<ext>
+
+Cada ImageSession referencia um StoredOriginal. O arquivo, as versões
+reduzidas (thumbnail e screen) e, por terem o mesmo caminho, o cache de
+renderizações e o memo de etapas são compartilhados por todas as sessões
+com o mesmo conteúdo.
+
+A contagem de referências é alterada sob select_for_update: apagar uma
+sessão (sinal post_delete, ver signals.py) libera sua referência, e a
+última liberação remove os arquivos junto com o registro.
+"""
+import os
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import StoredOriginal
+from .render_cache import remember_digest
+from .upload_handler import FORMAT_EXTENSIONS
+
+
+def original_name(content_hash, extension):
+    """
+    Gera o nome no storage de um original armazenado por conteúdo.
+
+    Args:
+        content_hash (str): SHA-256 do conteúdo
+        extension (str): Extensão do formato detectado (ex.: 'jpg')
+
+    Returns:
+        str: Caminho no formato 'originals/ab/abcdef....jpg'
+    """
+    return os.path.join('originals', content_hash[:2], f'{content_hash}.{extension}')
+
+
+def acquire_original(upload):
+    """
+    Registra uma referência ao original de um upload, deduplicando o arquivo.
+
+    Se o conteúdo ainda não existe, o arquivo do upload é movido (rename)
+    para o caminho por conteúdo; se já existe, o arquivo do upload é
+    descartado e o original existente ganha mais uma referência.
+
+    Args:
+        upload (StoredImageUpload): Upload já validado pelo ImageUploadHandler
+
+    Returns:
+        StoredOriginal: Original com a referência já contabilizada
+    """
+    field = StoredOriginal._meta.get_field('file')
+    name = original_name(upload.content_hash, FORMAT_EXTENSIONS[upload.image_format])
+    path = field.storage.path(name)
+    upload.close()
+
+    with transaction.atomic():
+        # O bloqueio serializa com release_original: um original não pode
+        # ser removido entre a verificação e o incremento
+        stored = (StoredOriginal.objects.select_for_update()
+                  .filter(content_hash=upload.content_hash).first())
+
+        if stored is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(upload.path, path)
+            try:
+                with transaction.atomic():
+                    stored = StoredOriginal.objects.create(
+                        content_hash=upload.content_hash,
+                        file=name,
+                        size=upload.size,
+                        ref_count=1,
+                    )
+            except IntegrityError:
+                # Envio simultâneo do mesmo conteúdo: o outro registro venceu
+                # (o arquivo movido acima tem o mesmo conteúdo)
+                stored = StoredOriginal.objects.select_for_update().get(
+                    content_hash=upload.content_hash,
+                )
+                _add_reference(stored)
+        else:
+            # Conteúdo já armazenado: o arquivo do upload é redundante
+            os.remove(upload.path)
+            _add_reference(stored)
+
+    # O hash já é conhecido: a primeira renderização não relê o arquivo
+    remember_digest(path, upload.content_hash)
+    return stored
+
+
+def _add_reference(stored):
+    """Incrementa a contagem de referências (no banco e na instância)."""
+    StoredOriginal.objects.filter(pk=stored.pk).update(ref_count=F('ref_count') + 1)
+    stored.ref_count += 1
+
+
+def release_original(content_hash):
+    """
+    Libera uma referência a um original.
+
+    Na última referência, o registro e os arquivos (original e versões
+    reduzidas) são removidos. Os arquivos são apagados dentro da transação,
+    ainda com o registro bloqueado, para que um acquire_original simultâneo
+    do mesmo conteúdo espere e grave o arquivo de novo depois.
+
+    Args:
+        content_hash (str): SHA-256 do original
+
+    Returns:
+        bool: True se o original foi removido
+    """
+    with transaction.atomic():
+        stored = (StoredOriginal.objects.select_for_update()
+                  .filter(content_hash=content_hash).first())
+        if stored is None:
+            return False
+
+        if stored.ref_count > 1:
+            StoredOriginal.objects.filter(pk=stored.pk).update(ref_count=F('ref_count') - 1)
+            return False
+
+        # O registro sai primeiro: se alguma sessão ainda o referenciar
+        # (PROTECT), a exceção desfaz a transação antes de tocar nos arquivos
+        files = (stored.file, stored.thumbnail, stored.screen_preview)
+        stored.delete()
+        for field_file in files:
+            if field_file:
+                field_file.storage.delete(field_file.name)
+        return True
@@ -0,0 +1,115 @@
+"""
+Fila de renderização em segundo plano dos previews de snapshots.
+
+Quando um snapshot é criado, seu preview_image é renderizado por um pool de
+threads dentro do processo do Django, sem atrasar a resposta da API. A linha
+do tempo passa a exibir a miniatura pronta em vez de renderizar cada
+snapshot no cliente.
+
+Pedidos com os mesmos ajustes na mesma sessão são agrupados: enquanto um
+render está pendente, novos snapshots idênticos entram no mesmo trabalho, e
+snapshots idênticos que já têm preview compartilham o arquivo existente.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+
+from .models import ProcessingSnapshot
+from .previews import tier_file
+from .render_cache import canonical_adjustments
+from .render_service import render
+
+
+_executor = None
+_pending = {}  # (session_id, ajustes normalizados) -> [snapshot_id, ...]
+_lock = threading.Lock()
+
+
+def _get_executor():
+    """Cria o pool de threads na primeira utilização (SNAPSHOT_PREVIEW_WORKERS)."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'SNAPSHOT_PREVIEW_WORKERS', 2),
+            thread_name_prefix='snapshot-preview',
+        )
+    return _executor
+
+
+def enqueue_snapshot_preview(snapshot):
+    """
+    Agenda a renderização do preview de um snapshot.
+
+    Args:
+        snapshot (ProcessingSnapshot): Snapshot recém-criado
+
+    Returns:
+        bool: True se um novo render foi agendado, False se o pedido foi
+        agrupado com um render pendente ou resolvido com um preview existente
+    """
+    adjustments = snapshot.get_adjustments()
+    key = (snapshot.session_id, canonical_adjustments(adjustments))
+
+    # Snapshot idêntico já renderizado: compartilha o mesmo arquivo. A busca
+    # roda fora do lock do processo; se um render idêntico terminar entre a
+    # busca e o lock, o pior caso é renderizar o mesmo preview de novo
+    existing = (
+        ProcessingSnapshot.objects
+        .filter(session_id=snapshot.session_id)
+        .exclude(preview_image='')
+        .exclude(preview_image__isnull=True)
+        .exclude(id=snapshot.id)
+    )
+    for other in existing:
+        if canonical_adjustments(other.get_adjustments()) == key[1]:
+            ProcessingSnapshot.objects.filter(id=snapshot.id).update(
+                preview_image=other.preview_image.name,
+            )
+            return False
+
+    with _lock:
+        # Render idêntico pendente: o snapshot entra no mesmo trabalho
+        waiting = _pending.get(key)
+        if waiting is not None:
+            waiting.append(snapshot.id)
+            return False
+        _pending[key] = [snapshot.id]
+
+    _get_executor().submit(_render_preview, key, snapshot.session, adjustments)
+    return True
+
+
+def _render_preview(key, session, adjustments):
+    """
+    Renderiza um preview e o grava em todos os snapshots agrupados na chave.
+
+    Executado nas threads do pool. Erros são engolidos: um preview ausente só
+    faz a linha do tempo renderizar o snapshot no cliente, como antes.
+    """
+    try:
+        # Renderiza sobre a miniatura (o preview da linha do tempo é pequeno),
+        # no pool de processos, esperando vaga se a fila estiver cheia
+        data = render(tier_file(session, 'thumbnail').path, adjustments, block=True)
+        content = ContentFile(data, name='preview.jpg')
+
+        field = ProcessingSnapshot._meta.get_field('preview_image')
+        name = field.storage.save(field.generate_filename(None, content.name), content)
+    except Exception:
+        name = None
+
+    try:
+        # Depois de sair da fila a chave não recebe mais snapshots: a gravação
+        # no banco roda fora do lock (um pedido idêntico nesse intervalo só
+        # agenda outro render)
+        with _lock:
+            snapshot_ids = _pending.pop(key, [])
+        if name is not None:
+            ProcessingSnapshot.objects.filter(id__in=snapshot_ids).update(
+                preview_image=name,
+            )
+    finally:
+        # Cada thread do pool tem sua própria conexão com o banco
+        close_old_connections()
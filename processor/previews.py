@@ -0,0 +1,225 @@
+"""
+Geração das versões reduzidas (tiers de preview) de uma imagem.
+
+Cada sessão tem três níveis de resolução:
+    - thumbnail: miniatura para a linha do tempo (PREVIEW_TIERS['thumbnail'])
+    - screen: preview do tamanho da tela para os sliders (PREVIEW_TIERS['screen'])
+    - full: a imagem original
+
+As versões reduzidas são geradas no upload sem decodificar a resolução
+completa: em JPEGs, Image.draft pede ao decodificador uma escala de 1/2, 1/4
+ou 1/8 diretamente, e Image.reduce faz a redução inteira restante antes do
+redimensionamento final.
+"""
+import io
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image
+
+
+# Lado maior (em pixels) de cada tier reduzido
+DEFAULT_PREVIEW_TIERS = {
+    'thumbnail': 256,
+    'screen': 1600,
+}
+
+# Todos os tiers aceitos pela API (o 'full' é a própria imagem original)
+TIERS = ('thumbnail', 'screen', 'full')
+
+# Campo de ImageSession onde cada tier reduzido é armazenado
+TIER_FIELDS = {
+    'thumbnail': 'thumbnail',
+    'screen': 'screen_preview',
+}
+
+
+def tier_sizes():
+    """Retorna o lado maior de cada tier reduzido, conforme PREVIEW_TIERS."""
+    return getattr(settings, 'PREVIEW_TIERS', DEFAULT_PREVIEW_TIERS)
+
+
+def preview_path(instance, filename):
+    """
+    Gera o caminho de armazenamento de uma versão reduzida.
+
+    Args:
+        instance: Instância do modelo que está fazendo o upload
+        filename: Nome sugerido para o arquivo
+
+    Returns:
+        str: Caminho no formato 'previews/uuid.extensão'
+    """
+    ext = filename.split('.')[-1]
+    return os.path.join('previews', f'{uuid.uuid4()}.{ext}')
+
+
+def open_downscaled(image_file, max_size):
+    """
+    Abre uma imagem já reduzida para caber em max_size x max_size.
+
+    Args:
+        image_file: Caminho ou objeto de arquivo da imagem
+        max_size (int): Lado maior desejado em pixels
+
+    Returns:
+        PIL.Image: Imagem decodificada com lado maior <= max_size
+    """
+    img = Image.open(image_file)
+
+    # JPEG: o decodificador reduz por 1/2, 1/4 ou 1/8 durante a decodificação,
+    # sem nunca materializar a resolução completa
+    if img.format == 'JPEG':
+        img.draft('RGB', (max_size, max_size))
+
+    # Redução inteira rápida (média de blocos) até perto do tamanho final
+    factor = max(img.size) // max_size
+    if factor >= 2:
+        img = img.reduce(factor)
+
+    # Ajuste fino com filtro de alta qualidade (in-place, preserva proporção)
+    img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    return img
+
+
+def encode_preview(img):
+    """
+    Codifica uma versão reduzida para armazenamento.
+
+    Imagens com transparência são salvas em PNG; as demais em JPEG.
+
+    Args:
+        img (PIL.Image): Imagem reduzida
+
+    Returns:
+        ContentFile: Arquivo pronto para ser salvo em um ImageField
+    """
+    output = io.BytesIO()
+    if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info:
+        img.save(output, format='PNG')
+        extension = 'png'
+    else:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        img.save(output, format='JPEG', quality=85)
+        extension = 'jpg'
+    return ContentFile(output.getvalue(), name=f'preview.{extension}')
+
+
+def generate_previews(image_file):
+    """
+    Gera todas as versões reduzidas de uma imagem com uma única decodificação.
+
+    A imagem é decodificada (em escala reduzida) para o maior tier, e os
+    tiers menores são derivados dela.
+
+    Args:
+        image_file: Caminho ou objeto de arquivo da imagem original
+
+    Returns:
+        dict: {tier: ContentFile} para cada tier reduzido
+    """
+    sizes = sorted(tier_sizes().items(), key=lambda item: item[1], reverse=True)
+
+    previews = {}
+    img = None
+    for tier, max_size in sizes:
+        if img is None:
+            img = open_downscaled(image_file, max_size)
+        else:
+            img = img.copy()
+            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        previews[tier] = encode_preview(img)
+    return previews
+
+
+def save_previews(session):
+    """
+    Gera e salva as versões reduzidas de uma sessão.
+
+    Se o original compartilhado já tiver as versões reduzidas (gravadas por
+    outra sessão com o mesmo conteúdo), elas são reaproveitadas.
+
+    Args:
+        session (ImageSession): Sessão com original_image já salvo
+    """
+    stored = session.stored_original
+    if stored is not None and share_previews(session, stored):
+        session.save(update_fields=list(TIER_FIELDS.values()))
+        return
+    store_previews(session, generate_previews(session.original_image.path))
+
+
+def store_previews(session, previews):
+    """
+    Salva versões reduzidas já geradas nos campos da sessão.
+
+    Separado de save_previews para que a view assíncrona rode a geração
+    (CPU) e a gravação (banco de dados) em threads diferentes.
+
+    Sessões com original compartilhado (stored_original) gravam as versões
+    no StoredOriginal, e a sessão só aponta para os mesmos arquivos.
+
+    Args:
+        session (ImageSession): Sessão de imagem
+        previews (dict): Resultado de generate_previews()
+    """
+    fields = list(TIER_FIELDS[tier] for tier in previews)
+    owner = session.stored_original or session
+    for tier, content in previews.items():
+        getattr(owner, TIER_FIELDS[tier]).save(content.name, content, save=False)
+
+    if owner is not session:
+        owner.save(update_fields=fields)
+        share_previews(session, owner)
+    session.save(update_fields=fields)
+
+
+def share_previews(session, stored):
+    """
+    Aponta os campos de preview da sessão para os arquivos do original compartilhado.
+
+    Args:
+        session (ImageSession): Sessão de imagem
+        stored (StoredOriginal): Original da sessão
+
+    Returns:
+        bool: True se o original já tinha todas as versões reduzidas
+    """
+    complete = True
+    for field in TIER_FIELDS.values():
+        field_file = getattr(stored, field)
+        setattr(session, field, field_file.name if field_file else None)
+        complete = complete and bool(field_file)
+    return complete
+
+
+def tier_file(session, tier):
+    """
+    Retorna o arquivo de um tier da sessão, gerando os previews se faltarem.
+
+    Sessões criadas antes da geração de previews recebem as versões reduzidas
+    na primeira vez em que são pedidas.
+
+    Args:
+        session (ImageSession): Sessão de imagem
+        tier (str): Um dos valores de TIERS
+
+    Returns:
+        FieldFile: Arquivo da imagem no tier pedido
+
+    Raises:
+        ValueError: Se o tier não existir
+    """
+    if tier not in TIERS:
+        raise ValueError(f'Tier de preview inválido: {tier}')
+    if tier == 'full':
+        return session.original_image
+
+    field_file = getattr(session, TIER_FIELDS[tier])
+    if not field_file:
+        save_previews(session)
+        field_file = getattr(session, TIER_FIELDS[tier])
+    return field_file
@@ -0,0 +1,384 @@
+"""
+Cache de renderizações endereçado por conteúdo.
+
+Cada renderização é identificada por uma chave derivada do hash do arquivo
+original, dos ajustes normalizados, da versão do pipeline
+(RENDER_PIPELINE_VERSION) e dos backends configurados. Assim, estados repetidos da sessão
+(desfazer/refazer, recarregar um snapshot, downloads) reaproveitam o
+resultado em vez de renderizar de novo.
+
+O cache tem dois níveis:
+    - Memória: LRU limitado por um orçamento em bytes (RENDER_CACHE_MAX_BYTES)
+    - Disco: arquivos em MEDIA_ROOT/processed, também com orçamento em bytes
+      (RENDER_CACHE_DISK_MAX_BYTES) e descarte dos menos usados recentemente,
+      em lotes: ao estourar o orçamento, o diretório é varrido uma vez e os
+      arquivos são removidos até DISK_LOW_WATER do orçamento
+
+Uso típico:
+    >>> cache = get_render_cache()
+    >>> key = make_key(session.original_image.path, session.get_adjustments())
+    >>> data = cache.get(key)
+    >>> if data is None:
+    ...     data = renderizar()
+    ...     cache.put(key, data)
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+
+from django.conf import settings
+
+from .encoders import get_encoder, output_format
+
+
+# Tamanho dos blocos lidos ao calcular o hash de um arquivo (1MB)
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Versão do pipeline de renderização. Entra na chave de cache: incremente ao
+# mudar o resultado de alguma etapa (ex.: a nitidez ou o desfoque), para que
+# as renderizações antigas em disco deixem de ser servidas
+RENDER_PIPELINE_VERSION = 2
+
+# Fração do orçamento em disco que resta após um descarte. A folga faz com
+# que o diretório só seja varrido de novo depois de várias escritas, e não a
+# cada put com o cache cheio
+DISK_LOW_WATER = 0.8
+
+# Memoização dos hashes de arquivo: (caminho, mtime, tamanho) -> sha256
+_file_digests = OrderedDict()
+_file_digests_lock = threading.Lock()
+_FILE_DIGESTS_MAX = 1024
+
+
+def file_digest(path):
+    """
+    Calcula o SHA-256 do conteúdo de um arquivo.
+
+    O resultado é memorizado por (caminho, mtime, tamanho), então o arquivo
+    original só é lido por completo na primeira renderização.
+
+    Args:
+        path (str): Caminho do arquivo no sistema de arquivos
+
+    Returns:
+        str: Hash hexadecimal do conteúdo
+    """
+    stat = os.stat(path)
+    memo_key = (str(path), stat.st_mtime_ns, stat.st_size)
+
+    with _file_digests_lock:
+        digest = _file_digests.get(memo_key)
+        if digest is not None:
+            _file_digests.move_to_end(memo_key)
+            return digest
+
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+
+    with _file_digests_lock:
+        _file_digests[memo_key] = digest
+        if len(_file_digests) > _FILE_DIGESTS_MAX:
+            _file_digests.popitem(last=False)
+    return digest
+
+
+def remember_digest(path, digest):
+    """
+    Registra o SHA-256 já conhecido de um arquivo (ex.: calculado no upload).
+
+    Evita que file_digest leia o arquivo inteiro na primeira renderização.
+
+    Args:
+        path (str): Caminho do arquivo no sistema de arquivos
+        digest (str): Hash hexadecimal do conteúdo
+    """
+    stat = os.stat(path)
+    memo_key = (str(path), stat.st_mtime_ns, stat.st_size)
+
+    with _file_digests_lock:
+        _file_digests[memo_key] = digest
+        _file_digests.move_to_end(memo_key)
+        if len(_file_digests) > _FILE_DIGESTS_MAX:
+            _file_digests.popitem(last=False)
+
+
+def canonical_adjustments(adjustments):
+    """
+    Normaliza um dicionário de ajustes para comparação e hashing.
+
+    Valores numéricos inteiros são representados sem casa decimal (10.0 -> 10),
+    para que 10 e 10.0 gerem a mesma chave.
+
+    Args:
+        adjustments (dict): Ajustes no formato de ImageSession.get_adjustments()
+
+    Returns:
+        str: JSON com chaves ordenadas e sem espaços
+    """
+    normalized = {}
+    for key, value in adjustments.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+            if value.is_integer():
+                value = int(value)
+        normalized[key] = value
+    return json.dumps(normalized, sort_keys=True, separators=(',', ':'))
+
+
+def pipeline_salt():
+    """
+    Identifica a versão do pipeline e os backends que produzem os pixels.
+
+    Backends diferentes (ex.: o desfoque 'fast' e o 'pil') não geram
+    exatamente os mesmos pixels, então trocar BLUR_BACKEND ou
+    IMAGE_PROCESSOR_BACKEND não pode reaproveitar renderizações antigas.
+
+    Returns:
+        str: Ex.: 'v2:pil:auto'
+    """
+    return (
+        f"v{RENDER_PIPELINE_VERSION}:"
+        f"{getattr(settings, 'BLUR_BACKEND', 'pil')}:"
+        f"{getattr(settings, 'IMAGE_PROCESSOR_BACKEND', 'auto')}"
+    )
+
+
+def make_key(image_path, adjustments, fmt=None):
+    """
+    Gera a chave de cache de uma renderização.
+
+    Args:
+        image_path (str): Caminho do arquivo original
+        adjustments (dict): Ajustes completos (use ImageSession.get_adjustments())
+        fmt (OutputFormat): Formato de saída (padrão: JPEG, ver encoders.py)
+
+    Returns:
+        str: Hash hexadecimal (SHA-256) seguido da extensão do formato
+        (ex.: 'ab12....webp'); também é o nome do arquivo no nível em disco
+    """
+    fmt = fmt or output_format()
+    payload = (
+        f'{pipeline_salt()}:{file_digest(image_path)}:'
+        f'{canonical_adjustments(adjustments)}:'
+        f'{fmt.name}:{fmt.quality}:{fmt.effort}'
+    )
+    digest = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    return f'{digest}.{get_encoder(fmt).extension}'
+
+
+class RenderCache:
+    """
+    Cache LRU de renderizações com nível em memória e nível em disco.
+
+    Atributos:
+        max_bytes (int): Orçamento do nível em memória
+        directory (str): Diretório do nível em disco (None desativa o nível)
+        max_disk_bytes (int): Orçamento do nível em disco
+    """
+
+    def __init__(self, max_bytes, directory=None, max_disk_bytes=None):
+        self.max_bytes = max_bytes
+        self.directory = str(directory) if directory else None
+        self.max_disk_bytes = max_disk_bytes
+
+        self._entries = OrderedDict()  # chave -> bytes, do menos ao mais recente
+        self._size = 0
+        self._disk_size = None  # Calculado sob demanda na primeira escrita
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Busca uma renderização no cache (memória primeiro, depois disco).
+
+        Um acerto em disco promove a entrada para a memória.
+
+        Args:
+            key (str): Chave gerada por make_key()
+
+        Returns:
+            bytes | None: Imagem codificada, ou None se não estiver em cache
+        """
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+
+        path = self.path_for(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Atualiza o mtime: o descarte em disco usa-o como "último uso"
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        """
+        Armazena uma renderização nos dois níveis do cache.
+
+        Args:
+            key (str): Chave gerada por make_key()
+            data (bytes | memoryview): Imagem codificada; um memoryview (ex.:
+                io.BytesIO.getbuffer()) é gravado em disco sem cópia
+        """
+        self._remember(key, data)
+
+        path = self.path_for(key)
+        if path is None or os.path.exists(path):
+            return
+
+        # Escreve em arquivo temporário e renomeia, para que leitores
+        # concorrentes nunca vejam um arquivo parcial
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = self._scan_disk_size()
+            else:
+                self._disk_size += memoryview(data).nbytes
+            over_budget = (
+                self.max_disk_bytes is not None
+                and self._disk_size > self.max_disk_bytes
+            )
+        if over_budget:
+            self._evict_disk()
+
+    def path_for(self, key):
+        """
+        Retorna o caminho do arquivo de uma chave no nível em disco.
+
+        Os arquivos são distribuídos em subdiretórios pelos dois primeiros
+        caracteres da chave, para não acumular milhares de arquivos em um só.
+
+        Args:
+            key (str): Chave gerada por make_key()
+
+        Returns:
+            str | None: Caminho absoluto, ou None se o nível em disco estiver desativado
+        """
+        if not self.directory:
+            return None
+        return os.path.join(self.directory, key[:2], key)
+
+    def clear(self):
+        """Esvazia o nível em memória (o nível em disco é preservado)."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remember(self, key, data):
+        """Insere no nível em memória, descartando as entradas mais antigas."""
+        size = memoryview(data).nbytes
+        if size > self.max_bytes:
+            return
+        # O nível em memória guarda bytes próprios, sem prender o buffer de origem
+        if not isinstance(data, bytes):
+            data = bytes(data)
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+
+            self._entries[key] = data
+            self._size += size
+
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _disk_files(self):
+        """Lista (mtime, tamanho, caminho) de todos os arquivos em disco."""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _scan_disk_size(self):
+        """Soma o tamanho de todos os arquivos do nível em disco."""
+        return sum(size for _, size, _ in self._disk_files())
+
+    def _evict_disk(self):
+        """
+        Remove os arquivos usados há mais tempo até DISK_LOW_WATER do orçamento.
+
+        O diretório é varrido uma única vez por lote de descarte; o tamanho
+        resultante volta para _disk_size, e os puts seguintes só somam.
+        """
+        files = sorted(self._disk_files())
+        total = sum(size for _, size, _ in files)
+        target = self.max_disk_bytes * DISK_LOW_WATER
+
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        with self._lock:
+            self._disk_size = total
+
+
+def media_url(path):
+    """
+    Converte um caminho dentro de MEDIA_ROOT na URL pública correspondente.
+
+    Args:
+        path (str): Caminho absoluto de um arquivo do cache em disco
+
+    Returns:
+        str | None: URL do arquivo, ou None se estiver fora de MEDIA_ROOT
+    """
+    relative = os.path.relpath(path, settings.MEDIA_ROOT)
+    if relative.startswith(os.pardir):
+        return None
+    return settings.MEDIA_URL + relative.replace(os.sep, '/')
+
+
+_render_cache = None
+_render_cache_lock = threading.Lock()
+
+
+def get_render_cache():
+    """
+    Retorna a instância do cache de renderizações do processo.
+
+    A instância é criada na primeira chamada a partir das configurações
+    RENDER_CACHE_MAX_BYTES, RENDER_CACHE_DIR e RENDER_CACHE_DISK_MAX_BYTES.
+
+    Returns:
+        RenderCache: Cache compartilhado pelas views
+    """
+    global _render_cache
+    with _render_cache_lock:
+        if _render_cache is None:
+            _render_cache = RenderCache(
+                max_bytes=getattr(settings, 'RENDER_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+                directory=getattr(settings, 'RENDER_CACHE_DIR', None),
+                max_disk_bytes=getattr(settings, 'RENDER_CACHE_DISK_MAX_BYTES', None),
+            )
+        return _render_cache
@@ -0,0 +1,339 @@
+"""
+Grafo de renderização incremental com memo de etapas.
+
+Enquanto o usuário arrasta um slider, o cliente envia só o ajuste alterado e
+a renderização no servidor refaria o pipeline inteiro. Aqui o pipeline é
+tratado como uma cadeia de etapas:
+
+    decodificação → desfoque → nitidez → cor
+
+A saída de cada etapa fica guardada por sessão (o arquivo de origem),
+identificada pelos parâmetros de todas as etapas anteriores a ela. Mudar só
+o contraste reaproveita a imagem já desfocada e nitidificada, e a única
+etapa recalculada é a de cor, de uma passada.
+
+A memória é limitada em dois níveis:
+    - STAGE_MEMO_SESSION_MAX_BYTES: ao passar deste total, a sessão descarta
+      suas próprias entradas menos usadas (outras sessões não são afetadas)
+    - STAGE_MEMO_MAX_BYTES: total do processo, com descarte LRU global
+
+Cada processo do pool de renderização tem seu memo; render_service.py envia
+as renderizações de uma mesma imagem ao mesmo worker para aproveitá-lo.
+"""
+from collections import OrderedDict
+import os
+import threading
+
+from django.conf import settings
+from PIL import ImageStat
+
+from .image_processor import ImageProcessor
+from .render_plan import compile_plan, plan_stages
+
+
+# Limite padrão do memo por processo: 256MB
+DEFAULT_STAGE_MEMO_MAX_BYTES = 256 * 1024 * 1024
+
+# Limite padrão por sessão: 128MB (decodificação + desfoque + nitidez de ~12MP)
+DEFAULT_STAGE_MEMO_SESSION_MAX_BYTES = 128 * 1024 * 1024
+
+
+def image_nbytes(img):
+    """Tamanho aproximado em memória de uma imagem decodificada."""
+    return img.width * img.height * len(img.getbands())
+
+
+class StageMemo:
+    """
+    Memo das saídas intermediárias do pipeline, por sessão e limitado em bytes.
+
+    As imagens guardadas são compartilhadas entre renderizações e nunca
+    devem ser modificadas in-place (todas as etapas do pipeline devolvem
+    imagens novas).
+
+    Exemplo:
+        >>> memo = StageMemo(max_bytes=256 * 1024 * 1024)
+        >>> blurred = memo.get(path, 'blur', (source, 2.0))
+        >>> if blurred is None:
+        ...     blurred = ImageProcessor.blur_stage(decoded, adjustments)
+        ...     memo.put(path, 'blur', (source, 2.0), blurred, image_nbytes(blurred))
+    """
+
+    def __init__(self, max_bytes, session_max_bytes=None):
+        """
+        Args:
+            max_bytes (int): Limite total de memória do memo
+            session_max_bytes (int): Limite por sessão (padrão: max_bytes)
+        """
+        self.max_bytes = max_bytes
+        self.session_max_bytes = session_max_bytes or max_bytes
+        self._entries = OrderedDict()  # (sessão, etapa, parâmetros) -> (valor, bytes)
+        self._session_bytes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, session, stage, params):
+        """
+        Retorna a saída guardada de uma etapa.
+
+        Args:
+            session (str): Identificador da sessão (arquivo de origem)
+            stage (str): Nome da etapa
+            params (tuple): Parâmetros da etapa e de todas as anteriores
+
+        Returns:
+            object | None: Valor guardado, ou None se ausente
+        """
+        key = (session, stage, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, session, stage, params, value, size):
+        """
+        Guarda a saída de uma etapa e aplica os limites de memória.
+
+        Valores maiores que o limite da sessão não são guardados.
+
+        Args:
+            session (str): Identificador da sessão
+            stage (str): Nome da etapa
+            params (tuple): Parâmetros da etapa e de todas as anteriores
+            value: Saída da etapa
+            size (int): Tamanho do valor em bytes
+        """
+        if size > self.session_max_bytes:
+            return
+
+        key = (session, stage, params)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            self._session_bytes[session] = self._session_bytes.get(session, 0) + size
+
+            # Primeiro a própria sessão abre espaço, depois o limite global
+            if self._session_bytes[session] > self.session_max_bytes:
+                self._evict(lambda k: k[0] == session and k != key,
+                            lambda: self._session_bytes.get(session, 0) > self.session_max_bytes)
+            if self._bytes > self.max_bytes:
+                self._evict(lambda k: k != key, lambda: self._bytes > self.max_bytes)
+
+    def drop(self, session):
+        """Remove todas as entradas de uma sessão."""
+        with self._lock:
+            self._evict(lambda k: k[0] == session, lambda: True)
+
+    def clear(self):
+        """Esvazia o memo."""
+        with self._lock:
+            self._entries.clear()
+            self._session_bytes.clear()
+            self._bytes = 0
+
+    def _evict(self, matches, over_limit):
+        """Remove entradas (da menos usada para a mais usada) enquanto over_limit()."""
+        for key in [k for k in self._entries if matches(k)]:
+            if not over_limit():
+                break
+            _, size = self._entries.pop(key)
+            self._bytes -= size
+            remaining = self._session_bytes.get(key[0], 0) - size
+            if remaining:
+                self._session_bytes[key[0]] = remaining
+            else:
+                self._session_bytes.pop(key[0], None)
+
+
+# Etapas espaciais, na ordem do pipeline (a etapa de cor vem depois)
+SPATIAL_STAGES = ('blur', 'sharpness')
+
+
+def spatial_key(adjustments):
+    """
+    Identifica o prefixo espacial (desfoque e nitidez) de um conjunto de ajustes.
+
+    Ajustes com a mesma chave compartilham a saída das etapas espaciais e só
+    diferem na etapa de cor.
+
+    Returns:
+        tuple: (desfoque, nitidez) como floats
+    """
+    return tuple(float(adjustments.get(stage, 0)) for stage in SPATIAL_STAGES)
+
+
+def _decode(img, session, memo, need_means=True):
+    """
+    Etapa de decodificação, reaproveitada do memo quando possível.
+
+    Args:
+        need_means (bool): Se as médias por canal serão usadas; com o
+            contraste neutro o cinza médio não é necessário e o histograma
+            não é percorrido
+
+    Returns:
+        tuple: (imagem decodificada, médias por canal ou None, parâmetros da etapa)
+    """
+    stat = os.stat(session)
+    # Parâmetros acumulados: a versão do arquivo e depois cada etapa espacial
+    params = (stat.st_mtime_ns, stat.st_size)
+
+    decoded = memo.get(session, 'decode', params)
+    if decoded is not None:
+        img.close()
+    else:
+        decoded = ImageProcessor._normalize_mode(img)
+        decoded.load()
+        # Imagens RGBA mapeadas do decoded_store (somente leitura) ficam no
+        # page cache, compartilhadas entre processos: não contam no limite do
+        # memo (as RGBX convertidas para RGB são cópias e contam)
+        size = 0 if decoded.readonly else image_nbytes(decoded)
+        memo.put(session, 'decode', params, decoded, size)
+
+    if not need_means:
+        return decoded, None, params
+
+    # As médias por canal (para o cinza médio do contraste) são medidas na
+    # imagem decodificada, como em process_image
+    means = memo.get(session, 'means', params)
+    if means is None:
+        means = ImageStat.Stat(decoded).mean
+        memo.put(session, 'means', params, means, 0)
+    return decoded, means, params
+
+
+def _uses_pivot(adjustments):
+    """Indica se a etapa de cor precisa do cinza médio (contraste ativo)."""
+    return 'color' in plan_stages(adjustments) and float(adjustments.get('contrast', 0)) != 0
+
+
+def _spatial(decoded, session, params, adjustments, memo, plan):
+    """
+    Executa as etapas espaciais do plano, reaproveitando as saídas do memo.
+
+    O backend de cada etapa entra nos parâmetros guardados: um desfoque 'pil'
+    e um 'fast' do mesmo raio não são a mesma imagem.
+    """
+    steps = {step.stage: step for step in plan.steps}
+    current = decoded
+    for stage in SPATIAL_STAGES:
+        step = steps.get(stage)
+        if step is None:
+            params = params + (0.0,)
+            continue
+        params = params + (float(adjustments.get(stage, 0)), step.backend)
+        cached = memo.get(session, stage, params)
+        if cached is None:
+            cached = ImageProcessor.execute_step(step, current, adjustments)
+            if cached is not current:
+                memo.put(session, stage, params, cached, image_nbytes(cached))
+        current = cached
+    return current
+
+
+def _color(current, decoded, adjustments, means, plan):
+    """Executa a etapa de cor do plano (se houver) sobre a saída espacial."""
+    for step in plan.steps:
+        if step.stage == 'color':
+            pivot = ImageProcessor.contrast_pivot(decoded, adjustments, means)
+            return ImageProcessor.execute_step(step, current, adjustments, pivot)
+    return current
+
+
+def render_stages(img, image_path, adjustments, memo, backend=None, plan=None):
+    """
+    Executa o pipeline reaproveitando as etapas já guardadas no memo.
+
+    Args:
+        img (PIL.Image): Imagem aberta (ainda não decodificada) de image_path
+        image_path: Caminho do arquivo de origem; objetos de arquivo não são
+            memorizados
+        adjustments (dict): Ajustes no formato de ImageSession.get_adjustments()
+        memo (StageMemo): Memo de etapas
+        backend (str): Backend da etapa de cor (ver ImageProcessor.color_stage);
+            ignorado se plan for informado
+        plan (RenderPlan): Plano compilado para a imagem (ver
+            render_plan.compile_plan); se omitido, é compilado aqui. Só as
+            etapas do plano são executadas, com os backends do plano
+
+    Returns:
+        PIL.Image: Imagem processada (RGB ou RGBA), que não deve ser
+        modificada in-place
+    """
+    if plan is None:
+        plan = compile_plan(adjustments, img.size, backend, tiled=False)
+    if not isinstance(image_path, (str, os.PathLike)):
+        return ImageProcessor.execute_plan(plan, ImageProcessor._normalize_mode(img), adjustments)
+
+    session = os.fspath(image_path)
+    decoded, means, params = _decode(img, session, memo, _uses_pivot(adjustments))
+    current = _spatial(decoded, session, params, adjustments, memo, plan)
+    return _color(current, decoded, adjustments, means, plan)
+
+
+def render_variants(img, image_path, adjustments_list, memo, backend=None):
+    """
+    Renderiza vários conjuntos de ajustes sobre a mesma imagem.
+
+    A imagem é decodificada uma única vez e os conjuntos são agrupados pelo
+    prefixo espacial (spatial_key): desfoque e nitidez rodam uma vez por
+    grupo, e cada conjunto só paga a etapa de cor.
+
+    Args:
+        img (PIL.Image): Imagem aberta (ainda não decodificada) de image_path
+        image_path (str): Caminho do arquivo de origem
+        adjustments_list (list): Conjuntos de ajustes completos
+        memo (StageMemo): Memo de etapas
+        backend (str): Backend da etapa de cor
+
+    Yields:
+        tuple: (índice em adjustments_list, PIL.Image processada), agrupados
+        por prefixo espacial; as imagens não devem ser modificadas in-place
+    """
+    groups = {}
+    for index, adjustments in enumerate(adjustments_list):
+        groups.setdefault(spatial_key(adjustments), []).append(index)
+
+    session = os.fspath(image_path)
+    need_means = any(_uses_pivot(adjustments) for adjustments in adjustments_list)
+    decoded, means, params = _decode(img, session, memo, need_means)
+
+    for indices in groups.values():
+        # A saída espacial fica referenciada durante todo o grupo, mesmo que
+        # o memo a descarte
+        first = adjustments_list[indices[0]]
+        plan = compile_plan(first, decoded.size, backend, tiled=False)
+        spatial = _spatial(decoded, session, params, first, memo, plan)
+        for index in indices:
+            adjustments = adjustments_list[index]
+            plan = compile_plan(adjustments, decoded.size, backend, tiled=False)
+            yield index, _color(spatial, decoded, adjustments, means, plan)
+
+
+_memo = None
+_memo_lock = threading.Lock()
+
+
+def get_stage_memo():
+    """
+    Retorna o memo de etapas do processo (criado na primeira chamada).
+
+    Returns:
+        StageMemo: Instância configurada por STAGE_MEMO_MAX_BYTES e
+        STAGE_MEMO_SESSION_MAX_BYTES
+    """
+    global _memo
+    with _memo_lock:
+        if _memo is None:
+            _memo = StageMemo(
+                max_bytes=getattr(settings, 'STAGE_MEMO_MAX_BYTES',
+                                  DEFAULT_STAGE_MEMO_MAX_BYTES),
+                session_max_bytes=getattr(settings, 'STAGE_MEMO_SESSION_MAX_BYTES',
+                                          DEFAULT_STAGE_MEMO_SESSION_MAX_BYTES),
+            )
+        return _memo
@@ -0,0 +1,359 @@
+"""
+Compilador do plano de renderização, com modelo de custo por etapa.
+
+Com os valores padrão (saturação 100, brilho, contraste e nitidez 0,
+desfoque 0) todas as etapas são a identidade, e ainda assim a imagem era
+decodificada, passada pelo pipeline e recodificada. O planejador lista só
+as etapas que alteram a imagem:
+
+    - process_image e o memo de etapas (render_graph.py) executam apenas
+      as etapas do plano
+    - Quando o plano fica vazio (is_identity), as views servem os bytes do
+      próprio original, sem decodificar nem recodificar (uma recodificação
+      JPEG só perderia qualidade)
+
+compile_plan transforma os ajustes e o tamanho da imagem em um plano
+(RenderPlan) que ImageProcessor.execute_plan executa, etapa por etapa, com
+os métodos de etapa de ImageProcessor:
+
+    - Desfoque: 'pil' ou 'fast' (ver blur.py), o mais barato pelo modelo de
+      custo entre os permitidos (BLUR_BACKEND). Em imagens muito pequenas o
+      custo fixo da redução e ampliação não compensa e vence o 'pil'. Em
+      tiles, sempre 'pil'
+    - Nitidez: unsharp mask com o filtro SMOOTH 3x3 ('smooth'), depois do
+      desfoque (a mesma ordem da renderização incremental, que reaproveita
+      a imagem desfocada quando só a nitidez muda). A máscara é uma
+      convolução própria da imagem desfocada: a saída do desfoque não serve
+      de máscara, porque a nitidez precisa atuar sobre ela, e não sobre o
+      original
+    - Cor: matriz de cor ('pil') ou NumPy ('numpy'); com saturação 0% ou
+      100%, também a LUT composta de saturação, brilho e contraste ('lut').
+      A LUT custa menos por pixel, mas montá-la tem um custo fixo: em
+      imagens pequenas (miniaturas, tiles de preview) a matriz vence. Com as
+      medições atuais o 'numpy' nunca é o mais barato (mais caro por pixel e
+      por chamada); ele só é usado com IMAGE_PROCESSOR_BACKEND = 'numpy'
+    - Tiles: quando o pico de memória estimado do plano sem tiles passa de
+      RENDER_MAX_PEAK_BYTES, a renderização é feita em tiles (memória
+      limitada; ver tiling.py). O pico depende do tamanho, do número de
+      etapas e do backend (o 'numpy' aloca um array float32)
+
+O custo de cada etapa é estimado como um custo fixo por chamada
+(DEFAULT_STAGE_OVERHEADS, em microssegundos) mais um custo por pixel
+(DEFAULT_STAGE_COSTS, em nanossegundos), medidos com imagens de 16x16 a
+12MP; podem ser recalibrados em settings.RENDER_STAGE_OVERHEADS e
+settings.RENDER_STAGE_COSTS. Em tiles, o custo fixo é pago uma vez por tile.
+O plano é exposto em JSON (plan_to_json) no endpoint
+GET /api/render/<session_id>/plan/, para depuração.
+
+Uso típico:
+    >>> plan = compile_plan(session.get_adjustments(), (4000, 3000))
+    >>> result = ImageProcessor.execute_plan(plan, img, adjustments)
+"""
+from collections import namedtuple
+
+from django.conf import settings
+
+from . import lut
+from .blur import BLUR_BACKENDS, downsample_factor
+from .numpy_engine import color_factors
+
+
+# Etapas do pipeline, na ordem de execução
+STAGES = ('blur', 'sharpness', 'color')
+
+# Backends da etapa de cor (saturação, brilho e contraste)
+#   - 'pil': matriz de cor aplicada com Image.convert
+#   - 'numpy': motor vetorizado in-place (ver numpy_engine.py)
+# settings.IMAGE_PROCESSOR_BACKEND também aceita 'auto' (o mais barato pelo
+# modelo de custo). Com saturação 0% ou 100% a etapa usa uma LUT composta
+# ('lut'), qualquer que seja o backend
+COLOR_BACKENDS = ('pil', 'numpy')
+
+# Custo estimado de cada operação em nanossegundos por pixel
+#   - blur.pil: GaussianBlur na resolução original (quase independe do raio)
+#   - blur.resample: redução e ampliação do backend fast (o desfoque em si
+#     custa blur.pil / fator²)
+#   - tiled: multiplicador do custo total na renderização em tiles (halo e
+#     cópias de cada tile)
+DEFAULT_STAGE_COSTS = {
+    'blur.pil': 35.0,
+    'blur.resample': 9.0,
+    'sharpness.smooth': 25.0,
+    'color.lut': 2.0,
+    'color.pil': 4.0,
+    'color.numpy': 15.0,
+    'tiled': 1.4,
+}
+
+# Custo fixo de cada operação em microssegundos por chamada (alocações,
+# montagem de tabelas), que domina nas imagens pequenas
+#   - blur.fast: as duas reamostragens do backend fast
+#   - color.lut: montagem da LUT composta em Python
+#   - color.numpy: conversão da imagem para array e de volta
+DEFAULT_STAGE_OVERHEADS = {
+    'blur.pil': 5.0,
+    'blur.fast': 15.0,
+    'sharpness.smooth': 5.0,
+    'color.lut': 55.0,
+    'color.pil': 5.0,
+    'color.numpy': 30.0,
+}
+
+# Lado padrão dos tiles (o mesmo de tiling.DEFAULT_TILE_SIZE), para contar
+# os tiles no custo fixo
+DEFAULT_TILE_SIZE = 512
+
+# Pico de memória padrão acima do qual a renderização usa tiles: três imagens
+# de 16MP (192MB); um plano completo (desfoque, nitidez e cor, quatro imagens
+# no pico) sobre 12MP ainda roda sem tiles
+DEFAULT_MAX_PEAK_BYTES = 3 * 16_000_000 * 4
+
+# Bytes por pixel de uma imagem RGB/RGBA do Pillow e do array do motor NumPy
+# (float32 por canal mais o plano de luminância)
+IMAGE_BYTES_PER_PIXEL = 4
+NUMPY_BYTES_PER_PIXEL = 16
+
+# Etapa do plano:
+#   stage: 'blur', 'sharpness' ou 'color'
+#   backend: implementação escolhida para a etapa
+#   cost: tempo estimado em milissegundos
+#   params: parâmetros relevantes (para depuração)
+PlanStep = namedtuple('PlanStep', 'stage backend cost params')
+
+# Plano completo:
+#   size: (largura, altura) da imagem
+#   tiled: se a renderização é feita em tiles
+#   steps: etapas (PlanStep) na ordem de execução
+#   cost: tempo total estimado em milissegundos
+#   peak_bytes: memória estimada no pico (imagens intermediárias)
+RenderPlan = namedtuple('RenderPlan', 'size tiled steps cost peak_bytes')
+
+# Testes de cada etapa: True se a etapa altera a imagem com estes ajustes
+_ACTIVE = {
+    'blur': lambda adjustments: float(adjustments.get('blur', 0)) > 0,
+    'sharpness': lambda adjustments: float(adjustments.get('sharpness', 0)) != 0,
+    'color': lambda adjustments: color_factors(adjustments) != (1, 1, 1),
+}
+
+
+def plan_stages(adjustments):
+    """
+    Lista as etapas que precisam rodar, descartando as que são a identidade.
+
+    Args:
+        adjustments (dict): Ajustes no formato de ImageSession.get_adjustments()
+
+    Returns:
+        tuple: Nomes das etapas ativas, na ordem de STAGES
+    """
+    return tuple(stage for stage in STAGES if _ACTIVE[stage](adjustments))
+
+
+def is_identity(adjustments):
+    """
+    Indica se o conjunto de ajustes inteiro não altera a imagem.
+
+    Args:
+        adjustments (dict): Ajustes no formato de ImageSession.get_adjustments()
+
+    Returns:
+        bool: True se nenhuma etapa estiver ativa
+    """
+    return not plan_stages(adjustments)
+
+
+def stage_costs():
+    """Custos por pixel do modelo: DEFAULT_STAGE_COSTS com settings.RENDER_STAGE_COSTS."""
+    return {**DEFAULT_STAGE_COSTS, **getattr(settings, 'RENDER_STAGE_COSTS', {})}
+
+
+def stage_overheads():
+    """Custos fixos do modelo: DEFAULT_STAGE_OVERHEADS com settings.RENDER_STAGE_OVERHEADS."""
+    return {**DEFAULT_STAGE_OVERHEADS, **getattr(settings, 'RENDER_STAGE_OVERHEADS', {})}
+
+
+def _cost_ms(overhead_us, ns_per_pixel, pixels, calls=1):
+    """Tempo estimado em milissegundos: custo fixo por chamada mais custo por pixel."""
+    return overhead_us * calls / 1e3 + ns_per_pixel * pixels / 1e6
+
+
+def _blur_step(adjustments, pixels, calls, blur_backend, tiled):
+    """Escolhe o backend do desfoque pelo custo (o fast só reduz com fator >= 2)."""
+    costs, overheads = stage_costs(), stage_overheads()
+    radius = float(adjustments.get('blur', 0))
+    allowed = blur_backend or getattr(settings, 'BLUR_BACKEND', 'pil')
+    if allowed not in BLUR_BACKENDS:
+        raise ValueError(f'Backend de desfoque inválido: {allowed}')
+
+    # Desfoque exato em tiles: a grade da redução do fast deixaria emendas
+    factor = downsample_factor(radius) if allowed == 'fast' and not tiled else 1
+    options = {'pil': _cost_ms(overheads['blur.pil'], costs['blur.pil'], pixels, calls)}
+    if factor >= 2:
+        per_pixel = costs['blur.pil'] / factor ** 2 + costs['blur.resample']
+        options['fast'] = _cost_ms(overheads['blur.fast'], per_pixel, pixels, calls)
+    backend = min(options, key=options.get)
+
+    return PlanStep('blur', backend, options[backend], {
+        'radius': radius,
+        'factor': factor if backend == 'fast' else 1,
+    })
+
+
+def _color_options(adjustments, backend, pixels, calls):
+    """Custo de cada implementação de cor permitida (só por pixel se pixels for None)."""
+    costs, overheads = stage_costs(), stage_overheads()
+    names = [backend] if backend in COLOR_BACKENDS else list(COLOR_BACKENDS)
+    # Tudo pontual por canal: a LUT composta vale com qualquer backend
+    if lut.supports(adjustments):
+        names.append('lut')
+    if pixels is None:
+        return {name: costs[f'color.{name}'] for name in names}
+    return {
+        name: _cost_ms(overheads[f'color.{name}'], costs[f'color.{name}'], pixels, calls)
+        for name in names
+    }
+
+
+def color_backend(adjustments, backend=None, pixels=None, calls=1):
+    """
+    Escolhe a implementação da etapa de cor.
+
+    Args:
+        adjustments (dict): Ajustes da sessão
+        backend (str): 'pil', 'numpy' ou 'auto' ('lut' também é aceito e
+            equivale a 'auto'); se omitido, usa settings.IMAGE_PROCESSOR_BACKEND
+        pixels (int): Pixels da imagem; se omitido, só o custo por pixel
+            conta (imagens grandes)
+        calls (int): Número de chamadas da etapa (tiles), para o custo fixo
+
+    Returns:
+        str: 'lut' (só com saturação 0% ou 100%), 'pil' ou 'numpy'
+
+    Raises:
+        ValueError: Se o backend informado não existir
+    """
+    backend = backend or getattr(settings, 'IMAGE_PROCESSOR_BACKEND', 'auto')
+    if backend not in COLOR_BACKENDS + ('auto', 'lut'):
+        raise ValueError(f'Backend de processamento inválido: {backend}')
+
+    options = _color_options(adjustments, backend, pixels, calls)
+    return min(options, key=options.get)
+
+
+def _peak_buffers(steps):
+    """
+    Número de imagens inteiras vivas no pico de uma renderização sem tiles.
+
+    A decodificada fica viva até o fim (o cinza médio do contraste vem
+    dela); cada etapa mantém sua entrada e sua saída, e a nitidez ainda a
+    máscara SMOOTH da entrada. A primeira etapa lê a própria decodificada.
+
+    Returns:
+        int: Imagens simultâneas (1 se não houver etapas)
+    """
+    peak = 1
+    for index, step in enumerate(steps):
+        live = 2 if index == 0 else 3
+        if step.stage == 'sharpness':
+            live += 1
+        peak = max(peak, live)
+    return peak
+
+
+def compile_plan(adjustments, size, backend=None, blur_backend=None, tiled=None):
+    """
+    Compila os ajustes em um plano de execução para uma imagem.
+
+    Args:
+        adjustments (dict): Ajustes no formato de ImageSession.get_adjustments()
+        size (tuple): (largura, altura) da imagem
+        backend (str): Backend da etapa de cor ('pil', 'numpy' ou 'auto');
+            se omitido, usa settings.IMAGE_PROCESSOR_BACKEND
+        blur_backend (str): Backends permitidos no desfoque ('pil' ou 'fast');
+            se omitido, usa settings.BLUR_BACKEND
+        tiled (bool): Força (True) ou desativa (False) os tiles; se omitido,
+            usa tiles quando o pico estimado sem tiles passar de
+            settings.RENDER_MAX_PEAK_BYTES
+
+    Returns:
+        RenderPlan: Plano (sem etapas se os ajustes forem a identidade)
+
+    Raises:
+        ValueError: Se algum backend informado não existir
+    """
+    stages = plan_stages(adjustments)
+
+    if tiled is None:
+        untiled = _compile(adjustments, size, stages, backend, blur_backend, False)
+        budget = getattr(settings, 'RENDER_MAX_PEAK_BYTES', DEFAULT_MAX_PEAK_BYTES)
+        if untiled.peak_bytes <= budget:
+            return untiled
+        tiled = True
+    return _compile(adjustments, size, stages, backend, blur_backend, tiled)
+
+
+def _compile(adjustments, size, stages, backend, blur_backend, tiled):
+    """Monta o plano com a decisão de tiles já tomada (ver compile_plan)."""
+    width, height = size
+    pixels = width * height
+    costs, overheads = stage_costs(), stage_overheads()
+
+    # Em tiles, cada etapa é chamada uma vez por tile
+    calls = 1
+    if tiled:
+        tile_size = getattr(settings, 'TILE_SIZE', DEFAULT_TILE_SIZE)
+        calls = -(-width // tile_size) * -(-height // tile_size)
+
+    steps = []
+    if 'blur' in stages:
+        steps.append(_blur_step(adjustments, pixels, calls, blur_backend, tiled))
+    if 'sharpness' in stages:
+        cost = _cost_ms(overheads['sharpness.smooth'], costs['sharpness.smooth'], pixels, calls)
+        steps.append(PlanStep('sharpness', 'smooth', cost, {
+            'amount': float(adjustments.get('sharpness', 0)) / 100,
+        }))
+    if 'color' in stages:
+        engine = color_backend(adjustments, backend, pixels, calls)
+        cost = _cost_ms(overheads[f'color.{engine}'], costs[f'color.{engine}'], pixels, calls)
+        saturation, brightness, contrast = color_factors(adjustments)
+        steps.append(PlanStep('color', engine, cost, {
+            'saturation': saturation,
+            'brightness': brightness,
+            'contrast': contrast,
+        }))
+
+    cost = sum(step.cost for step in steps)
+    if tiled:
+        cost *= costs['tiled']
+
+    # Em tiles, só a saída e a faixa em andamento contam para a imagem inteira
+    buffers = _peak_buffers(steps) if not tiled else 1
+    peak_bytes = buffers * pixels * IMAGE_BYTES_PER_PIXEL
+    if any(step.backend == 'numpy' for step in steps) and not tiled:
+        peak_bytes += pixels * NUMPY_BYTES_PER_PIXEL
+
+    return RenderPlan((width, height), tiled, tuple(steps), cost, peak_bytes)
+
+
+def plan_to_json(plan):
+    """
+    Converte um plano em um dicionário serializável em JSON (depuração).
+
+    Returns:
+        dict: {'size', 'tiled', 'cost_ms', 'peak_bytes', 'steps': [...]}
+    """
+    return {
+        'size': list(plan.size),
+        'tiled': plan.tiled,
+        'cost_ms': round(plan.cost, 2),
+        'peak_bytes': plan.peak_bytes,
+        'steps': [
+            {
+                'stage': step.stage,
+                'backend': step.backend,
+                'cost_ms': round(step.cost, 2),
+                'params': step.params,
+            }
+            for step in plan.steps
+        ],
+    }
@@ -0,0 +1,401 @@
+"""
+Serviço de renderização server-side.
+
+Ponto único usado pelas views e pela fila de previews para obter a
+renderização de um conjunto de ajustes: consulta o cache de renderizações
+(render_cache.py) e, em caso de falta, renderiza com ImageProcessor e guarda
+o resultado.
+
+As renderizações rodam em um pool de processos (RENDER_POOL_SIZE), usando
+todos os núcleos em vez de ficarem serializadas pelo GIL na thread da
+requisição:
+    - O worker lê o original direto do disco (nada da imagem é serializado
+      na ida) e devolve só os bytes codificados. Eles precisam de qualquer
+      forma de uma cópia no processo pai (o cache em memória guarda bytes),
+      e o pickle faz exatamente essa cópia, sem segmentos de memória
+      compartilhada para limpar (o /dev/shm do Docker tem só 64MB)
+    - O número de renderizações pendentes é limitado por RENDER_QUEUE_MAX;
+      acima disso render() levanta RenderQueueFull e as views respondem 429
+
+    - Cada worker mantém o memo de etapas (render_graph.py); as
+      renderizações de uma mesma imagem vão, por afinidade, ao mesmo worker,
+      que reaproveita a decodificação, o desfoque e a nitidez já calculados.
+      Se esse worker estiver ocupado e outro estiver livre, o livre é usado
+
+Com RENDER_POOL_SIZE = 0 a renderização acontece na própria thread.
+
+As variantes assíncronas (arender, arender_cached) são usadas pelas views
+ASGI e aguardam o pool sem bloquear o event loop.
+
+render_many renderiza lotes (exportação em massa), entregando cada item
+assim que termina.
+"""
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import asyncio
+import io
+from multiprocessing import get_context
+import os
+import threading
+import zlib
+
+from django.conf import settings
+
+from .image_processor import ImageProcessor
+from .render_cache import get_render_cache, make_key
+from .render_graph import get_stage_memo
+
+
+class RenderQueueFull(Exception):
+    """Levantada quando a fila de renderização atingiu RENDER_QUEUE_MAX."""
+
+
+_workers = None
+_slots = None
+_executor_lock = threading.Lock()
+
+
+class _Worker:
+    """Um processo do pool de renderização e o número de trabalhos pendentes nele."""
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.pending = 0
+
+
+def _init_worker():
+    """Inicializa o Django nos processos do pool (iniciados com 'spawn')."""
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    django.setup()
+
+
+def _render_worker(image_path, adjustments, fmt=None):
+    """
+    Renderiza no processo worker.
+
+    Args:
+        image_path (str): Caminho do arquivo original
+        adjustments (dict): Ajustes completos
+        fmt (OutputFormat): Formato de saída (ver encoders.py)
+
+    Returns:
+        bytes: Imagem codificada
+    """
+    output = io.BytesIO()
+    ImageProcessor.render_to(image_path, adjustments, output, memo=get_stage_memo(), fmt=fmt)
+    # getvalue() entrega o próprio buffer do BytesIO, sem copiar o resultado
+    return output.getvalue()
+
+
+def get_workers():
+    """
+    Retorna os workers do pool de renderização (criados na primeira chamada).
+
+    Cada worker é um executor de um único processo, para que as
+    renderizações de uma imagem possam ser enviadas sempre ao mesmo processo
+    (e ao seu memo de etapas).
+
+    Returns:
+        list | None: Workers, ou None se RENDER_POOL_SIZE for 0
+    """
+    global _workers, _slots
+    with _executor_lock:
+        if _workers is None:
+            pool_size = getattr(settings, 'RENDER_POOL_SIZE', os.cpu_count())
+            if not pool_size:
+                return None
+            _workers = [
+                _Worker(ProcessPoolExecutor(
+                    max_workers=1,
+                    # 'spawn' evita herdar locks das threads do servidor via fork
+                    mp_context=get_context('spawn'),
+                    initializer=_init_worker,
+                ))
+                for _ in range(pool_size)
+            ]
+            _slots = threading.BoundedSemaphore(
+                getattr(settings, 'RENDER_QUEUE_MAX', pool_size * 4)
+            )
+        return _workers
+
+
+def _pick_worker(workers, image_path):
+    """
+    Escolhe o worker de uma renderização.
+
+    Prefere o worker da imagem (afinidade por hash do caminho), onde o memo
+    de etapas já está quente; se ele estiver ocupado e houver um worker
+    livre, usa o livre.
+    """
+    preferred = workers[zlib.crc32(str(image_path).encode()) % len(workers)]
+    if preferred.pending:
+        idle = min(workers, key=lambda worker: worker.pending)
+        if not idle.pending:
+            return idle
+    return preferred
+
+
+def _submit(workers, image_path, block, function, *args, worker=None):
+    """
+    Envia um trabalho ao pool, reservando uma vaga na fila.
+
+    A vaga é liberada quando o trabalho termina (com sucesso ou erro).
+
+    Args:
+        image_path: Original usado pelo trabalho (define a afinidade)
+        function: Função executada no worker (_render_worker ou uma tarefa)
+        *args: Argumentos da função
+        worker (_Worker): Worker a usar; se omitido, é escolhido por
+            _pick_worker
+
+    Raises:
+        RenderQueueFull: Se não houver vaga e block for False
+    """
+    if not _slots.acquire(blocking=block):
+        raise RenderQueueFull('Fila de renderização cheia')
+    with _executor_lock:
+        worker = worker or _pick_worker(workers, image_path)
+        worker.pending += 1
+    try:
+        future = worker.executor.submit(function, *args)
+    except BaseException:
+        _done(worker)
+        raise
+    future.add_done_callback(lambda _: _done(worker))
+    return future
+
+
+def _done(worker):
+    """Libera a vaga na fila e o trabalho pendente do worker."""
+    with _executor_lock:
+        worker.pending -= 1
+    _slots.release()
+
+
+async def _await_result(future):
+    """
+    Aguarda o resultado de um trabalho do pool a partir do event loop.
+
+    Se a view for cancelada (o Django cancela views assíncronas quando o
+    cliente desconecta), o trabalho ainda não iniciado é cancelado e libera
+    sua vaga na fila; um trabalho em andamento termina e o resultado é
+    descartado.
+
+    Returns:
+        bytes: Resultado do trabalho
+    """
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+
+
+def render(image_path, adjustments, block=False, fmt=None):
+    """
+    Renderiza os ajustes (sem consultar o cache).
+
+    Args:
+        image_path (str): Caminho do arquivo original
+        adjustments (dict): Ajustes completos
+        block (bool): Se True, espera por uma vaga na fila em vez de levantar
+            RenderQueueFull (usado por tarefas em segundo plano)
+        fmt (OutputFormat): Formato de saída (padrão: JPEG, ver encoders.py)
+
+    Returns:
+        bytes: Imagem codificada
+
+    Raises:
+        RenderQueueFull: Se a fila estiver cheia e block for False
+    """
+    workers = get_workers()
+    if workers is None:
+        output = io.BytesIO()
+        ImageProcessor.render_to(image_path, adjustments, output, memo=get_stage_memo(),
+                                 fmt=fmt)
+        # getvalue() entrega o próprio buffer do BytesIO quando não há views
+        # abertas, sem copiar o resultado
+        return output.getvalue()
+
+    return _submit(
+        workers, image_path, block, _render_worker, str(image_path), adjustments, fmt,
+    ).result()
+
+
+async def arender(image_path, adjustments, fmt=None):
+    """
+    Versão assíncrona de render(), para as views ASGI.
+
+    O event loop não bloqueia: o resultado do pool é aguardado como future
+    asyncio, e no modo sem pool a renderização roda em uma thread.
+
+    Raises:
+        RenderQueueFull: Se a fila estiver cheia
+    """
+    workers = get_workers()
+    if workers is None:
+        return await asyncio.to_thread(render, image_path, adjustments, False, fmt)
+
+    future = _submit(workers, image_path, False, _render_worker, str(image_path),
+                     adjustments, fmt)
+    return await _await_result(future)
+
+
+async def arun_task(image_path, task, *args):
+    """
+    Executa uma tarefa de renderização personalizada no pool, sem bloquear o event loop.
+
+    A tarefa vai ao worker com afinidade pela imagem, aproveitando o memo de
+    etapas daquele processo.
+
+    Args:
+        image_path (str): Original usado pela tarefa (define a afinidade)
+        task: Função de nível de módulo que devolve bytes
+            (ex.: contact_sheet.render_contact_sheet)
+        *args: Argumentos da função
+
+    Returns:
+        bytes: Resultado da tarefa
+
+    Raises:
+        RenderQueueFull: Se a fila estiver cheia
+    """
+    workers = get_workers()
+    if workers is None:
+        return await asyncio.to_thread(task, *args)
+
+    future = _submit(workers, image_path, False, task, *args)
+    return await _await_result(future)
+
+
+def render_cached(image_path, adjustments, fmt=None):
+    """
+    Retorna a renderização dos ajustes, usando o cache sempre que possível.
+
+    Args:
+        image_path (str): Caminho do arquivo original
+        adjustments (dict): Ajustes completos (use ImageSession.get_adjustments())
+        fmt (OutputFormat): Formato de saída (padrão: JPEG, ver encoders.py)
+
+    Returns:
+        tuple: (chave, bytes da imagem codificada, True se veio do cache)
+
+    Raises:
+        RenderQueueFull: Se for preciso renderizar e a fila estiver cheia
+
+    Exemplo:
+        >>> key, data, cached = render_cached(session.original_image.path,
+        ...                                   session.get_adjustments())
+    """
+    cache = get_render_cache()
+    key = make_key(image_path, adjustments, fmt)
+
+    data = cache.get(key)
+    if data is not None:
+        return key, data, True
+
+    data = render(image_path, adjustments, fmt=fmt)
+    cache.put(key, data)
+    return key, data, False
+
+
+async def arender_cached(image_path, adjustments, fmt=None):
+    """
+    Versão assíncrona de render_cached(), para as views ASGI.
+
+    O hash do original e as leituras/escritas do cache em disco rodam em
+    threads, sem bloquear o event loop.
+
+    Returns:
+        tuple: (chave, bytes da imagem codificada, True se veio do cache)
+
+    Raises:
+        RenderQueueFull: Se for preciso renderizar e a fila estiver cheia
+    """
+    cache = get_render_cache()
+    key = await asyncio.to_thread(make_key, image_path, adjustments, fmt)
+
+    data = await asyncio.to_thread(cache.get, key)
+    if data is not None:
+        return key, data, True
+
+    data = await arender(image_path, adjustments, fmt)
+    await asyncio.to_thread(cache.put, key, data)
+    return key, data, False
+
+
+def render_many(jobs, fmt=None):
+    """
+    Renderiza vários conjuntos de ajustes em paralelo, entregando cada
+    resultado assim que fica pronto.
+
+    Cada original distinto é atribuído a um único worker (em rodízio entre
+    os workers), então todos os itens da mesma imagem compartilham a
+    decodificação e as etapas do memo daquele processo, enquanto originais
+    diferentes rodam em paralelo. Resultados já presentes no cache são
+    entregues sem renderizar. O número de renderizações em andamento é
+    limitado a duas por worker, e a fila (RENDER_QUEUE_MAX) é aguardada em
+    vez de levantar RenderQueueFull.
+
+    Args:
+        jobs (list): Pares (caminho do original, ajustes completos)
+        fmt (OutputFormat): Formato de saída de todos os itens (padrão: JPEG)
+
+    Yields:
+        tuple: (índice do job, bytes da imagem ou None, exceção ou None),
+        na ordem em que terminam
+
+    Exemplo:
+        >>> for index, data, error in render_many([(path, adj1), (path, adj2)]):
+        ...     print(index, len(data) if data else error)
+    """
+    cache = get_render_cache()
+    workers = get_workers()
+    queue = deque(enumerate(jobs))
+    running = {}  # future -> (índice, chave do cache)
+    assigned = {}  # original -> worker
+    limit = len(workers) * 2 if workers else 1
+
+    try:
+        while queue or running:
+            while queue and len(running) < limit:
+                index, (image_path, adjustments) = queue.popleft()
+                try:
+                    key = make_key(image_path, adjustments, fmt)
+                    data = cache.get(key)
+                    if data is None and workers is None:
+                        data = render(image_path, adjustments, fmt=fmt)
+                        cache.put(key, data)
+                except Exception as e:
+                    yield index, None, e
+                    continue
+                if data is not None:
+                    yield index, data, None
+                    continue
+
+                path = str(image_path)
+                if path not in assigned:
+                    assigned[path] = workers[len(assigned) % len(workers)]
+                future = _submit(workers, path, True, _render_worker, path, adjustments,
+                                 fmt, worker=assigned[path])
+                running[future] = (index, key)
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, key = running.pop(future)
+                try:
+                    data = future.result()
+                    cache.put(key, data)
+                except Exception as e:
+                    yield index, None, e
+                    continue
+                yield index, data, None
+    finally:
+        # Consumidor desistiu (ex.: cliente desconectou): cancela as
+        # renderizações que ainda não começaram, liberando suas vagas
+        for future in running:
+            future.cancel()
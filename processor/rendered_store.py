@@ -0,0 +1,327 @@
+"""
+Armazenamento temporário das imagens renderizadas pelo cliente.
+
+Quando o navegador já renderizou a imagem no canvas e a envia via
+upload_rendered, o arquivo é guardado aqui para que download_image o sirva
+diretamente, sem renderizar de novo no servidor.
+
+Organização em disco (RENDERED_STORE_DIR):
+    blobs/<sha256>.<ext>              Conteúdo, deduplicado pelo hash
+    entries/<session_id>/<chave>.ref  Referência ao blob para um conjunto de ajustes
+
+Envios idênticos (mesmo conteúdo) compartilham um único blob. Uma thread em
+segundo plano remove as referências mais antigas que RENDERED_STORE_TTL e os
+blobs que ficaram sem nenhuma referência.
+
+Como no upload do original (upload_handler.py), o tipo do arquivo vem dos
+magic bytes e não do Content-Type enviado pelo cliente, e o tamanho é
+limitado por MAX_UPLOAD_SIZE enquanto o arquivo é gravado. As dimensões,
+lidas do cabeçalho, precisam ser as do original: uma renderização feita a
+partir de um tier reduzido (ver previews.py) não substitui o download em
+resolução completa.
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from PIL import Image
+
+from .render_cache import canonical_adjustments
+from .upload_handler import FORMAT_CONTENT_TYPES, sniff_format
+
+
+# Extensões usadas para os blobs, por tipo MIME aceito
+CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+}
+
+# Bytes necessários para reconhecer o cabeçalho RIFF/WEBP
+SNIFF_LENGTH = 12
+
+
+def sniff_content_type(data):
+    """
+    Identifica o tipo MIME de uma renderização pelos primeiros bytes.
+
+    Args:
+        data (bytes): Início do arquivo (ao menos SNIFF_LENGTH bytes)
+
+    Returns:
+        str | None: Uma das chaves de CONTENT_TYPE_EXTENSIONS, ou None se o
+        formato não for aceito
+    """
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    content_type = FORMAT_CONTENT_TYPES.get(sniff_format(data))
+    return content_type if content_type in CONTENT_TYPE_EXTENSIONS else None
+
+
+def check_dimensions(path, size):
+    """
+    Verifica se a renderização tem as dimensões do original.
+
+    Só o cabeçalho é lido; os pixels não são decodificados.
+
+    Args:
+        path (str): Arquivo da renderização
+        size (tuple): (largura, altura) do original
+
+    Raises:
+        ValueError: Se o cabeçalho for inválido ou as dimensões diferirem
+    """
+    try:
+        with Image.open(path) as img:
+            actual = img.size
+    except Exception:
+        raise ValueError('Arquivo de imagem inválido ou corrompido')
+    if tuple(actual) != tuple(size):
+        raise ValueError(
+            f'A imagem renderizada deve ter as dimensões do original '
+            f'({size[0]}x{size[1]}), recebido {actual[0]}x{actual[1]}'
+        )
+
+
+def adjustments_digest(adjustments):
+    """
+    Gera o identificador de um conjunto de ajustes.
+
+    Args:
+        adjustments (dict): Ajustes completos (use ImageSession.get_adjustments())
+
+    Returns:
+        str: SHA-256 hexadecimal dos ajustes normalizados
+    """
+    return hashlib.sha256(canonical_adjustments(adjustments).encode('utf-8')).hexdigest()
+
+
+class RenderedStore:
+    """
+    Armazenamento com TTL e deduplicação das renderizações do cliente.
+
+    Atributos:
+        directory (str): Diretório raiz do armazenamento
+        ttl (int): Tempo de vida das referências em segundos
+    """
+
+    def __init__(self, directory, ttl):
+        self.directory = str(directory)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def put(self, session_id, adjustments, uploaded_file, max_size=None, size=None):
+        """
+        Guarda uma renderização do cliente para a sessão e os ajustes dados.
+
+        O arquivo é lido uma única vez em blocos: o tipo é identificado pelos
+        primeiros bytes, o tamanho é contado e o hash calculado enquanto é
+        gravado em um arquivo temporário. Se já existir um blob com o mesmo
+        conteúdo, o temporário é descartado e o blob existente é reaproveitado.
+
+        Args:
+            session_id: UUID da sessão
+            adjustments (dict): Ajustes que a imagem representa
+            uploaded_file: UploadedFile do Django (request.FILES[...])
+            max_size (int): Tamanho máximo em bytes; se omitido, usa
+                settings.MAX_UPLOAD_SIZE
+            size (tuple): (largura, altura) exigidas, as do original; se
+                omitido, as dimensões não são verificadas
+
+        Returns:
+            tuple: (hash do conteúdo, True se o conteúdo já estava armazenado,
+            tipo MIME identificado)
+
+        Raises:
+            ValueError: Se o formato não for aceito, o arquivo passar do
+                tamanho máximo ou as dimensões forem diferentes de size
+                (nada é armazenado)
+        """
+        if max_size is None:
+            max_size = getattr(settings, 'MAX_UPLOAD_SIZE', 10485760)
+        too_large = f'Arquivo muito grande (máximo {max_size // 1048576}MB)'
+        if uploaded_file.size is not None and uploaded_file.size > max_size:
+            raise ValueError(too_large)
+
+        blobs_dir = os.path.join(self.directory, 'blobs')
+        os.makedirs(blobs_dir, exist_ok=True)
+
+        hasher = hashlib.sha256()
+        head = b''
+        received = 0
+        tmp_path = os.path.join(blobs_dir, f'.{uuid.uuid4().hex}.tmp')
+        f = open(tmp_path, 'wb')
+        try:
+            with f:
+                for chunk in uploaded_file.chunks():
+                    received += len(chunk)
+                    if received > max_size:
+                        raise ValueError(too_large)
+                    if len(head) < SNIFF_LENGTH:
+                        head += chunk[:SNIFF_LENGTH - len(head)]
+                    hasher.update(chunk)
+                    f.write(chunk)
+            content_type = sniff_content_type(head)
+            if content_type is None:
+                raise ValueError('Tipo de arquivo não permitido')
+            if size is not None:
+                check_dimensions(tmp_path, size)
+        except BaseException:
+            # Nada fica no armazenamento: o temporário é descartado
+            os.remove(tmp_path)
+            raise
+        digest = hasher.hexdigest()
+        extension = CONTENT_TYPE_EXTENSIONS[content_type]
+
+        blob_path = os.path.join(blobs_dir, f'{digest}.{extension}')
+        with self._lock:
+            deduplicated = os.path.exists(blob_path)
+            if deduplicated:
+                os.remove(tmp_path)
+                # Renova o blob para que o coletor não o remova agora
+                os.utime(blob_path)
+            else:
+                os.replace(tmp_path, blob_path)
+
+            ref_path = self._ref_path(session_id, adjustments)
+            os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+            with open(ref_path, 'w') as f:
+                f.write(f'{digest} {content_type}')
+
+        return digest, deduplicated, content_type
+
+    def get(self, session_id, adjustments):
+        """
+        Busca a renderização do cliente para a sessão e os ajustes dados.
+
+        Args:
+            session_id: UUID da sessão
+            adjustments (dict): Ajustes atuais da sessão
+
+        Returns:
+            tuple | None: (caminho do blob, tipo MIME, hash do conteúdo), ou
+            None se não houver renderização válida (ausente ou expirada)
+        """
+        ref_path = self._ref_path(session_id, adjustments)
+        try:
+            if time.time() - os.path.getmtime(ref_path) > self.ttl:
+                return None
+            with open(ref_path) as f:
+                digest, content_type = f.read().split()
+        except (FileNotFoundError, ValueError):
+            return None
+
+        extension = CONTENT_TYPE_EXTENSIONS.get(content_type)
+        blob_path = os.path.join(self.directory, 'blobs', f'{digest}.{extension}')
+        if not os.path.exists(blob_path):
+            return None
+        return blob_path, content_type, digest
+
+    def sweep(self):
+        """
+        Remove referências expiradas e blobs sem referência.
+
+        Returns:
+            int: Número de arquivos removidos
+        """
+        removed = 0
+        now = time.time()
+        referenced = set()
+
+        with self._lock:
+            entries_dir = os.path.join(self.directory, 'entries')
+            for root, dirs, names in os.walk(entries_dir, topdown=False):
+                for name in names:
+                    path = os.path.join(root, name)
+                    try:
+                        if now - os.path.getmtime(path) > self.ttl:
+                            os.remove(path)
+                            removed += 1
+                            continue
+                        with open(path) as f:
+                            referenced.add(f.read().split()[0])
+                    except (FileNotFoundError, IndexError):
+                        continue
+                # Remove diretórios de sessão que ficaram vazios
+                if root != entries_dir and not os.listdir(root):
+                    os.rmdir(root)
+
+            blobs_dir = os.path.join(self.directory, 'blobs')
+            if os.path.isdir(blobs_dir):
+                for name in os.listdir(blobs_dir):
+                    path = os.path.join(blobs_dir, name)
+                    digest = name.split('.')[0]
+                    # Temporários de envios em andamento só são removidos após o TTL
+                    if name.startswith('.'):
+                        expired = now - os.path.getmtime(path) > self.ttl
+                    else:
+                        expired = digest not in referenced
+                    if expired:
+                        os.remove(path)
+                        removed += 1
+
+        return removed
+
+    def start_sweeper(self, interval):
+        """
+        Inicia a thread de limpeza periódica (uma única vez por processo).
+
+        Args:
+            interval (int): Intervalo entre limpezas em segundos
+        """
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sweep()
+                except OSError:
+                    # Falhas de I/O não devem derrubar a thread; tenta de novo no próximo ciclo
+                    pass
+
+        self._sweeper = threading.Thread(target=run, name='rendered-store-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def _ref_path(self, session_id, adjustments):
+        """Caminho do arquivo de referência de (sessão, ajustes)."""
+        return os.path.join(
+            self.directory, 'entries', str(session_id),
+            f'{adjustments_digest(adjustments)}.ref',
+        )
+
+
+_rendered_store = None
+_rendered_store_lock = threading.Lock()
+
+
+def get_rendered_store():
+    """
+    Retorna a instância do armazenamento de renderizações do cliente.
+
+    Na primeira chamada cria a instância a partir de RENDERED_STORE_DIR e
+    RENDERED_STORE_TTL e inicia a thread de limpeza
+    (RENDERED_STORE_SWEEP_INTERVAL).
+
+    Returns:
+        RenderedStore: Armazenamento compartilhado pelas views
+    """
+    global _rendered_store
+    with _rendered_store_lock:
+        if _rendered_store is None:
+            _rendered_store = RenderedStore(
+                directory=getattr(
+                    settings, 'RENDERED_STORE_DIR',
+                    os.path.join(settings.MEDIA_ROOT, 'rendered'),
+                ),
+                ttl=getattr(settings, 'RENDERED_STORE_TTL', 3600),
+            )
+            _rendered_store.start_sweeper(
+                getattr(settings, 'RENDERED_STORE_SWEEP_INTERVAL', 300)
+            )
+        return _rendered_store
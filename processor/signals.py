@@ -0,0 +1,22 @@
+"""
+Sinais da aplicação processor.
+
+Registrados em ProcessorConfig.ready() (apps.py).
+"""
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import ImageSession
+from .originals import release_original
+
+
+@receiver(post_delete, sender=ImageSession)
+def release_session_original(sender, instance, **kwargs):
+    """
+    Libera a referência da sessão apagada ao original compartilhado.
+
+    Vale também para exclusões em massa (QuerySet.delete) e pelo admin.
+    Sessões anteriores à deduplicação não têm stored_original.
+    """
+    if instance.stored_original_id:
+        release_original(instance.stored_original_id)
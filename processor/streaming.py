@@ -0,0 +1,205 @@
+"""
+Respostas HTTP em streaming com suporte a requisições parciais (Range).
+
+Usado pelo download para enviar a imagem em blocos, sem montar a resposta
+inteira em memória, e para permitir que clientes e CDNs retomem downloads
+interrompidos (Range/If-Range) ou revalidem o cache (ETag).
+
+Sob ASGI os blocos são lidos por iteradores assíncronos (aiter_file), com
+cada leitura de disco em uma thread, sem bloquear o event loop.
+"""
+import asyncio
+import os
+import re
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+
+
+# Formato aceito: um único intervalo "bytes=inicio-fim", "bytes=inicio-" ou "bytes=-sufixo"
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    Interpreta o header Range de uma requisição.
+
+    Apenas um intervalo é suportado; pedidos com múltiplos intervalos ou
+    malformados são ignorados (a resposta completa é enviada, como permite
+    a RFC 9110).
+
+    Args:
+        header (str): Valor do header Range (ou None)
+        size (int): Tamanho total do conteúdo em bytes
+
+    Returns:
+        tuple | None: (inicio, fim) inclusivo, ou None para enviar tudo
+
+    Raises:
+        ValueError: Se o intervalo for válido mas estiver fora do conteúdo (416)
+    """
+    if not header:
+        return None
+
+    match = RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+
+    start, end = match.groups()
+    if start == '':
+        # "bytes=-N": os últimos N bytes
+        length = int(end)
+        if length == 0:
+            raise ValueError('Intervalo vazio')
+        return max(0, size - length), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        raise ValueError('Intervalo fora do conteúdo')
+    return start, min(end, size - 1)
+
+
+def iter_file(path, start, length, chunk_size):
+    """Lê um trecho de um arquivo em blocos de chunk_size bytes."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def iter_bytes(data, start, length, chunk_size):
+    """Percorre um trecho de um buffer em blocos, sem copiá-lo por inteiro."""
+    view = memoryview(data)
+    end = start + length
+    for offset in range(start, end, chunk_size):
+        yield view[offset:min(offset + chunk_size, end)]
+
+
+async def aiter_file(path, start, length, chunk_size):
+    """Versão assíncrona de iter_file: cada leitura roda em uma thread."""
+    f = await asyncio.to_thread(open, path, 'rb')
+    try:
+        await asyncio.to_thread(f.seek, start)
+        while length > 0:
+            chunk = await asyncio.to_thread(f.read, min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+async def aiter_bytes(data, start, length, chunk_size):
+    """Versão assíncrona de iter_bytes (para respostas de views async)."""
+    for chunk in iter_bytes(data, start, length, chunk_size):
+        yield chunk
+
+
+async def aiter_sync(iterator):
+    """
+    Consome um iterador síncrono em threads, um item por vez.
+
+    Permite que geradores com trabalho bloqueante (ex.: render_many) sejam
+    servidos via ASGI sem bloquear o event loop e sem que o Django junte
+    todo o conteúdo em memória antes de enviar.
+
+    Args:
+        iterator: Iterador ou gerador síncrono
+
+    Yields:
+        Os itens do iterador
+    """
+    done = object()
+    try:
+        while True:
+            item = await asyncio.to_thread(next, iterator, done)
+            if item is done:
+                break
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await asyncio.to_thread(close)
+
+
+def streaming_content(request, iterator):
+    """
+    Adapta um iterador síncrono ao servidor da requisição.
+
+    Returns:
+        O próprio iterador (WSGI) ou um iterador assíncrono (ASGI)
+    """
+    if isinstance(request, ASGIRequest):
+        return aiter_sync(iterator)
+    return iterator
+
+
+def ranged_response(request, content_type, path=None, data=None, etag=None,
+                    asynchronous=None):
+    """
+    Monta uma resposta em streaming respeitando Range e If-Range.
+
+    O conteúdo vem de um arquivo em disco (path) ou de um buffer em memória
+    (data). Em ambos os casos é enviado em blocos de DOWNLOAD_CHUNK_SIZE.
+
+    Args:
+        request: Objeto HttpRequest
+        content_type (str): Tipo MIME do conteúdo
+        path (str): Caminho do arquivo a enviar
+        data (bytes): Conteúdo em memória (usado se path for None)
+        etag (str): ETag do conteúdo, já entre aspas
+        asynchronous (bool): Usa iteradores assíncronos (leitura de disco sem
+            bloquear o event loop). Se omitido, usa quando a requisição
+            chegou via ASGI
+
+    Returns:
+        StreamingHttpResponse com status 200 ou 206, ou HttpResponse 416
+    """
+    chunk_size = getattr(settings, 'DOWNLOAD_CHUNK_SIZE', 64 * 1024)
+    size = os.path.getsize(path) if path is not None else len(data)
+
+    # If-Range: só honra o Range se o cliente ainda tiver a mesma versão
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range if byte_range else (0, size - 1)
+    length = end - start + 1 if size else 0
+
+    if asynchronous is None:
+        asynchronous = isinstance(request, ASGIRequest)
+
+    if path is not None:
+        reader = aiter_file if asynchronous else iter_file
+        content = reader(path, start, length, chunk_size)
+    else:
+        reader = aiter_bytes if asynchronous else iter_bytes
+        content = reader(data, start, length, chunk_size)
+
+    response = StreamingHttpResponse(
+        content,
+        status=206 if byte_range else 200,
+        content_type=content_type,
+    )
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    if etag:
+        response['ETag'] = etag
+    return response
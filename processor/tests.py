@@ -1,3 +1,1336 @@
-from django.test import TestCase
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import warnings
+import zipfile
+import zlib
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from PIL import Image, ImageChops, ImageDraw, ImageEnhance, ImageFilter, ImageStat
+
+from . import decoded_store, metadata, render_cache, render_graph, render_service, rendered_store
+from .blur import DEFAULT_FAST_MIN_RADIUS, downsample_factor, gaussian_blur
+from .image_processor import ImageProcessor
+from .models import DEFAULT_ADJUSTMENTS, ImageSession, ProcessingSnapshot, StoredOriginal
+from .render_cache import RenderCache, make_key
+
+
+def _gradient(size=(64, 48), mode='RGB'):
+    """Imagem de teste com bordas e gradientes (a nitidez precisa de detalhe)"""
+    img = Image.new('RGB', size)
+    img.putdata([
+        ((x * 7) % 256, (y * 11) % 256, ((x + y) * 5) % 256)
+        for y in range(size[1]) for x in range(size[0])
+    ])
+    if mode == 'RGBA':
+        img.putalpha(Image.linear_gradient('L').resize(size))
+    return img
+
+
+def _max_diff(a, b):
+    """Maior diferença absoluta por canal entre duas imagens"""
+    return max(high for _, high in ImageChops.difference(a, b).getextrema())
+
+
+def _encode(img, image_format='PNG'):
+    """Codifica uma imagem em memória"""
+    output = io.BytesIO()
+    img.save(output, image_format)
+    return output.getvalue()
+
+
+class MediaTestCase(TestCase):
+    """
+    Base dos testes que gravam arquivos: MEDIA_ROOT e os diretórios dos
+    stores apontam para um diretório temporário, e as instâncias
+    compartilhadas (cache, stores, memo) são recriadas a cada teste.
+    """
+
+    SINGLETONS = (
+        (render_cache, '_render_cache'),
+        (rendered_store, '_rendered_store'),
+        (decoded_store, '_decoded_store'),
+        (render_graph, '_memo'),
+    )
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+        overrides = override_settings(
+            MEDIA_ROOT=self.media_root,
+            RENDER_CACHE_DIR=os.path.join(self.media_root, 'processed'),
+            RENDERED_STORE_DIR=os.path.join(self.media_root, 'rendered'),
+            DECODED_STORE_DIR=os.path.join(self.media_root, 'decoded'),
+            RENDER_POOL_SIZE=0,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        for module, name in self.SINGLETONS:
+            self.addCleanup(setattr, module, name, getattr(module, name))
+            setattr(module, name, None)
+
+    def upload(self, img=None, image_format='PNG', name='foto.png'):
+        """Envia uma imagem pela API de upload e retorna a resposta"""
+        data = _encode(img or _gradient(), image_format)
+        return self.client.post('/api/upload/', {'image': SimpleUploadedFile(name, data)})
+
+    def upload_session(self, img=None, image_format='PNG'):
+        """Envia uma imagem e retorna o id da sessão criada"""
+        response = self.upload(img, image_format)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['session_id']
+
+
+class SharpnessStageTests(TestCase):
+    """Nitidez como unsharp mask, equivalente ao ImageEnhance.Sharpness"""
+
+    def test_matches_image_enhance(self):
+        img = _gradient()
+        for sharpness in (-100, -40, 60, 100):
+            result = ImageProcessor.sharpness_stage(img, {'sharpness': sharpness})
+            expected = ImageEnhance.Sharpness(img).enhance(1 + sharpness / 100)
+            self.assertLessEqual(_max_diff(result, expected), 1, sharpness)
+
+    def test_keeps_alpha(self):
+        img = _gradient(mode='RGBA')
+        result = ImageProcessor.sharpness_stage(img, {'sharpness': 80})
+        self.assertEqual(result.getchannel('A').tobytes(), img.getchannel('A').tobytes())
+
+    def test_sharpens_blurred_image(self):
+        # Regressão: com desfoque ativo, a nitidez não pode desfazer o
+        # desfoque (+100) nem extrapolar para longe dele (-100)
+        img = _gradient()
+        adjustments = {'blur': 3, 'sharpness': 100}
+        blurred = ImageProcessor.blur_stage(img, adjustments)
+        result = ImageProcessor.process_image(img, adjustments)
+        expected = ImageEnhance.Sharpness(blurred).enhance(2)
+        self.assertLessEqual(_max_diff(result, expected), 1)
+        self.assertGreater(_max_diff(result, img), 8)
+
+    def test_zero_is_identity(self):
+        img = _gradient()
+        self.assertIs(ImageProcessor.sharpness_stage(img, {'sharpness': 0}), img)
+
+
+
+class FastBlurErrorTests(TestCase):
+    """Erro do backend fast em relação ao GaussianBlur nos raios do perfil"""
+
+    def scene(self):
+        """Gradiente com retângulos de cor sólida (bordas fortes)"""
+        img = _gradient((320, 240))
+        draw = ImageDraw.Draw(img)
+        for index in range(24):
+            x, y = (index * 53) % 300, (index * 37) % 220
+            color = ((index * 97) % 256, (index * 31) % 256, (index * 173) % 256)
+            draw.rectangle([x, y, x + 10 + index * 2, y + 8 + index], fill=color)
+        return img
+
+    def test_error_within_min_radius_bounds(self):
+        img = self.scene()
+        for radius in (8, 9, 10):
+            # O fator escolhido deixa um raio residual >= BLUR_FAST_MIN_RADIUS
+            self.assertGreater(downsample_factor(radius), 1)
+            self.assertGreaterEqual(radius / downsample_factor(radius), DEFAULT_FAST_MIN_RADIUS)
+
+            diff = ImageChops.difference(
+                gaussian_blur(img, radius, 'fast'),
+                img.filter(ImageFilter.GaussianBlur(radius)),
+            )
+            # Longe das bordas (onde a ampliação extrapola): erro médio
+            # abaixo de 1 nível e máximo de poucos níveis
+            margin = 2 * radius
+            interior = diff.crop((margin, margin, img.width - margin, img.height - margin))
+            for mean in ImageStat.Stat(interior).mean:
+                self.assertLess(mean, 1, radius)
+            self.assertLessEqual(max(high for _, high in interior.getextrema()), 8, radius)
+
+class RenderCacheTests(TestCase):
+    """Cache de renderizações: acertos, faltas, descarte e chave"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_miss_then_hit(self):
+        cache = RenderCache(max_bytes=1024, directory=self.directory)
+        self.assertIsNone(cache.get('ab.jpg'))
+        cache.put('ab.jpg', b'data')
+        self.assertEqual(cache.get('ab.jpg'), b'data')
+        self.assertTrue(os.path.exists(cache.path_for('ab.jpg')))
+
+    def test_disk_hit_after_memory_clear(self):
+        cache = RenderCache(max_bytes=1024, directory=self.directory)
+        cache.put('cd.jpg', b'data')
+        cache.clear()
+        self.assertEqual(cache.get('cd.jpg'), b'data')
+
+    def test_memory_lru_eviction(self):
+        cache = RenderCache(max_bytes=10)
+        cache.put('a', b'12345')
+        cache.put('b', b'12345')
+        cache.get('a')
+        cache.put('c', b'12345')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'12345')
+
+    def test_disk_eviction_to_low_water(self):
+        cache = RenderCache(max_bytes=0, directory=self.directory, max_disk_bytes=100)
+        for index in range(5):
+            cache.put(f'{index:02d}.bin', b'x' * 30)
+            # mtime crescente: o descarte segue a ordem de uso
+            os.utime(cache.path_for(f'{index:02d}.bin'), (index, index))
+
+        # O quarto put estoura o orçamento (120 > 100): um único descarte
+        # remove os dois mais antigos, até 80 (DISK_LOW_WATER), e o quinto
+        # put cabe sem nova varredura
+        remaining = [key for key in (f'{i:02d}.bin' for i in range(5))
+                     if os.path.exists(cache.path_for(key))]
+        self.assertEqual(remaining, ['02.bin', '03.bin', '04.bin'])
+
+    @override_settings(BLUR_BACKEND='fast', IMAGE_PROCESSOR_BACKEND='auto')
+    def test_key_depends_on_pipeline_and_backends(self):
+        path = os.path.join(self.directory, 'original.jpg')
+        _gradient().save(path)
+        adjustments = {'blur': 2}
+
+        key = make_key(path, adjustments)
+        self.assertEqual(key, make_key(path, {'blur': 2.0}))
+        with override_settings(BLUR_BACKEND='pil'):
+            self.assertNotEqual(key, make_key(path, adjustments))
+        with override_settings(IMAGE_PROCESSOR_BACKEND='numpy'):
+            self.assertNotEqual(key, make_key(path, adjustments))
+
+        version = render_cache.RENDER_PIPELINE_VERSION
+        self.addCleanup(setattr, render_cache, 'RENDER_PIPELINE_VERSION', version)
+        render_cache.RENDER_PIPELINE_VERSION = version + 1
+        self.assertNotEqual(key, make_key(path, adjustments))
+
+
+@override_settings(DECODED_STORE_DIR=None, BLUR_BACKEND='fast')
+class PlanExecutionTests(TestCase):
+    """Os caminhos direto, em tiles e pelo memo executam o mesmo plano"""
+
+    adjustments = {'blur': 6, 'sharpness': 40, 'saturation': 60, 'contrast': 20}
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'original.png')
+        _gradient((300, 200)).save(self.path)
+
+    def test_memo_follows_plan(self):
+        from .render_graph import StageMemo
+        from .render_plan import compile_plan
+
+        img = ImageProcessor._normalize_mode(Image.open(self.path))
+        plan = compile_plan(self.adjustments, img.size, tiled=False)
+        self.assertEqual(plan.steps[0].backend, 'fast')
+        expected = ImageProcessor.execute_plan(plan, img, self.adjustments)
+
+        memo = StageMemo(max_bytes=64 * 1024 * 1024)
+        for _ in range(2):
+            result = ImageProcessor.render(self.path, self.adjustments, tiled=False, memo=memo)
+            self.assertEqual(_max_diff(result, expected), 0)
+
+    def test_tiled_follows_plan(self):
+        from .render_plan import compile_plan
+        from .tiling import render_tiled
+
+        img = ImageProcessor._normalize_mode(Image.open(self.path))
+        plan = compile_plan(self.adjustments, img.size, tiled=True)
+        self.assertEqual(plan.steps[0].backend, 'pil')
+        expected = ImageProcessor.execute_plan(plan, img, self.adjustments)
+
+        result = render_tiled(img.copy(), self.adjustments, tile_size=64, plan=plan)
+        self.assertEqual(_max_diff(result, expected), 0)
+
+
+@override_settings(BLUR_BACKEND='fast', IMAGE_PROCESSOR_BACKEND='auto',
+                   RENDER_STAGE_COSTS={}, RENDER_STAGE_OVERHEADS={},
+                   RENDER_MAX_PEAK_BYTES=192_000_000)
+class CostModelTests(TestCase):
+    """Escolhas do plano que dependem do tamanho da imagem"""
+
+    def backends(self, adjustments, size):
+        from .render_plan import compile_plan
+        return [step.backend for step in compile_plan(adjustments, size).steps]
+
+    def test_lut_only_pays_off_on_large_images(self):
+        adjustments = {'saturation': 100, 'contrast': 20}
+        self.assertEqual(self.backends(adjustments, (32, 32)), ['pil'])
+        self.assertEqual(self.backends(adjustments, (2000, 1500)), ['lut'])
+
+    def test_fast_blur_only_pays_off_on_large_images(self):
+        adjustments = {'blur': 8}
+        self.assertEqual(self.backends(adjustments, (8, 8)), ['pil'])
+        self.assertEqual(self.backends(adjustments, (2000, 1500)), ['fast'])
+
+    def test_numpy_only_when_configured(self):
+        adjustments = {'saturation': 60}
+        self.assertEqual(self.backends(adjustments, (4000, 3000)), ['pil'])
+        with override_settings(IMAGE_PROCESSOR_BACKEND='numpy'):
+            self.assertEqual(self.backends(adjustments, (4000, 3000)), ['numpy'])
+
+    def test_tiles_follow_estimated_peak(self):
+        from .render_plan import compile_plan
+
+        # 20MP: uma etapa cabe no limite (160MB), três etapas não (320MB)
+        size = (5000, 4000)
+        self.assertFalse(compile_plan({'saturation': 60}, size).tiled)
+        plan = compile_plan({'blur': 8, 'sharpness': 40, 'saturation': 60}, size)
+        self.assertTrue(plan.tiled)
+        self.assertEqual(plan.steps[0].backend, 'pil')
+        self.assertFalse(compile_plan({}, size).tiled)
+
+
+class NumpyEngineTests(TestCase):
+    """Motor NumPy: mesma semântica da matriz de cor do Pillow"""
+
+    def test_saturation_only_matches_pil(self):
+        img = _gradient()
+        for saturation in (0, 40, 160):
+            adjustments = {'saturation': saturation}
+            expected = ImageProcessor.color_stage(img, adjustments, 'pil')
+            result = ImageProcessor.color_stage(img, adjustments, 'numpy')
+            self.assertLessEqual(_max_diff(result, expected), 1, saturation)
+
+
+class RenderedStoreTests(MediaTestCase):
+    """Renderizações enviadas pelo cliente: validação e deduplicação"""
+
+    def post_rendered(self, session_id, data, content_type='image/png', **fields):
+        upload = SimpleUploadedFile('render.bin', data, content_type=content_type)
+        return self.client.post(f'/api/upload-rendered/{session_id}/',
+                                {'rendered_image': upload, **fields})
+
+    def test_content_type_comes_from_magic_bytes(self):
+        session_id = self.upload_session()
+        data = _encode(_gradient(), 'WEBP')
+        response = self.post_rendered(session_id, data, content_type='image/jpeg')
+        self.assertEqual(response.status_code, 200, response.content)
+
+        store = rendered_store.get_rendered_store()
+        path, content_type, _ = store.get(session_id, DEFAULT_ADJUSTMENTS)
+        self.assertEqual(content_type, 'image/webp')
+        self.assertTrue(path.endswith('.webp'))
+
+    def test_rejects_unknown_format(self):
+        session_id = self.upload_session()
+        response = self.post_rendered(session_id, b'<svg></svg>' * 4, content_type='image/png')
+        self.assertEqual(response.status_code, 400)
+        blobs = os.path.join(self.media_root, 'rendered', 'blobs')
+        self.assertEqual(os.listdir(blobs), [])
+
+    @override_settings(MAX_UPLOAD_SIZE=1024)
+    def test_rejects_oversized_upload(self):
+        session_id = self.upload_session(_gradient((8, 8)))
+        data = _encode(Image.effect_noise((128, 128), 64).convert('RGB'))
+        self.assertGreater(len(data), 1024)
+        response = self.post_rendered(session_id, data)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('muito grande', response.json()['error'])
+
+    def test_rejects_unknown_adjustment_keys(self):
+        session_id = self.upload_session()
+        response = self.post_rendered(session_id, _encode(_gradient()),
+                                      adjustments='{"hue": 10}')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('hue', response.json()['error'])
+
+    def test_identical_uploads_share_a_blob(self):
+        session_id = self.upload_session()
+        data = _encode(_gradient())
+        first = self.post_rendered(session_id, data, adjustments='{"brightness": 10}').json()
+        second = self.post_rendered(session_id, data, adjustments='{"brightness": 20}').json()
+        self.assertFalse(first['deduplicated'])
+        self.assertTrue(second['deduplicated'])
+        self.assertEqual(first['content_hash'], second['content_hash'])
+
+
+    def test_rejects_other_dimensions(self):
+        session_id = self.upload_session()
+        # Ex.: canvas renderizado a partir do tier 'screen'
+        response = self.post_rendered(session_id, _encode(_gradient((32, 24))))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('64x48', response.json()['error'])
+        self.assertIsNone(rendered_store.get_rendered_store().get(session_id, DEFAULT_ADJUSTMENTS))
+
+    def test_download_serves_render_only_in_requested_format(self):
+        session_id = self.upload_session()
+        adjustments = dict(DEFAULT_ADJUSTMENTS, contrast=30)
+        ImageSession.objects.filter(id=session_id).update(adjustments=adjustments)
+        data = _encode(_gradient(), 'WEBP')
+        self.post_rendered(session_id, data)
+        url = f'/api/download/{session_id}/'
+
+        response = self.client.get(url + '?format=webp')
+        self.assertEqual(b''.join(response.streaming_content), data)
+
+        # Formato do original (mesmo com WebP no Accept), ou qualidade
+        # pedida: codifica no servidor
+        for query in ('', '?format=webp&quality=50'):
+            response = self.client.get(url + query, HTTP_ACCEPT='image/webp,*/*')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(b''.join(response.streaming_content), data)
+
+
+class DecodedStoreTests(MediaTestCase):
+    """Originais decodificados mapeados em memória com Image.frombuffer"""
+
+    def setUp(self):
+        super().setUp()
+        self.store = decoded_store.DecodedStore(
+            os.path.join(self.media_root, 'decoded'), max_bytes=1 << 30,
+            idle_seconds=3600,
+        )
+        self.path = os.path.join(self.media_root, 'original.png')
+
+    def test_maps_rgbx_through_public_api(self):
+        original = _gradient((120, 80))
+        original.save(self.path)
+
+        with mock.patch.object(Image, 'frombuffer', wraps=Image.frombuffer) as frombuffer:
+            first = self.store.open(self.path)
+            second = self.store.open(self.path)
+        self.assertEqual(frombuffer.call_count, 2)
+        for img in (first, second):
+            self.assertEqual(img.mode, 'RGBX')
+            self.assertTrue(img.readonly)
+            # O pipeline recebe uma cópia RGB, sem decodificar de novo
+            normalized = ImageProcessor._normalize_mode(img)
+            self.assertEqual(normalized.mode, 'RGB')
+            self.assertEqual(normalized.tobytes(), original.tobytes())
+
+    def test_maps_rgba(self):
+        original = _gradient((120, 80), mode='RGBA')
+        original.save(self.path)
+        self.store.open(self.path)
+        img = self.store.open(self.path)
+        self.assertEqual(img.mode, 'RGBA')
+        self.assertEqual(img.tobytes(), original.tobytes())
+
+    def test_mapped_render_matches_decoded_render(self):
+        _gradient((120, 80)).save(self.path)
+        adjustments = {'blur': 2, 'sharpness': 30, 'saturation': 50, 'contrast': 20}
+        with override_settings(DECODED_STORE_DIR=None):
+            expected = ImageProcessor.render(self.path, adjustments)
+
+        with override_settings(DECODED_STORE_MIN_PIXELS=0):
+            for tiled in (False, True, False):
+                result = ImageProcessor.render(self.path, adjustments, tiled=tiled)
+                self.assertLessEqual(_max_diff(result, expected), 0 if not tiled else 2)
+
+    def test_memo_counts_only_copied_pixels(self):
+        memo = render_graph.StageMemo(max_bytes=1 << 30)
+        _gradient((120, 80), mode='RGBA').save(self.path)
+        mapped = self.store.open(self.path)
+        render_graph.render_stages(mapped, self.path, {'contrast': 20}, memo)
+        self.assertEqual(memo._bytes, 0)
+
+        rgb_path = os.path.join(self.media_root, 'rgb.png')
+        _gradient((120, 80)).save(rgb_path)
+        mapped = self.store.open(rgb_path)
+        render_graph.render_stages(mapped, rgb_path, {'contrast': 20}, memo)
+        self.assertEqual(memo._bytes, 120 * 80 * 3)
+
+
+class OutputFormatTests(MediaTestCase):
+    """Validação dos parâmetros de formato de saída"""
+
+    def test_malformed_quality_has_readable_message(self):
+        from .encoders import output_format
+
+        for name, kwargs in (('quality', {'quality': 'alta'}), ('effort', {'effort': '1.5'})):
+            with self.assertRaisesMessage(ValueError, f'"{name}" deve ser um número inteiro'):
+                output_format('jpeg', **kwargs)
+        self.assertEqual(output_format('jpeg', quality='70').quality, 70)
+
+    def test_download_rejects_malformed_quality(self):
+        session_id = self.upload_session()
+        response = self.client.get(f'/api/download/{session_id}/?format=jpeg&quality=abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], '"quality" deve ser um número inteiro')
+
+
+class BatchRenderTests(MediaTestCase):
+    """Exportação em lote com itens inválidos"""
+
+    def test_missing_session_is_reported_per_item(self):
+        session_id = self.upload_session()
+        missing = str(uuid.uuid4())
+        response = self.client.post(
+            '/api/batch/render/',
+            json.dumps({'items': [
+                {'session_id': missing},
+                {'session_id': session_id, 'adjustments': {'contrast': 20}},
+            ]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        manifest = {entry['session_id']: entry
+                    for entry in json.loads(archive.read('manifest.json'))['items']}
+        self.assertEqual(manifest[missing]['status'], 'error')
+        self.assertIn('não encontrada', manifest[missing]['error'])
+        self.assertEqual(manifest[session_id]['status'], 'ok')
+        self.assertEqual(len(archive.namelist()), 2)
+
+
+class LutTests(TestCase):
+    """LUT composta: escala de cinza, brilho e contraste em uma passada"""
+
+    def test_grayscale_replicates_luminance(self):
+        from .lut import build_lut
+
+        adjustments = {'saturation': 0, 'brightness': 10, 'contrast': 20}
+        for mode in ('RGB', 'RGBA'):
+            img = _gradient(mode=mode)
+            result = ImageProcessor.color_stage(img, adjustments, 'lut', pivot=120)
+            self.assertEqual(result.mode, mode)
+
+            gray = img.convert('L').point(build_lut(1.1, 1.2, 120))
+            expected = Image.merge('RGB', (gray, gray, gray))
+            self.assertEqual(_max_diff(result.convert('RGB'), expected), 0)
+            if mode == 'RGBA':
+                self.assertEqual(result.getchannel('A').tobytes(),
+                                 img.getchannel('A').tobytes())
+
+
+@override_settings(DECODED_STORE_DIR=None)
+class FusedPipelineTests(TestCase):
+    """apply_all_adjustments: uma decodificação e uma codificação"""
+
+    # Valores que não saturam em 0 ou 255 entre uma etapa e outra
+    adjustments = {'saturation': 70, 'brightness': -10, 'contrast': -15,
+                   'sharpness': 0, 'blur': 0}
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'original.png')
+        _gradient().save(self.path)
+
+    def test_decodes_once(self):
+        with mock.patch('processor.image_processor.Image.open', wraps=Image.open) as opened:
+            processed = ImageProcessor.apply_all_adjustments(self.path, self.adjustments)
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(processed.size, len(processed.read()))
+
+    def test_matches_chained_enhancers(self):
+        img = Image.open(self.path).convert('RGB')
+        expected = ImageEnhance.Color(img).enhance(0.7)
+        expected = ImageEnhance.Brightness(expected).enhance(0.9)
+        expected = ImageEnhance.Contrast(expected).enhance(0.85)
+
+        # As enhancers encadeados arredondam para 8 bits a cada etapa
+        result = ImageProcessor.render(self.path, self.adjustments)
+        self.assertLessEqual(_max_diff(result, expected), 3)
+
+
+class DownloadTests(MediaTestCase):
+    """Download renderizado no servidor, com ETag e Range"""
+
+    def setUp(self):
+        super().setUp()
+        self.session_id = self.upload_session()
+        ImageSession.objects.filter(id=self.session_id).update(
+            adjustments=dict(DEFAULT_ADJUSTMENTS, contrast=30, saturation=150))
+        self.url = f'/api/download/{self.session_id}/?format=png'
+
+    def test_renders_adjusted_image(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('attachment', response['Content-Disposition'])
+
+        downloaded = Image.open(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(downloaded.size, _gradient().size)
+        self.assertGreater(_max_diff(downloaded.convert('RGB'), _gradient()), 0)
+
+    def test_second_download_hits_cache(self):
+        first = b''.join(self.client.get(self.url).streaming_content)
+        with mock.patch.object(ImageProcessor, 'render', side_effect=AssertionError) as render:
+            second = b''.join(self.client.get(self.url).streaming_content)
+        render.assert_not_called()
+        self.assertEqual(first, second)
+
+    def test_etag_and_range(self):
+        response = self.client.get(self.url)
+        body = b''.join(response.streaming_content)
+        etag = response['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), body[:10])
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{len(body)}')
+
+
+    def test_format_follows_original_not_accept(self):
+        # Accept de um navegador comum: anuncia AVIF e WebP
+        accept = 'text/html,image/avif,image/webp,image/apng,*/*;q=0.8'
+        url = f'/api/download/{self.session_id}/'
+        response = self.client.get(url, HTTP_ACCEPT=accept)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response['Content-Disposition'].endswith('.png"'))
+        self.assertNotIn('Accept', response.get('Vary', ''))
+
+        session_id = self.upload_session(image_format='JPEG')
+        ImageSession.objects.filter(id=session_id).update(
+            adjustments=dict(DEFAULT_ADJUSTMENTS, contrast=30))
+        response = self.client.get(f'/api/download/{session_id}/', HTTP_ACCEPT=accept)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+
+        # O render exibido na página continua negociado pelo Accept
+        response = self.client.post(f'/api/render/{session_id}/', HTTP_ACCEPT=accept)
+        self.assertEqual(response.json()['format'], 'webp')
+        self.assertIn('Accept', response['Vary'])
+
+    def test_source_format_fallbacks(self):
+        from .encoders import OutputFormat, source_format
+
+        self.assertEqual(source_format('PNG').name, 'png')
+        self.assertEqual(source_format('PNG', 'jpeg', quality='70'),
+                         OutputFormat('jpeg', 70, source_format('JPEG').effort))
+        # Sem codificador para o formato do original
+        self.assertEqual(source_format('GIF').name, 'jpeg')
+        self.assertEqual(source_format('GIF', alpha=True).name, 'png')
+        self.assertEqual(source_format('').name, 'jpeg')
+
+@override_settings(BLUR_BACKEND='pil', TILE_SIZE=64)
+class TiledRenderTests(TestCase):
+    """A renderização em tiles não deixa emendas visíveis"""
+
+    adjustments = {'blur': 8, 'sharpness': 60, 'saturation': 130, 'contrast': 25}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def _path(self, img):
+        path = os.path.join(self.directory, f'{img.mode}.png')
+        img.save(path)
+        return path
+
+    def test_tiled_equals_untiled(self):
+        from . import tiling
+
+        for mode in ('RGB', 'RGBA'):
+            with self.subTest(mode=mode):
+                path = self._path(_gradient((300, 200), mode))
+                with mock.patch.object(tiling, 'render_tiled', wraps=tiling.render_tiled) as spy:
+                    tiled = ImageProcessor.render(path, self.adjustments, tiled=True)
+                spy.assert_called_once()
+                untiled = ImageProcessor.render(path, self.adjustments, tiled=False)
+                self.assertEqual(tiled.mode, mode)
+                self.assertEqual(tiled.size, untiled.size)
+                self.assertEqual(_max_diff(tiled, untiled), 0)
+
+    def test_halo_covers_kernels(self):
+        from .tiling import kernel_halo
+
+        self.assertEqual(kernel_halo({'blur': 0, 'sharpness': 0}), 0)
+        self.assertGreaterEqual(kernel_halo({'blur': 8, 'sharpness': 0}), 8)
+        self.assertGreater(kernel_halo({'blur': 8, 'sharpness': 60}),
+                           kernel_halo({'blur': 8, 'sharpness': 0}))
+
+
+class RenderServiceTests(MediaTestCase):
+    """Fila limitada do pool de renderização (429 e cancelamento)"""
+
+    def setUp(self):
+        super().setUp()
+        for name in ('_workers', '_slots'):
+            self.addCleanup(setattr, render_service, name, getattr(render_service, name))
+        # Um worker em thread no lugar do processo: mesma fila, sem 'spawn'.
+        # O shutdown espera os trabalhos (e a liberação das vagas) antes de
+        # restaurar o pool original
+        executor = ThreadPoolExecutor(1)
+        self.addCleanup(executor.shutdown)
+        render_service._workers = [render_service._Worker(executor)]
+        render_service._slots = threading.BoundedSemaphore(2)
+
+        self.session_id = self.upload_session()
+        ImageSession.objects.filter(id=self.session_id).update(
+            adjustments=dict(DEFAULT_ADJUSTMENTS, contrast=30))
+        self.path = ImageSession.objects.get(id=self.session_id).original_image.path
+
+        # Ocupa o worker até o fim do teste
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        self.blocker = self.submit()
+
+    def submit(self):
+        return render_service._submit(render_service._workers, self.path, False,
+                                      self.release.wait)
+
+    def test_full_queue_returns_429(self):
+        queued = self.submit()
+
+        response = self.client.post(f'/api/render/{self.session_id}/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+        self.release.set()
+        self.blocker.result()
+        queued.result()
+        response = self.client.post(f'/api/render/{self.session_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['cached'])
+
+    def test_cancelled_render_frees_slot(self):
+        async def cancel_queued_render():
+            task = asyncio.create_task(
+                render_service.arender(self.path, dict(DEFAULT_ADJUSTMENTS, contrast=30)))
+            await asyncio.sleep(0)
+            with self.assertRaises(render_service.RenderQueueFull):
+                self.submit()
+
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_queued_render())
+        self.submit()
+
+
+@override_settings(DECODED_STORE_DIR=None)
+class StageMemoTests(TestCase):
+    """Reaproveitamento das etapas entre movimentos de slider e limites de memória"""
+
+    adjustments = {'blur': 3, 'sharpness': 40, 'saturation': 20, 'contrast': 10}
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'original.png')
+        _gradient((120, 80)).save(self.path)
+
+    def test_color_change_reuses_spatial_stages(self):
+        memo = render_graph.StageMemo(max_bytes=1 << 30)
+        ImageProcessor.render(self.path, self.adjustments, tiled=False, memo=memo)
+
+        changed = dict(self.adjustments, contrast=-30)
+        with mock.patch.object(ImageProcessor, 'execute_step',
+                               wraps=ImageProcessor.execute_step) as executed, \
+                mock.patch.object(ImageProcessor, '_normalize_mode',
+                                  wraps=ImageProcessor._normalize_mode) as decoded:
+            result = ImageProcessor.render(self.path, changed, tiled=False, memo=memo)
+        self.assertEqual([call.args[0].stage for call in executed.call_args_list], ['color'])
+        decoded.assert_not_called()
+
+        expected = ImageProcessor.render(self.path, changed, tiled=False)
+        self.assertEqual(_max_diff(result, expected), 0)
+
+    def test_spatial_change_invalidates_downstream(self):
+        memo = render_graph.StageMemo(max_bytes=1 << 30)
+        ImageProcessor.render(self.path, self.adjustments, tiled=False, memo=memo)
+
+        with mock.patch.object(ImageProcessor, 'execute_step',
+                               wraps=ImageProcessor.execute_step) as executed:
+            ImageProcessor.render(self.path, dict(self.adjustments, sharpness=80),
+                                  tiled=False, memo=memo)
+        self.assertEqual([call.args[0].stage for call in executed.call_args_list],
+                         ['sharpness', 'color'])
+
+    def test_session_budget_evicts_own_entries(self):
+        memo = render_graph.StageMemo(max_bytes=1000, session_max_bytes=300)
+        memo.put('a', 'blur', (1,), 'a1', 200)
+        memo.put('b', 'blur', (1,), 'b1', 200)
+        memo.put('a', 'blur', (2,), 'a2', 200)
+
+        self.assertIsNone(memo.get('a', 'blur', (1,)))
+        self.assertEqual(memo.get('a', 'blur', (2,)), 'a2')
+        self.assertEqual(memo.get('b', 'blur', (1,)), 'b1')
+        self.assertEqual(memo._bytes, 400)
+
+    def test_global_budget_evicts_least_recently_used(self):
+        memo = render_graph.StageMemo(max_bytes=500)
+        memo.put('a', 'blur', (1,), 'a1', 200)
+        memo.put('b', 'blur', (1,), 'b1', 200)
+        memo.get('a', 'blur', (1,))
+        memo.put('c', 'blur', (1,), 'c1', 200)
+
+        self.assertIsNone(memo.get('b', 'blur', (1,)))
+        self.assertEqual(memo.get('a', 'blur', (1,)), 'a1')
+        self.assertEqual(memo._bytes, 400)
+
+        memo.put('d', 'blur', (1,), 'd1', 600)
+        self.assertIsNone(memo.get('d', 'blur', (1,)))
+
+
+class UploadValidationTests(MediaTestCase):
+    """Validação do upload em uma passada (magic bytes, tamanho e dimensões)"""
+
+    def post(self, data, name='foto.png'):
+        return self.client.post('/api/upload/', {'image': SimpleUploadedFile(name, data)})
+
+    def assertRejected(self, response, message):
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(message, response.json()['error'])
+        self.assertFalse(ImageSession.objects.exists())
+        # Nenhum arquivo parcial fica para trás
+        for _, _, files in os.walk(self.media_root):
+            self.assertEqual([f for f in files if f.endswith('.part')], [])
+
+    def test_rejects_bad_magic_bytes(self):
+        # O nome e o Content-Type dizem PNG, o conteúdo não
+        response = self.post(b'<html>' + b'\0' * 100)
+        self.assertRejected(response, 'Tipo de arquivo não permitido')
+
+    def test_rejects_oversized_header(self):
+        # PNG válido cujo IHDR declara 20000x20000 pixels: recusado só pelo cabeçalho
+        data = bytearray(_encode(_gradient()))
+        ihdr = (20000).to_bytes(4, 'big') * 2 + bytes(data[24:29])
+        data[16:29] = ihdr
+        data[29:33] = zlib.crc32(b'IHDR' + ihdr).to_bytes(4, 'big')
+        self.assertRejected(self.post(bytes(data)), 'Imagem com dimensões grandes demais')
+
+    @override_settings(MAX_UPLOAD_PIXELS=1000)
+    def test_rejects_images_above_pixel_limit(self):
+        self.assertRejected(self.upload(), 'Imagem com dimensões grandes demais')
+
+    @override_settings(MAX_UPLOAD_SIZE=1024)
+    def test_rejects_oversized_file(self):
+        noise = Image.frombytes('RGB', (64, 64), os.urandom(64 * 64 * 3))
+        self.assertRejected(self.upload(noise), 'Arquivo muito grande')
+
+    def test_fallback_path_sniffs_magic_bytes(self):
+        # Sem o ImageUploadHandler (ex.: storage sem caminho local), o tipo
+        # continua vindo do conteúdo, não do Content-Type do cliente
+        handlers = ['django.core.files.uploadhandler.MemoryFileUploadHandler']
+        with override_settings(FILE_UPLOAD_HANDLERS=handlers):
+            fake = SimpleUploadedFile('foto.png', b'<html>' + b'\0' * 100, 'image/png')
+            response = self.client.post('/api/upload/', {'image': fake})
+            self.assertRejected(response, 'Tipo de arquivo não permitido')
+
+    def test_format_comes_from_magic_bytes(self):
+        response = self.upload(image_format='JPEG', name='foto.png')
+        self.assertEqual(response.status_code, 200, response.content)
+        session = ImageSession.objects.get()
+        self.assertTrue(session.original_image.name.endswith('.jpg'))
+
+
+
+def _exif_jpeg(orientation=None, exif=None):
+    """JPEG com a orientação EXIF indicada (ou com bytes EXIF arbitrários)"""
+    if exif is None:
+        exif = Image.Exif()
+        exif[metadata.ORIENTATION_TAG] = orientation
+    output = io.BytesIO()
+    _gradient().save(output, format='JPEG', exif=exif)
+    return output.getvalue()
+
+
+class HeaderInfoTests(MediaTestCase):
+    """Metadados lidos do cabeçalho no upload e em sessões antigas"""
+
+    def info(self, data):
+        with Image.open(io.BytesIO(data)) as img:
+            return metadata.header_info(img)
+
+    def test_reads_exif_orientation(self):
+        info = self.info(_exif_jpeg(orientation=6))
+        self.assertEqual(info['orientation'], 6)
+        self.assertEqual((info['width'], info['height']), (64, 48))
+        self.assertEqual(info['image_format'], 'JPEG')
+        self.assertFalse(info['has_alpha'])
+
+    def test_invalid_orientation_is_normal(self):
+        self.assertEqual(self.info(_exif_jpeg(orientation=9))['orientation'], 1)
+        self.assertEqual(self.info(_encode(_gradient()))['orientation'], 1)
+
+    def test_corrupt_exif_is_normal(self):
+        # IFD apontando para fora do bloco EXIF
+        data = _exif_jpeg(exif=b'Exif\x00\x00II*\x00\xff\xff\xff\x7f')
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.assertEqual(self.info(data)['orientation'], 1)
+
+        # Erro ao interpretar o EXIF também não impede a leitura
+        with Image.open(io.BytesIO(_exif_jpeg(orientation=6))) as img:
+            with mock.patch.object(img, 'getexif', side_effect=SyntaxError('EXIF')):
+                self.assertEqual(metadata.header_info(img)['orientation'], 1)
+
+    def test_has_alpha(self):
+        self.assertTrue(self.info(_encode(_gradient(mode='RGBA')))['has_alpha'])
+        self.assertFalse(self.info(_encode(_gradient()))['has_alpha'])
+
+        # Paleta com cor transparente
+        palette = _gradient().convert('P')
+        output = io.BytesIO()
+        palette.save(output, format='PNG', transparency=0)
+        self.assertTrue(self.info(output.getvalue())['has_alpha'])
+
+    def test_upload_stores_header_info(self):
+        upload = SimpleUploadedFile('foto.jpg', _exif_jpeg(orientation=3))
+        response = self.client.post('/api/upload/', {'image': upload})
+        self.assertEqual(response.status_code, 200, response.content)
+        info = ImageSession.objects.get().get_image_info()
+        self.assertEqual(info['orientation'], 3)
+        self.assertEqual(info['format'], 'JPEG')
+
+    def test_backfills_old_sessions_once(self):
+        session_id = self.upload_session(_gradient(mode='RGBA'))
+        # Sessão gravada antes dos campos de metadados
+        ImageSession.objects.filter(id=session_id).update(
+            width=None, height=None, image_format='', mode='', has_alpha=False,
+            content_hash='',
+        )
+        session = ImageSession.objects.get(id=session_id)
+        self.assertIsNone(session.get_image_info()['width'])
+
+        info = metadata.ensure_image_info(session)
+        self.assertEqual((info['width'], info['height']), (64, 48))
+        self.assertEqual((info['format'], info['mode']), ('PNG', 'RGBA'))
+        self.assertTrue(info['has_alpha'])
+        self.assertEqual(len(info['content_hash']), 64)
+        self.assertEqual(ImageSession.objects.get(id=session_id).get_image_info(), info)
+
+        # Com os campos gravados, o arquivo não é aberto de novo
+        with mock.patch.object(metadata, 'read_image_info') as read:
+            self.assertEqual(metadata.ensure_image_info(session), info)
+        read.assert_not_called()
+
+class StoredOriginalTests(MediaTestCase):
+    """Deduplicação dos originais e contagem de referências"""
+
+    def test_identical_uploads_share_original(self):
+        first = ImageSession.objects.get(id=self.upload_session())
+        second = ImageSession.objects.get(id=self.upload_session())
+
+        stored = StoredOriginal.objects.get()
+        self.assertEqual(stored.ref_count, 2)
+        self.assertEqual(first.stored_original_id, second.stored_original_id)
+        self.assertEqual(first.original_image.path, second.original_image.path)
+        self.assertTrue(os.path.exists(stored.file.path))
+
+    def test_last_session_delete_removes_files(self):
+        first = ImageSession.objects.get(id=self.upload_session())
+        self.upload_session()
+        stored = StoredOriginal.objects.get()
+        paths = [f.path for f in (stored.file, stored.thumbnail, stored.screen_preview) if f]
+
+        first.delete()
+        self.assertEqual(StoredOriginal.objects.get().ref_count, 1)
+        for path in paths:
+            self.assertTrue(os.path.exists(path))
+
+        # Exclusão em massa também libera a referência
+        ImageSession.objects.all().delete()
+        self.assertFalse(StoredOriginal.objects.exists())
+        for path in paths:
+            self.assertFalse(os.path.exists(path))
+
+    def test_different_content_is_not_shared(self):
+        self.upload_session()
+        self.upload_session(_gradient((32, 32)))
+        self.assertEqual(sorted(StoredOriginal.objects.values_list('ref_count', flat=True)),
+                         [1, 1])
+
+
+class IdentityPassthroughTests(MediaTestCase):
+    """Ajustes neutros servem os bytes do original, sem decodificar"""
+
+    def setUp(self):
+        super().setUp()
+        self.original = _encode(_gradient())
+        self.session_id = self.upload_session()
+        self.no_render = mock.patch.object(ImageProcessor, 'render', side_effect=AssertionError)
+
+    def test_identity_stages_are_dropped(self):
+        from .render_plan import compile_plan, is_identity
+
+        self.assertTrue(is_identity(DEFAULT_ADJUSTMENTS))
+        self.assertFalse(is_identity(dict(DEFAULT_ADJUSTMENTS, contrast=1)))
+
+        plan = compile_plan(dict(DEFAULT_ADJUSTMENTS, contrast=20), (64, 48))
+        self.assertEqual([step.stage for step in plan.steps], ['color'])
+        self.assertEqual(compile_plan(DEFAULT_ADJUSTMENTS, (64, 48)).steps, ())
+
+    def test_download_streams_original_bytes(self):
+        with self.no_render:
+            response = self.client.get(f'/api/download/{self.session_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(b''.join(response.streaming_content), self.original)
+
+        stored = StoredOriginal.objects.get()
+        self.assertEqual(response['ETag'], f'"{stored.content_hash}"')
+
+    def test_render_returns_original_url(self):
+        with self.no_render:
+            response = self.client.post(f'/api/render/{self.session_id}/')
+        body = response.json()
+        self.assertTrue(body['original'])
+        self.assertEqual(body['image_url'],
+                         ImageSession.objects.get(id=self.session_id).original_image.url)
+
+    def test_explicit_format_is_rendered(self):
+        response = self.client.get(f'/api/download/{self.session_id}/?format=jpeg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertNotEqual(b''.join(response.streaming_content), self.original)
+
+
+@override_settings(BLUR_BACKEND='fast', IMAGE_PROCESSOR_BACKEND='auto',
+                   RENDER_STAGE_COSTS={}, RENDER_STAGE_OVERHEADS={},
+                   RENDER_MAX_PEAK_BYTES=192_000_000)
+class RenderPlanTests(MediaTestCase):
+    """Conteúdo do plano compilado e sua exposição em JSON"""
+
+    adjustments = dict(DEFAULT_ADJUSTMENTS, blur=8, sharpness=40, saturation=150,
+                       brightness=-10, contrast=20)
+
+    def test_steps_in_pipeline_order(self):
+        from .render_plan import compile_plan
+
+        plan = compile_plan(self.adjustments, (2000, 1500))
+        self.assertEqual([step.stage for step in plan.steps], ['blur', 'sharpness', 'color'])
+        self.assertEqual([step.backend for step in plan.steps], ['fast', 'smooth', 'pil'])
+        self.assertEqual(plan.steps[0].params, {'radius': 8.0, 'factor': 3})
+        self.assertEqual(plan.steps[1].params, {'amount': 0.4})
+        self.assertEqual(plan.steps[2].params,
+                         {'saturation': 1.5, 'brightness': 0.9, 'contrast': 1.2})
+
+        self.assertFalse(plan.tiled)
+        self.assertAlmostEqual(plan.cost, sum(step.cost for step in plan.steps))
+        # Na nitidez: decodificada, saída do desfoque, máscara e saída
+        self.assertEqual(plan.peak_bytes, 4 * 2000 * 1500 * 4)
+        self.assertEqual(compile_plan({'blur': 8}, (2000, 1500)).peak_bytes, 2 * 2000 * 1500 * 4)
+        self.assertEqual(compile_plan({'blur': 8, 'contrast': 20}, (2000, 1500)).peak_bytes,
+                         3 * 2000 * 1500 * 4)
+
+    def test_plan_endpoint(self):
+        from .render_plan import compile_plan
+
+        session_id = self.upload_session()
+        ImageSession.objects.filter(id=session_id).update(adjustments=self.adjustments)
+
+        response = self.client.get(f'/api/render/{session_id}/plan/')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['adjustments'], self.adjustments)
+
+        plan = body['plan']
+        expected = compile_plan(self.adjustments, (64, 48))
+        self.assertEqual(plan['size'], [64, 48])
+        self.assertFalse(plan['tiled'])
+        self.assertEqual(plan['peak_bytes'], expected.peak_bytes)
+        self.assertEqual(plan['cost_ms'], round(expected.cost, 2))
+        self.assertEqual([(step['stage'], step['backend']) for step in plan['steps']],
+                         [(step.stage, step.backend) for step in expected.steps])
+
+        self.assertEqual(self.client.post(f'/api/render/{session_id}/plan/').status_code, 405)
+
+
+@override_settings(MAX_UPLOAD_SIZE=1048576, MAX_REQUEST_BODY_SIZE=1000)
+class RequestBodyLimitTests(TestCase):
+    """Limite do corpo aplicado antes do Django ler a requisição"""
+
+    def call(self, headers, chunks):
+        """Executa o middleware sobre um app que lê o corpo como o ASGIHandler."""
+        from .upload_handler import RequestBodyLimit
+
+        read = []
+        messages = [{'type': 'http.request', 'body': chunk, 'more_body': True}
+                    for chunk in chunks]
+        messages[-1]['more_body'] = False
+        sent = []
+
+        async def app(scope, receive, send):
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                read.append(message['body'])
+                if not message['more_body']:
+                    break
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b'ok'})
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'POST', 'path': '/api/upload/', 'headers': headers}
+        asyncio.run(RequestBodyLimit(app)(scope, receive, send))
+        return sent[0]['status'], b''.join(read), sent
+
+    def test_rejects_declared_length_without_reading(self):
+        status, read, sent = self.call([(b'content-length', b'5000')], [b'x' * 5000])
+        self.assertEqual(status, 413)
+        self.assertEqual(read, b'')
+        self.assertIn('Arquivo muito grande (máximo 1MB)', json.loads(sent[1]['body'])['error'])
+
+    def test_stops_streamed_body_past_limit(self):
+        status, read, _ = self.call([], [b'x' * 400] * 10)
+        self.assertEqual(status, 413)
+        self.assertEqual(len(read), 800)
+
+    def test_passes_small_bodies(self):
+        status, read, _ = self.call([(b'content-length', b'600')], [b'x' * 300] * 2)
+        self.assertEqual(status, 200)
+        self.assertEqual(len(read), 600)
+
+    def test_asgi_application_is_wrapped(self):
+        from config.asgi import application
+        from .upload_handler import RequestBodyLimit
+
+        self.assertIsInstance(application, RequestBodyLimit)
+
+
+class SingleAdjustmentTests(TestCase):
+    """Os métodos de ajuste isolado executam um plano de uma etapa"""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'original.png')
+        _gradient().save(self.path)
+
+    def test_wrappers_run_pipeline_stages(self):
+        cases = (
+            (ImageProcessor.adjust_saturation, 0.5, {'saturation': 50}, 'color'),
+            (ImageProcessor.adjust_brightness, 1.2, {'brightness': 20}, 'color'),
+            (ImageProcessor.adjust_contrast, 0.7, {'contrast': -30}, 'color'),
+            (ImageProcessor.adjust_sharpness, 1.5, {'sharpness': 50}, 'sharpness'),
+            (ImageProcessor.apply_blur, 3, {'blur': 3}, 'blur'),
+        )
+        for method, factor, adjustments, stage in cases:
+            with self.subTest(method=method.__name__):
+                with mock.patch.object(ImageProcessor, 'execute_step',
+                                       wraps=ImageProcessor.execute_step) as executed:
+                    result = method(self.path, factor).read()
+                self.assertEqual([call.args[0].stage for call in executed.call_args_list],
+                                 [stage])
+
+                expected = ImageProcessor._save_image(
+                    ImageProcessor.render(self.path, adjustments, tiled=False), self.path)
+                self.assertEqual(result, expected.read())
+
+
+@override_settings(PREVIEW_TIERS={'thumbnail': 16, 'screen': 40})
+class PreviewTierTests(MediaTestCase):
+    """Versões reduzidas geradas no upload e servidas por tier"""
+
+    def session(self, img=None):
+        return ImageSession.objects.get(id=self.upload_session(img))
+
+    def test_tier_sizes_follow_settings(self):
+        session = self.session(_gradient((64, 48)))
+        for field, size in (('thumbnail', (16, 12)), ('screen_preview', (40, 30))):
+            with Image.open(getattr(session, field).path) as img:
+                self.assertEqual(img.size, size)
+                self.assertEqual(img.format, 'JPEG')
+
+        response = self.client.get(f'/api/preview/{session.id}/full/')
+        self.assertEqual(b''.join(response.streaming_content),
+                         open(session.original_image.path, 'rb').read())
+
+    def test_jpeg_is_decoded_downscaled(self):
+        from PIL import JpegImagePlugin
+        from .previews import open_downscaled
+
+        path = os.path.join(self.media_root, 'large.jpg')
+        _gradient((1000, 800)).save(path, 'JPEG')
+        draft = JpegImagePlugin.JpegImageFile.draft
+        with mock.patch.object(JpegImagePlugin.JpegImageFile, 'draft',
+                               autospec=True, side_effect=draft) as drafted:
+            img = open_downscaled(path, 100)
+        drafted.assert_any_call(mock.ANY, 'RGB', (100, 100))
+        self.assertEqual(img.size, (100, 80))
+
+        # Redução inteira seguida do ajuste fino, sem passar do limite
+        img = open_downscaled(path, 333)
+        self.assertLessEqual(max(img.size), 333)
+        self.assertEqual(img.size, (333, 266))
+
+    def test_png_transparency_is_kept(self):
+        session = self.session(_gradient((64, 48), mode='RGBA'))
+        with Image.open(session.thumbnail.path) as img:
+            self.assertEqual(img.format, 'PNG')
+            self.assertEqual(img.mode, 'RGBA')
+            self.assertLess(img.getchannel('A').getextrema()[0], 128)
+
+    def test_old_session_gets_previews_on_demand(self):
+        os.makedirs(os.path.join(self.media_root, 'uploads'))
+        _gradient((64, 48)).save(os.path.join(self.media_root, 'uploads', 'antiga.png'))
+        session = ImageSession.objects.create(original_image='uploads/antiga.png')
+        self.assertFalse(session.thumbnail)
+
+        response = self.client.get(f'/api/preview/{session.id}/thumbnail/')
+        self.assertEqual(response.status_code, 200)
+        session.refresh_from_db()
+        self.assertTrue(session.thumbnail)
+        self.assertTrue(session.screen_preview)
+        self.assertEqual(Image.open(io.BytesIO(b''.join(response.streaming_content))).size,
+                         (16, 12))
+
+    def test_invalid_tier(self):
+        session = self.session()
+        response = self.client.get(f'/api/preview/{session.id}/poster/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('poster', response.json()['error'])
+
+
+class _InlineExecutor:
+    """Executor que roda o trabalho na hora, na própria thread do teste"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, function, *args):
+        self.submitted.append(args)
+        function(*args)
+
+
+class SnapshotPreviewQueueTests(MediaTestCase):
+    """Renderização dos previews de snapshots em segundo plano"""
+
+    def setUp(self):
+        super().setUp()
+        from . import preview_queue
+
+        self.queue = preview_queue
+        self.executor = _InlineExecutor()
+        for target, value in (('_get_executor', lambda: self.executor),
+                              # O TestCase roda numa transação: a conexão fica aberta
+                              ('close_old_connections', lambda: None)):
+            patcher = mock.patch.object(preview_queue, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(preview_queue._pending.clear)
+        self.session_id = self.upload_session()
+
+    def create(self, adjustments):
+        response = self.client.post(f'/api/snapshots/{self.session_id}/',
+                                    json.dumps({'adjustments': adjustments}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['id']
+
+    def listed(self):
+        response = self.client.get(f'/api/snapshots/{self.session_id}/')
+        return {item['id']: item['preview_url'] for item in response.json()['snapshots']}
+
+    def test_preview_url_listed_after_render(self):
+        snapshot_id = self.create({'contrast': 20})
+        self.assertEqual(len(self.executor.submitted), 1)
+
+        preview_url = self.listed()[snapshot_id]
+        self.assertTrue(preview_url.startswith('/media/snapshots/'))
+        snapshot = ProcessingSnapshot.objects.get(id=snapshot_id)
+        with Image.open(snapshot.preview_image.path) as img:
+            self.assertEqual(img.format, 'JPEG')
+
+    def test_existing_identical_preview_is_reused(self):
+        first = self.create({'contrast': 20})
+        # Mesmos ajustes em outra ordem de chaves
+        second = self.create({'contrast': 20.0, 'saturation': 100})
+        self.assertEqual(len(self.executor.submitted), 1)
+        listed = self.listed()
+        self.assertEqual(listed[first], listed[second])
+
+    def test_pending_identical_requests_share_one_render(self):
+        # Enquanto o render está na fila, pedidos idênticos só se juntam a ele
+        self.executor.submit = lambda function, *args: self.executor.submitted.append(
+            (function, args))
+        ids = [self.create({'brightness': 10}) for _ in range(3)]
+        other = self.create({'brightness': -10})
+        self.assertEqual(len(self.executor.submitted), 2)
+
+        for function, args in self.executor.submitted:
+            function(*args)
+        listed = self.listed()
+        self.assertEqual(len({listed[snapshot_id] for snapshot_id in ids}), 1)
+        self.assertIsNotNone(listed[ids[0]])
+        self.assertNotEqual(listed[other], listed[ids[0]])
+        self.assertEqual(self.queue._pending, {})
+
+
+class SnapshotsRenderTests(MediaTestCase):
+    """Renderização conjunta dos snapshots (folha de contatos e lote)"""
+
+    # Dois grupos de etapas espaciais: (blur 2, nitidez 0) e (blur 0, nitidez 30)
+    ADJUSTMENTS = [
+        {'blur': 2, 'contrast': 20},
+        {'blur': 2, 'saturation': 150},
+        {'sharpness': 30, 'brightness': 10},
+        {'sharpness': 30, 'brightness': -10},
+        {'blur': 2},
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.session_id = self.upload_session()
+        session = ImageSession.objects.get(id=self.session_id)
+        # Criados direto no banco: a fila de previews não entra na contagem
+        self.snapshots = [
+            ProcessingSnapshot.objects.create(
+                session=session, adjustments=adjustments,
+                description=f'versão {order}', order=order,
+            )
+            for order, adjustments in enumerate(self.ADJUSTMENTS)
+        ]
+
+    def spatial_calls(self, query):
+        """Faz a requisição e conta as execuções de cada etapa espacial"""
+        execute_step = ImageProcessor.execute_step
+        with mock.patch.object(ImageProcessor, 'execute_step',
+                               side_effect=execute_step) as spy:
+            response = self.client.get(f'/api/snapshots/{self.session_id}/render/{query}')
+            content = (b''.join(response.streaming_content) if response.streaming
+                       else response.content)
+        self.assertEqual(response.status_code, 200, content)
+        stages = [call.args[0].stage for call in spy.call_args_list]
+        return content, {stage: stages.count(stage) for stage in ('blur', 'sharpness')}
+
+    @override_settings(SNAPSHOT_SHEET_CELL_SIZE=32)
+    def test_contact_sheet_runs_spatial_stages_once_per_group(self):
+        content, calls = self.spatial_calls('')
+        self.assertEqual(calls, {'blur': 1, 'sharpness': 1})
+
+        # 5 células: grade 3x2 de células de 32px com legenda e margens
+        with Image.open(io.BytesIO(content)) as sheet:
+            self.assertEqual(sheet.format, 'JPEG')
+            self.assertEqual(sheet.size, (3 * (32 + 8) + 8, 2 * (32 + 20 + 8) + 8))
+
+    def test_zip_has_one_render_per_snapshot(self):
+        content, calls = self.spatial_calls('?output=zip')
+        self.assertEqual(calls, {'blur': 1, 'sharpness': 1})
+
+        archive = zipfile.ZipFile(io.BytesIO(content))
+        manifest = {entry['snapshot_id']: entry
+                    for entry in json.loads(archive.read('manifest.json'))['items']}
+        self.assertEqual(set(manifest), {str(snapshot.id) for snapshot in self.snapshots})
+        for snapshot in self.snapshots:
+            entry = manifest[str(snapshot.id)]
+            self.assertEqual(entry['status'], 'ok')
+            with Image.open(io.BytesIO(archive.read(entry['name']))) as img:
+                self.assertEqual(img.size, (64, 48))
+
+    def test_invalid_output_and_empty_session(self):
+        response = self.client.get(f'/api/snapshots/{self.session_id}/render/?output=gif')
+        self.assertEqual(response.status_code, 400)
+
+        ProcessingSnapshot.objects.all().delete()
+        response = self.client.get(f'/api/snapshots/{self.session_id}/render/')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,139 @@
+"""
+Renderização em tiles com memória limitada para imagens muito grandes.
+
+O pipeline normal (ImageProcessor.process_image) cria uma imagem completa a
+cada etapa, então o pico de memória é várias vezes o tamanho decodificado. Em
+panoramas isso derruba os workers. Aqui a imagem é processada em tiles de
+tamanho fixo e o resultado é escrito de volta no próprio buffer decodificado,
+faixa por faixa:
+
+    - Cada tile é lido com uma margem (halo) suficiente para os kernels de
+      nitidez e desfoque, então não aparecem emendas entre tiles
+    - A saída de uma faixa de tiles é acumulada em um buffer da altura de um
+      tile e só então colada na imagem; as linhas originais que a próxima
+      faixa ainda precisa como halo são guardadas antes
+    - O cinza médio do contraste é calculado uma vez sobre a imagem inteira
+
+Além da imagem decodificada, o pico de memória é de uma faixa (TILE_SIZE
+linhas) mais um tile com halo, independentemente do tamanho da imagem.
+
+Imagens mapeadas do store de decodificações (decoded_store.py) são somente
+leitura: os tiles são lidos direto do mapeamento e o resultado vai para uma
+imagem nova, sem copiar a origem para o heap.
+"""
+import math
+
+from django.conf import settings
+from PIL import Image
+
+from .image_processor import ImageProcessor
+from .render_plan import compile_plan
+
+
+# Lado padrão dos tiles em pixels
+DEFAULT_TILE_SIZE = 512
+
+
+def kernel_halo(adjustments):
+    """
+    Calcula a margem (em pixels) que cada tile precisa ler além de seus limites.
+
+    Args:
+        adjustments (dict): Ajustes no formato de ImageSession.get_adjustments()
+
+    Returns:
+        int: Alcance somado dos kernels espaciais ativos (0 se não houver)
+    """
+    halo = 0
+
+    # A nitidez usa o filtro SMOOTH 3x3: 1 pixel de alcance
+    if float(adjustments.get('sharpness', 0)) != 0:
+        halo += 1
+
+    # Desfoque gaussiano: 3 desvios-padrão cobrem mais de 99% do kernel
+    blur = float(adjustments.get('blur', 0))
+    if blur > 0:
+        halo += math.ceil(blur * 3) + 1
+
+    return halo
+
+
+def render_tiled(img, adjustments, tile_size=None, backend=None, plan=None):
+    """
+    Aplica os ajustes à imagem tile a tile, com memória limitada.
+
+    A imagem recebida é usada como buffer de saída e modificada in-place
+    (exceto quando precisa ser convertida para RGB/RGBA, caso em que a cópia
+    convertida é que recebe o resultado). Imagens somente leitura (mapeadas
+    do decoded_store) não são modificadas nem convertidas: cada tile é
+    convertido ao ser lido e o resultado vai para uma imagem nova.
+
+    Args:
+        img (PIL.Image): Imagem decodificada
+        adjustments (dict): Ajustes no formato de ImageSession.get_adjustments()
+        tile_size (int): Lado dos tiles; se omitido, usa settings.TILE_SIZE
+        backend (str): Backend da etapa de cor (ver ImageProcessor.process_image);
+            ignorado se plan for informado
+        plan (RenderPlan): Plano compilado com tiled=True (ver
+            render_plan.compile_plan); se omitido, é compilado aqui. Cada
+            tile executa as etapas e os backends do plano
+
+    Returns:
+        PIL.Image: Imagem processada (RGB ou RGBA)
+    """
+    if plan is None:
+        # Desfoque exato ('pil'): a grade da redução do backend fast não se
+        # alinharia entre tiles vizinhos e deixaria emendas
+        plan = compile_plan(adjustments, img.size, backend, tiled=True)
+
+    if img.readonly:
+        # Origem mapeada: lida tile a tile e nunca sobrescrita
+        source = img
+        img = Image.new('RGBA' if source.mode == 'RGBA' else 'RGB', source.size)
+    else:
+        img = source = ImageProcessor._normalize_mode(img)
+        img.load()
+
+    halo = kernel_halo(adjustments)
+    tile_size = tile_size or getattr(settings, 'TILE_SIZE', DEFAULT_TILE_SIZE)
+    # A faixa guardada para o halo superior precisa caber em uma faixa
+    tile_size = max(tile_size, halo)
+
+    # Médias do histograma da imagem inteira
+    pivot = ImageProcessor.contrast_pivot(source, adjustments)
+    width, height = img.size
+
+    # Linhas originais imediatamente acima da faixa atual (já sobrescritas na imagem)
+    saved = None
+
+    for y0 in range(0, height, tile_size):
+        y1 = min(y0 + tile_size, height)
+        top = max(0, y0 - halo)
+        bottom = min(height, y1 + halo)
+
+        band = Image.new(img.mode, (width, y1 - y0))
+
+        for x0 in range(0, width, tile_size):
+            x1 = min(x0 + tile_size, width)
+            left = max(0, x0 - halo)
+            right = min(width, x1 + halo)
+
+            tile = source.crop((left, top, right, bottom))
+            if saved is not None and top < y0:
+                # Halo superior vem das linhas originais guardadas
+                tile.paste(saved.crop((left, 0, right, y0 - top)), (0, 0))
+
+            result = ImageProcessor.execute_plan(
+                plan, ImageProcessor._normalize_mode(tile), adjustments, pivot)
+
+            # Descarta o halo e guarda só a área do tile na faixa de saída
+            inner = (x0 - left, y0 - top, x1 - left, y1 - top)
+            band.paste(result.crop(inner), (x0, 0))
+
+        # Antes de sobrescrever, guarda as linhas que serão o halo da próxima
+        # faixa (desnecessário se a origem não é o buffer de saída)
+        if halo and source is img:
+            saved = img.crop((0, max(0, y1 - halo), width, y1))
+        img.paste(band, (0, y0))
+
+    return img
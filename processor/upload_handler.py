@@ -0,0 +1,379 @@
+"""
+Upload handler que valida e grava imagens em uma única passada.
+
+O fluxo padrão do Django guarda o arquivo inteiro (memória ou arquivo
+temporário) antes da view validar qualquer coisa, e depois o copia para o
+armazenamento. Aqui cada bloco entregue pelo parser multipart é, na mesma
+passada:
+
+    - Adicionado ao hash SHA-256 do conteúdo
+    - Contado contra settings.MAX_UPLOAD_SIZE
+    - Usado para identificar o formato pelos magic bytes (não pelo
+      Content-Type enviado pelo cliente) e ler do cabeçalho os metadados
+      gravados na sessão (dimensões, modo, orientação EXIF; ver metadata.py);
+      imagens com mais pixels que MAX_UPLOAD_PIXELS (bombas de
+      descompressão) são recusadas pelo cabeçalho, sem decodificar nada
+    - Escrito no diretório final do ImageField; ao terminar, o arquivo só é
+      renomeado com a extensão do formato detectado
+
+Sob ASGI (uvicorn, ver config/asgi.py) o Django lê o corpo inteiro da
+requisição para um SpooledTemporaryFile antes de qualquer upload handler
+rodar: o handler lê desse spool, então cada upload ainda é gravado uma vez
+no temporário e uma vez no destino, e as recusas acima só acontecem depois
+que o corpo chegou. O limite de bytes é aplicado antes disso por
+RequestBodyLimit, o middleware ASGI que envolve a aplicação: requisições
+com Content-Length acima de MAX_REQUEST_BODY_SIZE recebem 413 sem que o
+corpo seja lido, e corpos sem Content-Length (chunked) são interrompidos
+assim que passam do limite.
+
+O handler só atua nos campos de IMAGE_UPLOAD_FIELDS; os demais seguem para
+os handlers padrão do Django (ver FILE_UPLOAD_HANDLERS em settings.py).
+Quando aborta, o motivo fica em request.upload_error para a view responder 400.
+"""
+import hashlib
+import io
+import json
+import os
+import warnings
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    FileUploadHandler, StopFutureHandlers, StopUpload,
+)
+from PIL import Image
+
+from .metadata import header_info
+
+
+# Assinaturas (magic bytes) dos formatos aceitos
+MAGIC_SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+)
+
+# Tipo MIME e extensão gravados para cada formato detectado
+FORMAT_CONTENT_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'GIF': 'image/gif'}
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+
+# Bytes necessários para reconhecer qualquer assinatura acima
+MAGIC_LENGTH = max(len(signature) for signature, _ in MAGIC_SIGNATURES)
+
+# Quanto do início do arquivo é guardado para ler o cabeçalho (EXIF grande
+# vem antes das dimensões no JPEG)
+HEADER_SNIFF_LIMIT = 1024 * 1024
+
+# Limite padrão de pixels (largura x altura) de uma imagem enviada
+DEFAULT_MAX_UPLOAD_PIXELS = 100_000_000
+
+# Limite padrão de tamanho de um arquivo enviado (10MB)
+DEFAULT_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+
+# Folga do corpo da requisição sobre MAX_UPLOAD_SIZE: delimitadores e
+# cabeçalhos multipart e os demais campos do formulário
+REQUEST_BODY_OVERHEAD = 1024 * 1024
+
+
+def sniff_format(data):
+    """
+    Identifica o formato da imagem pelos primeiros bytes.
+
+    Args:
+        data (bytes): Início do arquivo (ao menos MAGIC_LENGTH bytes)
+
+    Returns:
+        str | None: 'JPEG', 'PNG' ou 'GIF', ou None se não reconhecido
+    """
+    for signature, image_format in MAGIC_SIGNATURES:
+        if data.startswith(signature):
+            return image_format
+    return None
+
+
+def sniff_upload(uploaded_file):
+    """
+    Identifica o formato de um arquivo enviado pelos magic bytes.
+
+    Usado quando o upload passou pelos handlers padrão do Django; a posição
+    do arquivo volta ao início.
+
+    Args:
+        uploaded_file: UploadedFile (ou qualquer arquivo com seek)
+
+    Returns:
+        str | None: Formato detectado (ver sniff_format)
+    """
+    uploaded_file.seek(0)
+    try:
+        return sniff_format(uploaded_file.read(MAGIC_LENGTH))
+    finally:
+        uploaded_file.seek(0)
+
+
+class StoredImageUpload(UploadedFile):
+    """
+    Imagem já validada e gravada no caminho final pelo ImageUploadHandler.
+
+    Atributos:
+        storage_name (str): Nome no storage (ex.: 'uploads/uuid.jpg'); basta
+            atribuí-lo ao ImageField, sem salvar (copiar) o arquivo de novo
+        content_hash (str): SHA-256 do conteúdo
+        image_format (str): Formato detectado pelos magic bytes
+        width (int), height (int): Dimensões lidas do cabeçalho
+        info (dict): Metadados do cabeçalho (ver metadata.header_info)
+    """
+
+    def __init__(self, storage_name, path, size, content_hash, image_format, info):
+        file = open(path, 'rb')
+        try:
+            super().__init__(
+                file, os.path.basename(storage_name),
+                FORMAT_CONTENT_TYPES[image_format], size,
+            )
+        except BaseException:
+            file.close()
+            raise
+        self.storage_name = storage_name
+        self.path = path
+        self.content_hash = content_hash
+        self.image_format = image_format
+        self.width = info['width']
+        self.height = info['height']
+        self.info = info
+
+    def temporary_file_path(self):
+        """Permite que storage.save() mova o arquivo em vez de copiá-lo."""
+        return self.path
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """
+    Upload handler com validação incremental, hash e gravação no destino final.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.active = False
+
+        fields = getattr(settings, 'IMAGE_UPLOAD_FIELDS', ('image',))
+        if field_name not in fields:
+            return
+
+        from .models import ImageSession
+        field = ImageSession._meta.get_field('original_image')
+        try:
+            self.part_name = field.generate_filename(None, 'upload.part')
+            self.part_path = field.storage.path(self.part_name)
+        except NotImplementedError:
+            # Storage sem caminho local: usa os handlers padrão
+            return
+
+        self.max_size = getattr(settings, 'MAX_UPLOAD_SIZE', DEFAULT_MAX_UPLOAD_SIZE)
+        if self.content_length is not None and self.content_length > self.max_size:
+            self._abort(too_large_message())
+
+        os.makedirs(os.path.dirname(self.part_path), exist_ok=True)
+        self.hasher = hashlib.sha256()
+        self.header = bytearray()
+        self.image_format = None
+        self.dimensions = None
+        self.info = None
+        # A partir daqui o arquivo parcial é do handler: file_complete o
+        # fecha, e _discard o fecha e remove em qualquer interrupção
+        self.file = open(self.part_path, 'wb')
+        self.active = True
+
+        # Os demais handlers não recebem este arquivo
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+
+        if start + len(raw_data) > self.max_size:
+            self._abort(too_large_message())
+
+        try:
+            if self.dimensions is None:
+                self._sniff(raw_data)
+
+            self.hasher.update(raw_data)
+            self.file.write(raw_data)
+        except BaseException:
+            self._discard()
+            raise
+        return None
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+
+        try:
+            self.file.close()
+        finally:
+            self.active = False
+        if self.dimensions is None:
+            os.remove(self.part_path)
+            self._abort('Arquivo de imagem inválido ou corrompido')
+
+        # Destino final: mesmo diretório, extensão do formato detectado
+        storage_name = (
+            self.part_name[:-len('part')] + FORMAT_EXTENSIONS[self.image_format]
+        )
+        path = self.part_path[:-len('part')] + FORMAT_EXTENSIONS[self.image_format]
+        os.replace(self.part_path, path)
+
+        return StoredImageUpload(
+            storage_name, path, file_size, self.hasher.hexdigest(),
+            self.image_format, self.info,
+        )
+
+    def upload_interrupted(self):
+        self._discard()
+
+    def upload_complete(self):
+        if getattr(self, 'active', False):
+            # Upload abortado no meio: o arquivo parcial não é usado
+            self._discard()
+        return None
+
+    def _sniff(self, raw_data):
+        """Acumula o início do arquivo até identificar formato e dimensões."""
+        self.header += raw_data[:HEADER_SNIFF_LIMIT - len(self.header)]
+
+        if self.image_format is None and len(self.header) >= MAGIC_LENGTH:
+            self.image_format = sniff_format(self.header)
+            if self.image_format is None:
+                self._abort('Tipo de arquivo não permitido')
+
+        if self.image_format is None:
+            return
+
+        try:
+            # Image.open só lê o cabeçalho; os pixels não são decodificados.
+            # O limite de pixels é verificado abaixo, sem o aviso do Pillow
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+                with Image.open(io.BytesIO(self.header), formats=[self.image_format]) as img:
+                    self.info = header_info(img)
+                    self.dimensions = img.size
+        except Image.DecompressionBombError:
+            self._abort('Imagem com dimensões grandes demais')
+        except Exception:
+            # Cabeçalho ainda incompleto: espera o próximo bloco
+            if len(self.header) >= HEADER_SNIFF_LIMIT:
+                self._abort('Arquivo de imagem inválido ou corrompido')
+            return
+
+        width, height = self.dimensions
+        max_pixels = getattr(settings, 'MAX_UPLOAD_PIXELS', DEFAULT_MAX_UPLOAD_PIXELS)
+        if width * height > max_pixels:
+            self._abort('Imagem com dimensões grandes demais')
+        self.header = bytearray()
+
+    def _abort(self, message):
+        """Registra o motivo para a view e interrompe o upload."""
+        self.request.upload_error = message
+        raise StopUpload(connection_reset=True)
+
+    def _discard(self):
+        """Remove o arquivo parcial de um upload interrompido."""
+        if not getattr(self, 'active', False):
+            return
+        self.active = False
+        try:
+            self.file.close()
+        finally:
+            if os.path.exists(self.part_path):
+                os.remove(self.part_path)
+
+
+def too_large_message():
+    """Mensagem de erro de arquivo acima de MAX_UPLOAD_SIZE."""
+    max_size = getattr(settings, 'MAX_UPLOAD_SIZE', DEFAULT_MAX_UPLOAD_SIZE)
+    return f'Arquivo muito grande (máximo {max_size // 1048576}MB)'
+
+
+def max_request_body_size():
+    """
+    Limite do corpo das requisições HTTP, em bytes.
+
+    Returns:
+        int: settings.MAX_REQUEST_BODY_SIZE, ou MAX_UPLOAD_SIZE mais
+        REQUEST_BODY_OVERHEAD
+    """
+    max_size = getattr(settings, 'MAX_UPLOAD_SIZE', DEFAULT_MAX_UPLOAD_SIZE)
+    return getattr(settings, 'MAX_REQUEST_BODY_SIZE', max_size + REQUEST_BODY_OVERHEAD)
+
+
+class RequestBodyLimit:
+    """
+    Middleware ASGI que limita o corpo das requisições antes do Django lê-lo.
+
+    O ASGIHandler do Django grava o corpo inteiro em um arquivo temporário
+    antes de montar a requisição, então nem o ImageUploadHandler nem as
+    views conseguem recusar um upload grande antes de ele chegar por
+    completo. Aqui a recusa acontece na entrada:
+        - Content-Length acima do limite: 413 sem ler o corpo
+        - Corpo sem Content-Length (ou maior que o declarado): o receive
+          passa a devolver 'http.disconnect' assim que a soma dos blocos
+          passa do limite; o Django abandona a leitura (e o temporário) e o
+          413 é enviado aqui
+
+    Exemplo (config/asgi.py):
+        >>> application = RequestBodyLimit(get_asgi_application())
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        limit = max_request_body_size()
+        for name, value in scope.get('headers', ()):
+            if name == b'content-length' and value.isdigit() and int(value) > limit:
+                return await self._reject(send)
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                return {'type': 'http.disconnect'}
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > limit:
+                    exceeded = True
+                    return {'type': 'http.disconnect'}
+            return message
+
+        async def tracked_send(message):
+            nonlocal started
+            if message['type'] == 'http.response.start':
+                started = True
+            await send(message)
+
+        await self.app(scope, limited_receive, tracked_send)
+        if exceeded and not started:
+            await self._reject(send)
+
+    async def _reject(self, send):
+        """Envia a resposta 413 no mesmo formato de erro das views."""
+        body = json.dumps({'error': too_large_message()}).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': 413,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'connection', b'close'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
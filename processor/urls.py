@@ -34,6 +34,10 @@ urlpatterns = [
     # POST /api/upload/ -> Retorna session_id e image_url
     path('api/upload/', views.upload_image, name='upload'),
 
+    # Imagem original em um tier de resolução (thumbnail, screen ou full)
+    # GET /api/preview/<session_id>/<tier>/ -> Retorna o arquivo do tier
+    path('api/preview/<uuid:session_id>/<str:tier>/', views.preview_image, name='preview'),
+
     # ==============================================================================
     # AJUSTES NÃO-DESTRUTIVOS
     # ==============================================================================
@@ -52,6 +56,10 @@ urlpatterns = [
     # POST /api/snapshots/<session_id>/ -> Cria novo snapshot
     path('api/snapshots/<uuid:session_id>/', views.snapshots_handler, name='snapshots'),
 
+    # Todos os snapshots renderizados de uma vez (comparação de versões)
+    # GET /api/snapshots/<session_id>/render/ -> Folha de contatos (ou ZIP/multipart)
+    path('api/snapshots/<uuid:session_id>/render/', views.snapshots_render, name='snapshots_render'),
+
     # Operações em snapshot específico
     # POST   /api/snapshots/<session_id>/<snapshot_id>/ -> Carrega ajustes do snapshot
     # DELETE /api/snapshots/<session_id>/<snapshot_id>/ -> Remove snapshot
@@ -65,6 +73,10 @@ urlpatterns = [
     # POST /api/render/<session_id>/ -> Renderiza imagem no servidor
     path('api/render/<uuid:session_id>/', views.render_image, name='render'),
 
+    # Plano de renderização dos ajustes atuais (depuração)
+    # GET /api/render/<session_id>/plan/ -> Etapas, backends e custos estimados
+    path('api/render/<uuid:session_id>/plan/', views.render_plan_view, name='render_plan'),
+
     # Download da imagem processada
     # GET /api/download/<session_id>/ -> Retorna arquivo da imagem
     path('api/download/<uuid:session_id>/', views.download_image, name='download'),
@@ -72,4 +84,8 @@ urlpatterns = [
     # Upload da imagem renderizada pelo cliente (para download posterior)
     # POST /api/upload-rendered/<session_id>/ -> Recebe imagem do canvas
     path('api/upload-rendered/<uuid:session_id>/', views.upload_rendered, name='upload_rendered'),
+
+    # Renderização em lote (exportação de catálogos)
+    # POST /api/batch/render/ -> ZIP ou multipart com as imagens renderizadas
+    path('api/batch/render/', views.batch_render, name='batch_render'),
 ]
@@ -7,17 +7,44 @@ processam dados e retornam respostas para o frontend da aplicação.
 Endpoints principais:
     - index: Página inicial da aplicação
     - upload_image: Upload de imagens e criação de sessões
+    - preview_image: Imagem original em um tier de resolução (thumbnail/screen/full)
     - adjustments_handler: Gerenciamento de ajustes de imagem
     - snapshots_handler: Gerenciamento de snapshots da linha do tempo
+    - snapshots_render: Todos os snapshots renderizados de uma vez
     - render_image: Renderização de imagens no servidor (fallback)
     - download_image: Download da imagem processada
+    - batch_render: Renderização em lote (ZIP ou multipart em streaming)
+
+As views de upload, renderização e download são assíncronas (async def):
+servidas via ASGI, o event loop continua aceitando conexões enquanto a
+renderização roda no pool de processos e a leitura/escrita de arquivos
+roda em threads.
 """
-from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse, FileResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.shortcuts import render, get_object_or_404, aget_object_or_404
+from django.http import HttpResponse, JsonResponse, FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.decorators.http import require_http_methods
-from .models import ImageSession, ProcessingSnapshot
+from .batch import BATCH_FORMATS, resolve_items, snapshot_items, stream_batch
+from .contact_sheet import render_contact_sheet
+from .encoders import accepts, get_encoder, negotiate, source_encoder, source_format
+from .metadata import content_digest, ensure_image_info, read_image_info
+from .models import DEFAULT_ADJUSTMENTS, ImageSession, ProcessingSnapshot
+from .originals import acquire_original, release_original
+from .preview_queue import enqueue_snapshot_preview
+from .previews import generate_previews, share_previews, store_previews, tier_file
+from .render_cache import get_render_cache, make_key, media_url
+from .render_plan import compile_plan, is_identity, plan_to_json
+from .render_service import RenderQueueFull, arender_cached, arun_task
+from .rendered_store import CONTENT_TYPE_EXTENSIONS, get_rendered_store
+from .streaming import ranged_response, streaming_content
+from .upload_handler import StoredImageUpload, sniff_upload, too_large_message
+import asyncio
 import json
+import os
 
 
 @ensure_csrf_cookie
@@ -37,14 +64,38 @@ def index(request):
     return render(request, 'processor/index.html')
 
 
+async def _aload_post(request):
+    """
+    Faz o parse do corpo multipart/form em uma thread.
+
+    O parse grava uploads grandes em arquivos temporários; fora do event
+    loop ele não atrasa as outras conexões.
+
+    Returns:
+        tuple: (request.POST, request.FILES)
+    """
+    return await sync_to_async(lambda: (request.POST, request.FILES))()
+
+
 @require_http_methods(["POST"])
-def upload_image(request):
+async def upload_image(request):
     """
     Lida com o upload de imagens e cria uma nova sessão de edição.
 
     Este endpoint recebe uma imagem via POST, valida o arquivo (tamanho e tipo),
     e cria uma nova ImageSession no banco de dados.
 
+    A validação acontece em uma passada sobre o corpo recebido
+    (ImageUploadHandler, ver upload_handler.py): o formato vem dos magic
+    bytes, as dimensões do cabeçalho, o hash é calculado na mesma passada, e
+    o arquivo é gravado direto no caminho final, então a sessão só
+    referencia o arquivo. Corpos acima de MAX_REQUEST_BODY_SIZE são
+    recusados com 413 antes de serem lidos (RequestBodyLimit).
+
+    Originais são armazenados por conteúdo (ver originals.py): reenviar uma
+    foto já armazenada não grava outro arquivo, e a nova sessão reaproveita
+    as versões reduzidas e as renderizações em cache do mesmo original.
+
     Args:
         request: Objeto HttpRequest contendo o arquivo de imagem
 
@@ -52,46 +103,143 @@ def upload_image(request):
         JsonResponse com:
             - session_id: ID único da sessão criada
             - image_url: URL da imagem original
+            - content_hash: SHA-256 do arquivo enviado
+            - image_info: Metadados do cabeçalho (dimensões, formato, modo,
+              orientação EXIF, transparência)
+            - previews: URLs dos tiers 'thumbnail', 'screen' e 'full'
             - adjustments: Valores padrão de ajustes
 
     Validações:
         - Arquivo deve estar presente no campo 'image'
-        - Tamanho máximo: 10MB
-        - Tipos permitidos: JPEG, JPG, PNG, GIF
+        - Tamanho máximo: settings.MAX_UPLOAD_SIZE (10MB)
+        - Tipos permitidos (pelo conteúdo): JPEG, PNG, GIF
+        - Dimensões máximas: settings.MAX_UPLOAD_PIXELS
 
     Códigos de status HTTP:
         200: Sucesso
         400: Erro de validação (arquivo muito grande, tipo inválido, etc.)
+        413: Corpo da requisição acima de MAX_REQUEST_BODY_SIZE (ASGI)
     """
-    # Verifica se um arquivo de imagem foi enviado
-    if 'image' not in request.FILES:
-        return JsonResponse({'error': 'Nenhuma imagem enviada'}, status=400)
+    _, files = await _aload_post(request)
 
-    image = request.FILES['image']
+    # Upload abortado pelo ImageUploadHandler (tamanho, formato ou dimensões)
+    upload_error = getattr(request, 'upload_error', None)
+    if upload_error:
+        return JsonResponse({'error': upload_error}, status=400)
 
-    # Valida o tamanho do arquivo (máximo 10MB = 10485760 bytes)
-    if image.size > 10485760:  # 10MB
-        return JsonResponse({'error': 'Arquivo muito grande (máximo 10MB)'}, status=400)
+    # Verifica se um arquivo de imagem foi enviado
+    if 'image' not in files:
+        return JsonResponse({'error': 'Nenhuma imagem enviada'}, status=400)
 
-    # Valida o tipo MIME do arquivo
-    allowed_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif']
-    if image.content_type not in allowed_types:
-        return JsonResponse({'error': 'Tipo de arquivo não permitido'}, status=400)
+    image = files['image']
+
+    stored = None
+    if isinstance(image, StoredImageUpload):
+        # Já validado e gravado: o arquivo vira (ou reaproveita) o original
+        # armazenado por conteúdo, e a sessão só o referencia
+        stored = await sync_to_async(acquire_original)(image)
+        original_image = stored.file.name
+        content_hash = stored.content_hash
+        info = image.info
+    else:
+        # Handler padrão do Django (ex.: storage sem caminho local)
+        if image.size > getattr(settings, 'MAX_UPLOAD_SIZE', 10485760):
+            return JsonResponse({'error': too_large_message()}, status=400)
+
+        # Valida o tipo pelos magic bytes, como o ImageUploadHandler (o
+        # Content-Type vem do cliente)
+        if await asyncio.to_thread(sniff_upload, image) is None:
+            return JsonResponse({'error': 'Tipo de arquivo não permitido'}, status=400)
+
+        # Só o cabeçalho é lido; o hash percorre o arquivo em blocos
+        try:
+            info = await asyncio.to_thread(read_image_info, image)
+        except Exception:
+            return JsonResponse({'error': 'Arquivo de imagem inválido ou corrompido'}, status=400)
+        content_hash = await asyncio.to_thread(content_digest, image)
+        original_image = image
 
     # Cria uma nova sessão no banco de dados com ajustes padrão
-    session = ImageSession.objects.create(
-        original_image=image,
-        adjustments={}  # Dicionário vazio usa valores padrão (definidos em get_adjustments)
+    session = ImageSession(
+        original_image=original_image,
+        stored_original=stored,
+        content_hash=content_hash,
+        adjustments={},  # Dicionário vazio usa valores padrão (definidos em get_adjustments)
+        **info,          # Metadados do cabeçalho (ver metadata.py)
     )
 
+    # Reenvio de um conteúdo já armazenado: as versões reduzidas do original
+    # compartilhado são reaproveitadas
+    has_previews = stored is not None and share_previews(session, stored)
+    try:
+        await session.asave(force_insert=True)
+    except Exception:
+        if stored is not None:
+            await sync_to_async(release_original)(stored.content_hash)
+        raise
+
+    if not has_previews:
+        # Gera miniatura e preview de tela (decodificação reduzida, sem ler a
+        # resolução completa) em uma thread, e grava os campos no banco
+        previews = await asyncio.to_thread(generate_previews, session.original_image.path)
+        await sync_to_async(store_previews)(session, previews)
+
     # Retorna dados da sessão criada em formato JSON
     return JsonResponse({
         'session_id': str(session.id),           # ID da sessão (UUID convertido para string)
         'image_url': session.original_image.url, # URL para acessar a imagem
+        'content_hash': content_hash,            # SHA-256 do arquivo enviado
+        'image_info': session.get_image_info(),  # Metadados gravados no banco
+        'previews': _preview_urls(session),      # URLs de cada tier de resolução
         'adjustments': session.get_adjustments(), # Valores padrão de todos os ajustes
     })
 
 
+@require_http_methods(["GET"])
+def preview_image(request, session_id, tier):
+    """
+    Retorna a imagem original de uma sessão em um tier de resolução.
+
+    Tiers disponíveis:
+        - thumbnail: miniatura (linha do tempo)
+        - screen: preview do tamanho da tela (ajustes interativos)
+        - full: imagem original
+
+    Sessões antigas, sem previews, têm as versões reduzidas geradas no
+    primeiro pedido.
+
+    Args:
+        request: Objeto HttpRequest
+        session_id (str): UUID da sessão de imagem
+        tier (str): Nome do tier
+
+    Returns:
+        FileResponse: Arquivo da imagem no tier pedido
+
+    Códigos de status HTTP:
+        200: Sucesso
+        400: Tier inválido
+        404: Sessão não encontrada
+    """
+    session = get_object_or_404(ImageSession, id=session_id)
+
+    try:
+        field_file = tier_file(session, tier)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return FileResponse(field_file.open('rb'))
+
+
+def _preview_urls(session):
+    """Monta o dicionário {tier: URL} de uma sessão."""
+    return {
+        'thumbnail': session.thumbnail.url if session.thumbnail else None,
+        'screen': session.screen_preview.url if session.screen_preview else None,
+        'full': session.original_image.url,
+    }
+
+
 def adjustments_handler(request, session_id):
     """
     Gerencia o endpoint de ajustes com múltiplos métodos HTTP.
@@ -112,7 +260,8 @@ def adjustments_handler(request, session_id):
     GET Response:
         {
             "session_id": "uuid-da-sessao",
-            "adjustments": {"saturation": 100, "brightness": 0, ...}
+            "adjustments": {"saturation": 100, "brightness": 0, ...},
+            "image_info": {"width": 1920, "height": 1080, "format": "JPEG", ...}
         }
 
     POST Request Body:
@@ -140,6 +289,8 @@ def adjustments_handler(request, session_id):
         return JsonResponse({
             'session_id': str(session.id),
             'adjustments': session.get_adjustments(),
+            # Lido do banco (sessões antigas leem o cabeçalho uma única vez)
+            'image_info': ensure_image_info(session),
         })
 
     elif request.method == 'POST':
@@ -205,7 +356,8 @@ def snapshots_handler(request, session_id):
                     "description": "Versão com alto contraste",
                     "adjustments": {...},
                     "order": 0,
-                    "created_at": "2024-01-01T12:00:00"
+                    "created_at": "2024-01-01T12:00:00",
+                    "preview_url": "/media/snapshots/preview.jpg"  // null enquanto renderiza
                 }
             ]
         }
@@ -243,6 +395,7 @@ def snapshots_handler(request, session_id):
             'adjustments': snapshot.adjustments,
             'order': snapshot.order,
             'created_at': snapshot.created_at.isoformat(),  # Converte datetime para string ISO
+            'preview_url': snapshot.preview_image.url if snapshot.preview_image else None,
         } for snapshot in session.snapshots.all()]
 
         # Retorna dados completos da sessão e snapshots
@@ -272,7 +425,11 @@ def snapshots_handler(request, session_id):
                 order=order,
             )
 
+            # Agenda a renderização do preview em segundo plano
+            enqueue_snapshot_preview(snapshot)
+
             # Retorna dados do snapshot criado
+            # (preview_url fica disponível na listagem quando o render terminar)
             return JsonResponse({
                 'snapshot_id': str(snapshot.id),
                 'id': str(snapshot.id),
@@ -280,6 +437,7 @@ def snapshots_handler(request, session_id):
                 'adjustments': snapshot.adjustments,
                 'order': snapshot.order,
                 'created_at': snapshot.created_at.isoformat(),
+                'preview_url': None,
             })
 
         except (json.JSONDecodeError, ValueError, TypeError) as e:
@@ -290,6 +448,73 @@ def snapshots_handler(request, session_id):
     return JsonResponse({'error': 'Método não permitido'}, status=405)
 
 
+@require_http_methods(["GET"])
+async def snapshots_render(request, session_id):
+    """
+    Renderiza todos os snapshots de uma sessão de uma só vez, para comparação.
+
+    O original é decodificado uma única vez, e os snapshots são agrupados
+    pelos valores de desfoque e nitidez: esses filtros (as etapas caras)
+    rodam uma vez por grupo, e cada snapshot só paga a etapa de cor.
+
+    Args:
+        request: Objeto HttpRequest
+        session_id (str): UUID da sessão de imagem
+
+    Request (query string):
+        - output: 'sheet' (padrão), 'zip' ou 'multipart'
+        - tier: tier de origem; padrão 'screen' para a folha de contatos e
+          'full' para as saídas por snapshot
+
+    Returns:
+        HttpResponse: Folha de contatos em JPEG (grade com a legenda de cada
+        snapshot), ou StreamingHttpResponse com um arquivo por snapshot
+        (mesmo formato de batch_render)
+
+    Códigos de status HTTP:
+        200: Sucesso
+        400: Saída ou tier inválidos, ou sessão sem snapshots
+        404: Sessão não encontrada
+        429: Fila de renderização cheia (tente novamente)
+    """
+    session = await aget_object_or_404(ImageSession, id=session_id)
+    snapshots = [snapshot async for snapshot in session.snapshots.all()]
+    if not snapshots:
+        return JsonResponse({'error': 'A sessão não tem snapshots'}, status=400)
+
+    output = request.GET.get('output', 'sheet')
+    if output != 'sheet' and output not in BATCH_FORMATS:
+        return JsonResponse({'error': f'Saída inválida: {output}'}, status=400)
+
+    tier = request.GET.get('tier') or ('screen' if output == 'sheet' else 'full')
+    try:
+        image_path = (await sync_to_async(tier_file)(session, tier)).path
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if output != 'sheet':
+        content_type, content = stream_batch(snapshot_items(snapshots, image_path), output)
+        response = StreamingHttpResponse(
+            streaming_content(request, content), content_type=content_type,
+        )
+        if output == 'zip':
+            response['Content-Disposition'] = (
+                f'attachment; filename="snapshots_{session.id}.zip"'
+            )
+        return response
+
+    labels = [f'#{snapshot.order} {snapshot.description}' for snapshot in snapshots]
+    try:
+        data = await arun_task(
+            image_path, render_contact_sheet, image_path,
+            [snapshot.get_adjustments() for snapshot in snapshots], labels,
+        )
+    except RenderQueueFull:
+        return _queue_full_response()
+
+    return HttpResponse(data, content_type='image/jpeg')
+
+
 def snapshot_detail_handler(request, session_id, snapshot_id):
     """
     Gerencia operações em snapshots individuais.
@@ -361,7 +586,7 @@ def snapshot_detail_handler(request, session_id, snapshot_id):
 
 
 @require_http_methods(["POST"])
-def render_image(request, session_id):
+async def render_image(request, session_id):
     """
     Endpoint de renderização no servidor (fallback para navegadores antigos).
 
@@ -369,47 +594,103 @@ def render_image(request, session_id):
     performance em tempo real. Este endpoint serve como fallback para
     navegadores que não suportam as APIs modernas de canvas.
 
+    O resultado é guardado no cache de renderizações (render_cache.py), então
+    estados repetidos da sessão (desfazer/refazer, snapshots recarregados)
+    não são renderizados de novo.
+
     Args:
         request: Objeto HttpRequest
         session_id (str): UUID da sessão de imagem
 
+    Request:
+        - Parâmetro 'tier' (opcional): 'thumbnail', 'screen' ou 'full' (padrão).
+          Renderizar sobre o preview 'screen' custa uma fração do original
+        - Parâmetros 'format', 'quality' e 'effort' (opcionais): formato de
+          saída (jpeg, png, webp, avif); sem 'format', é negociado pelo
+          header Accept (ver encoders.py)
+
     Returns:
         JsonResponse confirmando a renderização
 
     Response:
         {
             "success": true,
-            "message": "Imagem renderizada no servidor"
+            "message": "Imagem renderizada no servidor",
+            "cached": false,
+            "format": "webp",
+            "image_url": "/media/processed/ab/ab12...webp"
         }
 
+        Com os ajustes neutros (ver _passthrough_encoder), nada é
+        renderizado: "original" vem como true e "image_url" aponta para o
+        próprio arquivo do tier.
+
     Códigos de status HTTP:
         200: Sucesso
+        400: Tier ou formato inválido
         404: Sessão não encontrada
+        429: Fila de renderização cheia (tente novamente)
         500: Erro durante a renderização
     """
-    session = get_object_or_404(ImageSession, id=session_id)
+    session = await aget_object_or_404(ImageSession, id=session_id)
+    post, _ = await _aload_post(request)
 
     try:
-        from .image_processor import ImageProcessor
-        from django.core.files.base import ContentFile
-        import uuid
-
         # Obtém os ajustes atuais da sessão
         adj = session.get_adjustments()
 
-        # Caminho da imagem original no sistema de arquivos
-        img_path = session.original_image.path
-
-        # Aplica todos os ajustes à imagem (processamento não-destrutivo)
-        processed = ImageProcessor.apply_all_adjustments(img_path, adj)
-
-        # Gera nome de arquivo único para a imagem renderizada
-        filename = f'rendered_{uuid.uuid4()}.jpg'
-
-        return JsonResponse({
+        # Tier de resolução a renderizar (padrão: imagem original completa)
+        tier = post.get('tier') or request.GET.get('tier') or 'full'
+        try:
+            # Pode gerar os previews de sessões antigas (banco e disco)
+            field_file = await sync_to_async(tier_file)(session, tier)
+            img_path = field_file.path
+            # Formato de saída: parâmetros do corpo ou da query string, ou Accept
+            params = {**request.GET.dict(), **post.dict()}
+            info = await sync_to_async(ensure_image_info)(session)
+            fmt = _output_format(request, params, info['has_alpha'])
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        # Ajustes neutros: o próprio arquivo do tier é o resultado
+        if is_identity(adj):
+            if tier == 'full':
+                image_format = info['format']
+            else:
+                image_format = (await asyncio.to_thread(read_image_info, img_path))['image_format']
+            source = _passthrough_encoder(params, adj, info, image_format,
+                                          request.headers.get('Accept'))
+            if source is not None:
+                response = JsonResponse({
+                    'success': True,
+                    'message': 'Ajustes neutros: imagem original',
+                    'cached': True,
+                    'original': True,
+                    'format': source.name,
+                    'image_url': field_file.url,
+                })
+                patch_vary_headers(response, ('Accept',))
+                return response
+
+        # Consulta o cache antes de renderizar e aplica todos os ajustes à
+        # imagem em caso de falta (processamento não-destrutivo); a
+        # renderização roda no pool de processos sem bloquear o event loop
+        key, _, cached = await arender_cached(img_path, adj, fmt)
+        cache_path = get_render_cache().path_for(key)
+
+        response = JsonResponse({
             'success': True,
             'message': 'Imagem renderizada no servidor',
+            'cached': cached,
+            'format': fmt.name,
+            'image_url': media_url(cache_path) if cache_path else None,
         })
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    except RenderQueueFull:
+        # Pool de renderização saturado: o cliente deve tentar novamente
+        return _queue_full_response()
 
     except Exception as e:
         # Captura qualquer erro durante o processamento
@@ -417,37 +698,176 @@ def render_image(request, session_id):
 
 
 @require_http_methods(["GET"])
-def download_image(request, session_id):
+def render_plan_view(request, session_id):
+    """
+    Retorna o plano de renderização dos ajustes atuais (depuração).
+
+    O plano é compilado a partir dos metadados gravados no upload, sem
+    abrir a imagem (ver render_plan.compile_plan).
+
+    Args:
+        request: Objeto HttpRequest
+        session_id (str): UUID da sessão de imagem
+
+    Returns:
+        JsonResponse com o plano
+
+    Response:
+        {
+            "session_id": "uuid",
+            "adjustments": {...},
+            "plan": {
+                "size": [4000, 3000],
+                "tiled": false,
+                "cost_ms": 502.69,
+                "peak_bytes": 192000000,
+                "steps": [
+                    {"stage": "blur", "backend": "fast", "cost_ms": 154.68,
+                     "params": {"radius": 8.0, "factor": 3}},
+                    ...
+                ]
+            }
+        }
+
+    Códigos de status HTTP:
+        200: Sucesso
+        400: Backend inválido nas configurações
+        404: Sessão não encontrada
+    """
+    session = get_object_or_404(ImageSession, id=session_id)
+    adjustments = session.get_adjustments()
+    info = ensure_image_info(session)
+
+    try:
+        plan = compile_plan(adjustments, (info['width'], info['height']))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'session_id': str(session.id),
+        'adjustments': adjustments,
+        'plan': plan_to_json(plan),
+    })
+
+
+@require_http_methods(["GET"])
+async def download_image(request, session_id):
     """
     Endpoint de download da imagem processada.
 
-    Por enquanto, retorna a imagem original. Em produção, o cliente
-    deveria enviar a imagem final renderizada via upload_rendered() primeiro.
+    A imagem é renderizada no servidor com os ajustes atuais da sessão
+    (reaproveitando o cache de renderizações) e enviada em blocos, sem
+    exigir que o cliente recodifique o canvas e faça upload antes. Se o
+    cliente já tiver enviado a renderização desses ajustes (upload_rendered)
+    no formato escolhido, e nenhuma qualidade ou esforço tiver sido pedido,
+    ela é servida diretamente.
+
+    Suporta requisições condicionais e parciais:
+        - ETag / If-None-Match: 304 se o cliente já tiver a mesma versão
+        - Range / If-Range: 206 com apenas o trecho pedido (retomada de download)
+
+    O formato vem do parâmetro 'format' (com 'quality' e 'effort'
+    opcionais); sem ele, é o formato do original, ou JPEG progressivo (PNG
+    se houver transparência) quando não há codificador para ele (ver
+    encoders.source_format). O header Accept não é considerado. Com os
+    ajustes neutros, os bytes do original são enviados sem decodificação
+    nem recodificação (ver _passthrough_encoder).
 
     Args:
         request: Objeto HttpRequest
         session_id (str): UUID da sessão de imagem
 
     Returns:
-        FileResponse: Arquivo da imagem para download
+        StreamingHttpResponse: Arquivo da imagem para download
 
     Headers de resposta:
-        Content-Type: image/jpeg
+        Content-Type: image/jpeg (ou o tipo do formato escolhido)
         Content-Disposition: attachment; filename="processed_{session_id}.jpg"
+        ETag: chave da renderização no cache
+        Accept-Ranges: bytes
 
     Códigos de status HTTP:
         200: Sucesso (arquivo enviado)
+        206: Conteúdo parcial (requisição com Range)
+        304: Não modificado (If-None-Match)
+        400: Formato ou parâmetros de codificação inválidos
         404: Sessão não encontrada
+        416: Intervalo (Range) inválido
+        429: Fila de renderização cheia (tente novamente)
     """
-    session = get_object_or_404(ImageSession, id=session_id)
+    session = await aget_object_or_404(ImageSession, id=session_id)
 
-    # Por enquanto, retorna a imagem original
-    # Em produção, o cliente deveria fazer upload da imagem renderizada antes
     image_path = session.original_image.path
-    filename = f'processed_{session.id}.jpg'
+    adjustments = session.get_adjustments()
+
+    try:
+        info = await sync_to_async(ensure_image_info)(session)
+        fmt = source_format(
+            info['format'],
+            request.GET.get('format'),
+            request.GET.get('quality'),
+            request.GET.get('effort'),
+            alpha=info['has_alpha'],
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    encoder = get_encoder(fmt)
+    filename = f'processed_{session.id}.{encoder.extension}'
+
+    # Ajustes neutros: envia os bytes do original, sem decodificar nem
+    # recodificar (o hash do conteúdo é o ETag)
+    source = _passthrough_encoder(request.GET, adjustments, info, info['format'])
+    if source is not None:
+        etag = quote_etag(info['content_hash'])
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        response = ranged_response(request, source.content_type, path=image_path, etag=etag)
+        response['Content-Disposition'] = (
+            f'attachment; filename="processed_{session.id}.{source.extension}"'
+        )
+        return response
+
+    # Se o cliente já enviou a renderização destes ajustes no formato
+    # escolhido, serve-a direto (qualidade ou esforço pedidos exigem
+    # codificar no servidor)
+    stored = None
+    if not any(request.GET.get(name) for name in ('quality', 'effort')):
+        stored = await asyncio.to_thread(get_rendered_store().get, session.id, adjustments)
+        if stored is not None and stored[1] != encoder.content_type:
+            stored = None
+    if stored is not None:
+        stored_path, content_type, digest = stored
+        etag = quote_etag(digest)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        extension = CONTENT_TYPE_EXTENSIONS[content_type]
+        response = ranged_response(request, content_type, path=stored_path, etag=etag)
+        response['Content-Disposition'] = (
+            f'attachment; filename="processed_{session.id}.{extension}"'
+        )
+        return response
+
+    # A chave do cache identifica a versão: serve de ETag sem renderizar nada
+    etag = quote_etag(await asyncio.to_thread(make_key, image_path, adjustments, fmt))
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
 
-    # Cria resposta de arquivo para download
-    response = FileResponse(open(image_path, 'rb'), content_type='image/jpeg')
+    try:
+        key, data, _ = await arender_cached(image_path, adjustments, fmt)
+    except RenderQueueFull:
+        return _queue_full_response()
+
+    # Prefere o arquivo do cache em disco (lido em blocos); senão, o buffer
+    cache_path = get_render_cache().path_for(key)
+    if cache_path and os.path.exists(cache_path):
+        response = ranged_response(request, encoder.content_type, path=cache_path, etag=etag)
+    else:
+        response = ranged_response(request, encoder.content_type, data=data, etag=etag)
 
     # Define header que força o download (não abre no navegador)
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
@@ -455,8 +875,123 @@ def download_image(request, session_id):
     return response
 
 
+def _output_format(request, params, alpha):
+    """
+    Escolhe o formato de saída de uma renderização (ver encoders.negotiate).
+
+    O parâmetro 'format' (com 'quality' e 'effort' opcionais) tem prioridade
+    sobre o header Accept; sem nenhum dos dois, imagens com transparência
+    (alpha, gravado em ImageSession.has_alpha) saem em PNG e as demais em
+    JPEG.
+
+    Raises:
+        ValueError: Se o formato ou os valores pedidos forem inválidos
+    """
+    return negotiate(
+        request.headers.get('Accept'),
+        params.get('format'),
+        params.get('quality'),
+        params.get('effort'),
+        alpha=alpha,
+    )
+
+
+def _passthrough_encoder(params, adjustments, info, image_format, accept=None):
+    """
+    Verifica se um arquivo pode ser servido como está, no lugar da renderização.
+
+    Vale quando:
+        - Os ajustes são a identidade (render_plan.is_identity)
+        - Nenhum 'format', 'quality' ou 'effort' foi pedido explicitamente
+        - O formato do arquivo tem codificador registrado e é aceito pelo
+          header Accept (se informado)
+        - A orientação EXIF é normal: o pipeline não a aplica, mas o
+          navegador a aplicaria aos bytes do original
+
+    Args:
+        params: Parâmetros da requisição
+        adjustments (dict): Ajustes completos da sessão
+        info (dict): Metadados da sessão (ver metadata.ensure_image_info)
+        image_format (str): Formato do arquivo a servir (ex.: 'JPEG')
+        accept (str): Header Accept das respostas negociadas; o download
+            não o informa
+
+    Returns:
+        Encoder | None: Codificador do formato do arquivo, ou None se for
+        preciso renderizar
+    """
+    if not is_identity(adjustments) or info['orientation'] != 1:
+        return None
+    if any(params.get(name) for name in ('format', 'quality', 'effort')):
+        return None
+
+    encoder = source_encoder(image_format)
+    if encoder is None or not accepts(accept, encoder.content_type):
+        return None
+    return encoder
+
+
 @require_http_methods(["POST"])
-def upload_rendered(request, session_id):
+async def batch_render(request):
+    """
+    Renderiza vários itens (sessões, snapshots ou ajustes) em uma única chamada.
+
+    Usado na exportação de catálogos, em vez de uma requisição de
+    render/download por sessão. Itens com o mesmo original compartilham a
+    decodificação, originais diferentes são renderizados em paralelo, e a
+    resposta é enviada em streaming à medida que cada item termina (ver
+    batch.py). Sessões ou snapshots inexistentes e erros de renderização de
+    um item não interrompem o lote: ficam registrados no manifesto.
+
+    Args:
+        request: Objeto HttpRequest
+
+    Request Body:
+        {
+            "items": [
+                {"session_id": "uuid"},
+                {"session_id": "uuid", "snapshot_id": "uuid"},
+                {"session_id": "uuid", "adjustments": {"contrast": 20}}
+            ],
+            "format": "zip"  // ou "multipart" (padrão: zip)
+        }
+
+    Returns:
+        StreamingHttpResponse: Arquivo ZIP ou corpo multipart/mixed, com um
+        manifest.json listando o status de cada item
+
+    Códigos de status HTTP:
+        200: Sucesso (resposta em streaming)
+        400: Dados inválidos (item malformado) ou lote grande demais
+    """
+    try:
+        data = json.loads(request.body)
+        response_format = data.get('format', 'zip')
+        items = await sync_to_async(resolve_items)(data.get('items'))
+        content_type, content = stream_batch(items, response_format)
+    except (json.JSONDecodeError, ValueError, TypeError, AttributeError) as e:
+        return JsonResponse({'error': f'Dados inválidos: {str(e)}'}, status=400)
+
+    response = StreamingHttpResponse(
+        streaming_content(request, content), content_type=content_type,
+    )
+    if response_format == 'zip':
+        response['Content-Disposition'] = 'attachment; filename="batch.zip"'
+    return response
+
+
+def _queue_full_response():
+    """Resposta 429 usada quando o pool de renderização está saturado."""
+    response = JsonResponse(
+        {'error': 'Servidor ocupado renderizando outras imagens. Tente novamente.'},
+        status=429,
+    )
+    response['Retry-After'] = '1'
+    return response
+
+
+@require_http_methods(["POST"])
+async def upload_rendered(request, session_id):
     """
     Recebe a imagem final renderizada do canvas do cliente.
 
@@ -464,12 +999,23 @@ def upload_rendered(request, session_id):
     O cliente renderiza a imagem com todos os ajustes no canvas e envia o resultado
     aqui para ser armazenado temporariamente antes do download.
 
+    A imagem fica no armazenamento temporário (rendered_store.py), indexada pela
+    sessão e pelos ajustes que representa. Envios com conteúdo idêntico são
+    deduplicados pelo hash, e as entradas expiram após RENDERED_STORE_TTL.
+    Enquanto os ajustes da sessão não mudarem, download_image serve esse
+    arquivo diretamente, sem renderizar no servidor.
+
     Args:
         request: Objeto HttpRequest contendo o arquivo renderizado
         session_id (str): UUID da sessão de imagem
 
     Request:
         - Campo 'rendered_image' deve conter o arquivo de imagem renderizada
+          (JPEG, PNG ou WEBP, identificado pelos magic bytes; no máximo
+          settings.MAX_UPLOAD_SIZE), nas dimensões do original
+        - Campo 'adjustments' (opcional): JSON com os ajustes usados na
+          renderização (só chaves de DEFAULT_ADJUSTMENTS); se omitido, usa
+          os ajustes atuais da sessão
 
     Returns:
         JsonResponse confirmando o salvamento
@@ -477,28 +1023,57 @@ def upload_rendered(request, session_id):
     Response:
         {
             "success": true,
-            "message": "Imagem renderizada salva"
+            "message": "Imagem renderizada salva",
+            "content_hash": "sha256...",
+            "deduplicated": false
         }
 
     Códigos de status HTTP:
         200: Sucesso
-        400: Nenhuma imagem foi enviada
+        400: Nenhuma imagem foi enviada, tipo inválido, arquivo muito grande,
+             dimensões diferentes das do original ou ajustes inválidos
         404: Sessão não encontrada
-
-    Nota:
-        Em produção, você pode armazenar isso em sessão, cache (Redis),
-        ou sistema de arquivos temporário.
     """
-    session = get_object_or_404(ImageSession, id=session_id)
+    session = await aget_object_or_404(ImageSession, id=session_id)
+    post, files = await _aload_post(request)
 
     # Verifica se a imagem renderizada foi enviada
-    if 'rendered_image' not in request.FILES:
+    if 'rendered_image' not in files:
         return JsonResponse({'error': 'Nenhuma imagem enviada'}, status=400)
 
-    # Armazena a imagem renderizada temporariamente para download
-    # Em produção, você pode salvar isso em sessão ou cache (Redis)
+    rendered = files['rendered_image']
+
+    # Ajustes representados pela imagem (padrão: os atuais da sessão)
+    adjustments = session.get_adjustments()
+    if 'adjustments' in post:
+        try:
+            received = json.loads(post['adjustments'])
+        except (json.JSONDecodeError, TypeError) as e:
+            return JsonResponse({'error': f'Dados inválidos: {str(e)}'}, status=400)
+        if not isinstance(received, dict):
+            return JsonResponse({'error': 'Dados inválidos: "adjustments" deve ser um objeto'},
+                                status=400)
+        for key in received:
+            if key not in DEFAULT_ADJUSTMENTS:
+                return JsonResponse({'error': f'Ajuste inválido: {key}'}, status=400)
+        adjustments = {**adjustments, **received}
+
+    # Armazena a imagem renderizada temporariamente para download (hash e
+    # gravação em disco rodam em uma thread). O tipo vem dos magic bytes, não
+    # do Content-Type enviado pelo cliente, e as dimensões precisam ser as do
+    # original (uma renderização do tier 'screen' não serve como download)
+    try:
+        info = await sync_to_async(ensure_image_info)(session)
+        digest, deduplicated, _ = await asyncio.to_thread(
+            get_rendered_store().put, session.id, adjustments, rendered,
+            size=(info['width'], info['height']),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
     return JsonResponse({
         'success': True,
         'message': 'Imagem renderizada salva',
+        'content_hash': digest,
+        'deduplicated': deduplicated,
     })